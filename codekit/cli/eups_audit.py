@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+from codekit.codetools import debug, error, info
+from codekit import codetools, eups, httpsession, versiondb
+import argparse
+import concurrent.futures
+import datetime
+import functools
+import json
+import os
+import sys
+import textwrap
+
+
+def parse_args():
+    """Parse command-line arguments"""
+    prog = 'eups-audit'
+
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=textwrap.dedent("""
+            Audit eups distrib tags against the versiondb manifest each was
+            built from (per the `#BUILD=` line of the tag file) for products
+            missing from the manifest and eups version mismatches.
+
+            Releases are audited in parallel on a pool of processes and a
+            consolidated JSON report is written.  No github api calls are
+            made.
+
+            Examples:
+
+                # audit all weekly tags
+                {prog} \\
+                    --cache-dir ~/.cache/codekit \\
+                    --pattern '^w_' \\
+                    --report audit.json
+
+                # audit specific tags from a local pkgroot mirror
+                {prog} \\
+                    --eups-pkgroot /mnt/eups/stack/src \\
+                    --versiondb-base-url ~/versiondb \\
+                    w_2018_18 w_2018_19
+        """).format(prog=prog),
+        epilog='Part of codekit: https://github.com/lsst-sqre/sqre-codekit'
+    )
+
+    parser.add_argument(
+        'tags',
+        nargs='*',
+        metavar='EUPS_TAG',
+        help='eups tags to audit. (default: all tags in the pkgroot)')
+    parser.add_argument(
+        '--pattern',
+        default=None,
+        help='Only audit tags in the pkgroot matching this regex.')
+    parser.add_argument(
+        '--report',
+        default='-',
+        help='Path to write the JSON report to. (default: stdout)')
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of releases to audit concurrently.'
+             ' (default: number of cpus)')
+    parser.add_argument(
+        '--versiondb-base-url',
+        default=os.getenv('LSST_VERSIONDB_BASE_URL'),
+        help='Override the default versiondb base url. May be the path'
+             ' (or file:// url) of a local versiondb git clone.')
+    parser.add_argument(
+        '--eupstag-base-url',
+        default=os.getenv('LSST_EUPSTAG_BASE_URL'),
+        help='Override the default eupstag base url')
+    parser.add_argument(
+        '--eups-pkgroot',
+        default=os.getenv('LSST_EUPS_PKGROOT_MIRROR'),
+        help='Path of a local EUPS_PKGROOT mirror to read the eups tags from,'
+             ' instead of --eupstag-base-url.'
+             ' (default: $LSST_EUPS_PKGROOT_MIRROR)')
+    parser.add_argument(
+        '--cache-dir',
+        default=os.getenv('DM_SQUARE_CACHE_DIR'),
+        help='Directory for a persistent cache of versiondb manifests and'
+             ' eups tags, and of the products parsed from them.'
+             ' (default: $DM_SQUARE_CACHE_DIR)')
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help='Only use cached manifests and eups tags. Requires --cache-dir.')
+    parser.add_argument(
+        '-d', '--debug',
+        action='count',
+        default=codetools.debug_lvl_from_env(),
+        help='Debug mode (can specify several times)')
+    parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
+
+    args = parser.parse_args()
+
+    if args.offline and not args.cache_dir:
+        parser.error('--offline requires --cache-dir')
+
+    return args
+
+
+def audit_products(eups_products, manifest_products):
+    """Compare the products of an eups tag with those of a manifest.
+
+    Unlike `github_tag_release.cross_reference_products()`, nothing is
+    merged or logged -- the differences are returned as plain data.
+
+    Parameters
+    ----------
+    eups_products: dict of codekit.records.ProductRecord
+    manifest_products: dict of codekit.records.ProductRecord
+
+    Returns
+    -------
+    missing: list of dict
+        products in the eups tag which are not in the manifest
+
+    mismatched: list of dict
+        products with a different eups version in the manifest
+    """
+    missing = []
+    mismatched = []
+    for name in sorted(eups_products):
+        eups_version = eups_products[name]['eups_version']
+        try:
+            manifest_data = manifest_products[name]
+        except KeyError:
+            missing.append({
+                'product': name,
+                'eups_version': eups_version,
+            })
+            continue
+
+        if eups_version != manifest_data['eups_version']:
+            mismatched.append({
+                'product': name,
+                'eups_version': eups_version,
+                'manifest_eups_version': manifest_data['eups_version'],
+            })
+
+    return missing, mismatched
+
+
+@functools.lru_cache(maxsize=None)
+def _document_cache(path, offline):
+    if not path:
+        return None
+    return httpsession.DocumentCache(path, offline=offline)
+
+
+@functools.lru_cache(maxsize=16)
+def _manifest_products(name, base_url, cache_dir, offline):
+    """Per-process memo of manifests, as several tags may share one"""
+    return versiondb.Manifest(
+        name,
+        base_url=base_url,
+        cache=_document_cache(cache_dir, offline),
+    ).products
+
+
+def audit_release(
+    eups_tag,
+    eupstag_base_url=None,
+    versiondb_base_url=None,
+    eups_pkgroot=None,
+    cache_dir=None,
+    offline=False,
+):
+    """Audit a single eups tag against its manifest.
+
+    This is run in a worker process and must not raise -- all errors are
+    recorded in the result.
+
+    Returns
+    -------
+    result: dict
+        report entry for the tag
+    """
+    result = {
+        'eups_tag': eups_tag,
+        'manifest': None,
+        'status': None,
+        'missing': [],
+        'mismatched': [],
+        'error': None,
+    }
+
+    try:
+        et = eups.EupsTag(
+            eups_tag,
+            base_url=eupstag_base_url,
+            cache=_document_cache(cache_dir, offline),
+            pkgroot=eups_pkgroot,
+        )
+        eups_products = et.products
+
+        result['manifest'] = et.manifest
+        if et.manifest is None:
+            # tags prior to d_2018_05_08 do not record the manifest
+            result['status'] = 'no-manifest'
+            return result
+
+        manifest_products = _manifest_products(
+            et.manifest,
+            versiondb_base_url,
+            cache_dir,
+            offline,
+        )
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = "{cls}: {e}".format(cls=type(e).__name__, e=e)
+        return result
+
+    missing, mismatched = audit_products(eups_products, manifest_products)
+    result['missing'] = missing
+    result['mismatched'] = mismatched
+    result['status'] = 'problems' if missing or mismatched else 'ok'
+
+    return result
+
+
+def audit_releases(tags, jobs=None, **kwargs):
+    """Audit many eups tags on a pool of processes.
+
+    Parameters
+    ----------
+    tags: list of str
+        eups tag names
+
+    jobs: int, optional
+        Number of worker processes.
+
+    kwargs:
+        passed to `audit_release()`
+
+    Returns
+    -------
+    results: list of dict
+        report entries, in the order of `tags`
+    """
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(audit_release, t, **kwargs): t for t in tags
+        }
+        for n, f in enumerate(concurrent.futures.as_completed(futures), 1):
+            r = f.result()
+            results[r['eups_tag']] = r
+            debug("  [{n}/{total}] {tag}: {status}".format(
+                n=n,
+                total=len(futures),
+                tag=r['eups_tag'],
+                status=r['status'],
+            ))
+
+    return [results[t] for t in tags]
+
+
+def write_report(path, results):
+    """Write the consolidated JSON report"""
+    summary = {'releases': len(results)}
+    for r in results:
+        summary[r['status']] = summary.get(r['status'], 0) + 1
+
+    report = {
+        'generated': datetime.datetime.utcnow().isoformat() + 'Z',
+        'summary': summary,
+        'releases': results,
+    }
+
+    if path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+    info("wrote report: {path}".format(path=path))
+
+
+def run():
+    args = parse_args()
+
+    codetools.setup_logging(args.debug)
+
+    tags = args.tags
+    if not tags:
+        tags = eups.list_tags(
+            pattern=args.pattern,
+            base_url=args.eupstag_base_url,
+            pkgroot=args.eups_pkgroot,
+        )
+    info("auditing {n} eups tag(s)".format(n=len(tags)))
+
+    results = audit_releases(
+        tags,
+        jobs=args.jobs,
+        eupstag_base_url=args.eupstag_base_url,
+        versiondb_base_url=args.versiondb_base_url,
+        eups_pkgroot=args.eups_pkgroot,
+        cache_dir=args.cache_dir,
+        offline=args.offline,
+    )
+    write_report(args.report, results)
+
+    problems = []
+    for r in results:
+        if r['status'] == 'problems':
+            problems.append(RuntimeError(
+                "{tag} ({manifest}): {n} missing, {m} mismatched".format(
+                    tag=r['eups_tag'],
+                    manifest=r['manifest'],
+                    n=len(r['missing']),
+                    m=len(r['mismatched']),
+                )))
+        elif r['status'] == 'error':
+            problems.append(RuntimeError(
+                "{tag}: {e}".format(tag=r['eups_tag'], e=r['error'])))
+
+    if problems:
+        msg = "{n} release(s) failed audit".format(n=len(problems))
+        raise codetools.DogpileError(problems, msg)
+
+
+def main():
+    try:
+        try:
+            run()
+        except codetools.DogpileError as e:
+            error(e)
+            n = len(e.errors)
+            sys.exit(n if n < 256 else 255)
+        else:
+            sys.exit(0)
+    except SystemExit as e:
+        debug("exit {status}".format(status=str(e)))
+        raise e
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ import codekit.progressbar as pbar
 import datetime
 import github
 import itertools
+import os
 import sys
 import textwrap
 
@@ -63,6 +64,45 @@ def parse_args():
         '--token',
         default=None,
         help='Literal github personal access token string')
+    parser.add_argument(
+        '--token-pool',
+        default=None,
+        help='File (one token per line) or directory of additional github'
+             ' tokens.  Reads are spread over the ratelimits of all tokens'
+             ' while changes are made with the --token-path/--token token.')
+    parser.add_argument(
+        '--auth',
+        choices=['token', 'app'],
+        default='token',
+        help='Authenticate with a personal access token (--token-path or'
+             ' --token) or as a github app installation (--app-*), which has'
+             ' a higher ratelimit. (default: %(default)s)')
+    parser.add_argument(
+        '--app-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_ID'),
+        help='github app id (default: $DM_SQUARE_GITHUB_APP_ID)')
+    parser.add_argument(
+        '--app-key-path',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_KEY_PATH'),
+        help='Path to the private key (PEM) of the github app'
+             ' (default: $DM_SQUARE_GITHUB_APP_KEY_PATH)')
+    parser.add_argument(
+        '--app-installation-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_INSTALLATION_ID'),
+        help='Installation id of the github app.  Required if the app is'
+             ' installed in more than one org.'
+             ' (default: $DM_SQUARE_GITHUB_APP_INSTALLATION_ID)')
+    parser.add_argument(
+        '--cache-dir',
+        default=os.getenv('DM_SQUARE_CACHE_DIR'),
+        help='Directory for a persistent cache of github api responses.'
+             ' Cached responses are revalidated with conditional requests,'
+             ' which do not count against the ratelimit.'
+             ' (default: $DM_SQUARE_CACHE_DIR)')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the github api response cache.')
     parser.add_argument(
         '--limit',
         default=None,
@@ -93,10 +133,17 @@ def parse_args():
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    if args.auth == 'app' and not (args.app_id and args.app_key_path):
+        parser.error('--auth app requires --app-id and --app-key-path')
+
+    return args
 
 
-def find_teams_by_repo(src_repos):
+def find_teams_by_repo(membership, src_repos):
+    assert isinstance(membership, pygithub.OrgMembershipIndex),\
+        type(membership)
     assert isinstance(src_repos, list), type(src_repos)
 
     # length of longest repo name
@@ -104,13 +151,7 @@ def find_teams_by_repo(src_repos):
 
     src_rt = {}
     for r in src_repos:
-        try:
-            teams = r.get_teams()
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            raise pygithub.CaughtRepositoryError(r, e, msg) from None
+        teams = membership.get_repo_teams(r)
 
         team_names = [t.name for t in teams]
         debug("  {repo: >{w}} {teams}".format(
@@ -291,7 +332,16 @@ def run():
     codetools.setup_logging(args.debug)
 
     global g
-    g = pygithub.login_github(token_path=args.token_path, token=args.token)
+    g = pygithub.login_github(
+        token_path=args.token_path,
+        token=args.token,
+        token_pool=args.token_pool,
+        auth=args.auth,
+        app_id=args.app_id,
+        app_key_path=args.app_key_path,
+        app_installation_id=args.app_installation_id,
+        cache_dir=None if args.no_cache else args.cache_dir,
+    )
 
     # protect destination org
     codetools.validate_org(args.dst_org)
@@ -300,16 +350,13 @@ def run():
     info("forking repos from: {org}".format(org=src_org.login))
     info("                to: {org}".format(org=dst_org.login))
 
+    # team membership of all repos in the source org
+    membership = pygithub.OrgMembershipIndex(src_org)
+
     debug('looking for repos -- this can take a while for large orgs...')
     if args.team:
         debug('checking that selection team(s) exist')
-        try:
-            org_teams = list(src_org.get_teams())
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            raise pygithub.CaughtOrganizationError(src_org, e, msg) from None
+        org_teams = membership.teams
 
         missing_teams = [n for n in args.team if n not in
                          [t.name for t in org_teams]]
@@ -318,7 +365,7 @@ def run():
             [error("  '{t}'".format(t=n)) for n in missing_teams]
             return
         fork_teams = [t for t in org_teams if t.name in args.team]
-        repos = pygithub.get_repos_by_team(fork_teams)
+        repos = membership.get_repos_by_team(fork_teams)
         debug('selecting repos by membership in team(s):')
         [debug("  '{t}'".format(t=t.name)) for t in fork_teams]
     else:
@@ -340,7 +387,7 @@ def run():
     if args.copy_teams:
         debug('checking source repo team membership...')
         # dict of repo and team objects, keyed by repo name
-        src_rt = find_teams_by_repo(src_repos)
+        src_rt = find_teams_by_repo(membership, src_repos)
 
         # extract a non-duplicated list of team names from all repos being
         # forked as a dict, keyed by team name
@@ -4,6 +4,7 @@ from codekit.codetools import debug, error, info
 from codekit import codetools, pygithub
 import argparse
 import datetime
+import os
 import sys
 import textwrap
 
@@ -33,6 +34,28 @@ def parse_args():
         '--token',
         default=None,
         help='Literal github personal access token string')
+    parser.add_argument(
+        '--auth',
+        choices=['token', 'app'],
+        default='token',
+        help='Authenticate with a personal access token (--token-path or'
+             ' --token) or as a github app installation (--app-*), which has'
+             ' a higher ratelimit. (default: %(default)s)')
+    parser.add_argument(
+        '--app-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_ID'),
+        help='github app id (default: $DM_SQUARE_GITHUB_APP_ID)')
+    parser.add_argument(
+        '--app-key-path',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_KEY_PATH'),
+        help='Path to the private key (PEM) of the github app'
+             ' (default: $DM_SQUARE_GITHUB_APP_KEY_PATH)')
+    parser.add_argument(
+        '--app-installation-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_INSTALLATION_ID'),
+        help='Installation id of the github app.  Required if the app is'
+             ' installed in more than one org.'
+             ' (default: $DM_SQUARE_GITHUB_APP_INSTALLATION_ID)')
     parser.add_argument(
         '-d', '--debug',
         action='count',
@@ -40,7 +63,12 @@ def parse_args():
         help='Debug mode (can specify several times)')
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
 
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    if args.auth == 'app' and not (args.app_id and args.app_key_path):
+        parser.error('--auth app requires --app-id and --app-key-path')
+
+    return args
 
 
 def run():
@@ -49,7 +77,14 @@ def run():
     codetools.setup_logging(args.debug)
 
     global g
-    g = pygithub.login_github(token_path=args.token_path, token=args.token)
+    g = pygithub.login_github(
+        token_path=args.token_path,
+        token=args.token,
+        auth=args.auth,
+        app_id=args.app_id,
+        app_key_path=args.app_key_path,
+        app_installation_id=args.app_installation_id,
+    )
     info("github ratelimit: {rl}".format(rl=g.rate_limiting))
 
     reset = datetime.datetime.fromtimestamp(int(g.rate_limiting_resettime))
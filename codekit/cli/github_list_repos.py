@@ -4,6 +4,7 @@ from codekit.codetools import debug, error
 from codekit import codetools, pygithub
 import argparse
 import github
+import os
 import sys
 import textwrap
 
@@ -61,13 +62,57 @@ def parse_args():
         '--token',
         default=None,
         help='Literal github personal access token string')
+    parser.add_argument(
+        '--token-pool',
+        default=None,
+        help='File (one token per line) or directory of additional github'
+             ' tokens.  Reads are spread over the ratelimits of all tokens'
+             ' while changes are made with the --token-path/--token token.')
+    parser.add_argument(
+        '--auth',
+        choices=['token', 'app'],
+        default='token',
+        help='Authenticate with a personal access token (--token-path or'
+             ' --token) or as a github app installation (--app-*), which has'
+             ' a higher ratelimit. (default: %(default)s)')
+    parser.add_argument(
+        '--app-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_ID'),
+        help='github app id (default: $DM_SQUARE_GITHUB_APP_ID)')
+    parser.add_argument(
+        '--app-key-path',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_KEY_PATH'),
+        help='Path to the private key (PEM) of the github app'
+             ' (default: $DM_SQUARE_GITHUB_APP_KEY_PATH)')
+    parser.add_argument(
+        '--app-installation-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_INSTALLATION_ID'),
+        help='Installation id of the github app.  Required if the app is'
+             ' installed in more than one org.'
+             ' (default: $DM_SQUARE_GITHUB_APP_INSTALLATION_ID)')
+    parser.add_argument(
+        '--cache-dir',
+        default=os.getenv('DM_SQUARE_CACHE_DIR'),
+        help='Directory for a persistent cache of github api responses.'
+             ' Cached responses are revalidated with conditional requests,'
+             ' which do not count against the ratelimit.'
+             ' (default: $DM_SQUARE_CACHE_DIR)')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the github api response cache.')
     parser.add_argument(
         '-d', '--debug',
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    if args.auth == 'app' and not (args.app_id and args.app_key_path):
+        parser.error('--auth app requires --app-id and --app-key-path')
+
+    return args
 
 
 def run():
@@ -77,7 +122,16 @@ def run():
     codetools.setup_logging(args.debug)
 
     global g
-    g = pygithub.login_github(token_path=args.token_path, token=args.token)
+    g = pygithub.login_github(
+        token_path=args.token_path,
+        token=args.token,
+        token_pool=args.token_pool,
+        auth=args.auth,
+        app_id=args.app_id,
+        app_key_path=args.app_key_path,
+        app_installation_id=args.app_installation_id,
+        cache_dir=None if args.no_cache else args.cache_dir,
+    )
 
     if not args.hide:
         args.hide = []
@@ -85,22 +139,19 @@ def run():
     org = g.get_organization(args.organization)
 
     try:
-        repos = list(org.get_repos())
+        repos = list(pygithub.iter_paginated(org.get_repos()))
     except github.RateLimitExceededException:
         raise
     except github.GithubException as e:
         msg = 'error getting repos'
         raise pygithub.CaughtOrganizationError(org, e, msg) from None
 
+    # team membership of all repos in the org
+    membership = pygithub.OrgMembershipIndex(org)
+
     for r in repos:
-        try:
-            teamnames = [t.name for t in r.get_teams()
-                         if t.name not in args.hide]
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            raise pygithub.CaughtRepositoryError(r, e, msg) from None
+        teamnames = [t for t in membership.get_repo_team_names(r)
+                     if t not in args.hide]
 
         maxt = args.maxt if (args.maxt is not None and
                              args.maxt >= 0) else len(teamnames)
@@ -8,6 +8,7 @@ from codekit.codetools import debug, error, info, warn
 from codekit import codetools, pygithub
 import argparse
 import github
+import os
 import sys
 import textwrap
 
@@ -65,6 +66,45 @@ def parse_args():
         '--token',
         default=None,
         help='Literal github personal access token string')
+    parser.add_argument(
+        '--token-pool',
+        default=None,
+        help='File (one token per line) or directory of additional github'
+             ' tokens.  Reads are spread over the ratelimits of all tokens'
+             ' while changes are made with the --token-path/--token token.')
+    parser.add_argument(
+        '--auth',
+        choices=['token', 'app'],
+        default='token',
+        help='Authenticate with a personal access token (--token-path or'
+             ' --token) or as a github app installation (--app-*), which has'
+             ' a higher ratelimit. (default: %(default)s)')
+    parser.add_argument(
+        '--app-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_ID'),
+        help='github app id (default: $DM_SQUARE_GITHUB_APP_ID)')
+    parser.add_argument(
+        '--app-key-path',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_KEY_PATH'),
+        help='Path to the private key (PEM) of the github app'
+             ' (default: $DM_SQUARE_GITHUB_APP_KEY_PATH)')
+    parser.add_argument(
+        '--app-installation-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_INSTALLATION_ID'),
+        help='Installation id of the github app.  Required if the app is'
+             ' installed in more than one org.'
+             ' (default: $DM_SQUARE_GITHUB_APP_INSTALLATION_ID)')
+    parser.add_argument(
+        '--cache-dir',
+        default=os.getenv('DM_SQUARE_CACHE_DIR'),
+        help='Directory for a persistent cache of github api responses.'
+             ' Cached responses are revalidated with conditional requests,'
+             ' which do not count against the ratelimit.'
+             ' (default: $DM_SQUARE_CACHE_DIR)')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the github api response cache.')
     parser.add_argument(
         '-d', '--debug',
         action='count',
@@ -73,7 +113,12 @@ def parse_args():
     parser.add_argument('--dry-run', action='store_true')
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
 
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    if args.auth == 'app' and not (args.app_id and args.app_key_path):
+        parser.error('--auth app requires --app-id and --app-key-path')
+
+    return args
 
 
 def find_team(teams, name):
@@ -95,12 +140,21 @@ def run():
     codetools.setup_logging(args.debug)
 
     global g
-    g = pygithub.login_github(token_path=args.token_path, token=args.token)
+    g = pygithub.login_github(
+        token_path=args.token_path,
+        token=args.token,
+        token_pool=args.token_pool,
+        auth=args.auth,
+        app_id=args.app_id,
+        app_key_path=args.app_key_path,
+        app_installation_id=args.app_installation_id,
+        cache_dir=None if args.no_cache else args.cache_dir,
+    )
     org = g.get_organization(args.org)
 
     # only iterate over all teams once
     try:
-        teams = list(org.get_teams())
+        teams = list(pygithub.iter_paginated(org.get_teams()))
     except github.RateLimitExceededException:
         raise
     except github.GithubException as e:
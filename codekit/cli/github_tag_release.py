@@ -9,16 +9,31 @@
 
 
 from codekit.codetools import debug, info, warn, error
-from codekit import codetools, eups, pygithub, versiondb
+from codekit import codetools, eups, httpsession, pygithub, reposyaml
+from codekit import versiondb
 import argparse
 import codekit
+import concurrent.futures
+import datetime
 import github
 import itertools
+import json
 import os
 import re
 import sys
 import textwrap
-import yaml
+import threading
+import time
+
+
+# approximate number of github api calls needed per product -- get_repo(),
+# matching tag refs, create_git_tag(), create_git_ref()
+API_CALLS_PER_PRODUCT = 4
+# repos.yaml and the org team membership index
+API_CALLS_FIXED = 25
+
+# --plan-out file format version
+PLAN_VERSION = 1
 
 
 class GitTagExistsError(Exception):
@@ -29,6 +44,142 @@ class GitTagMissingError(Exception):
     pass
 
 
+class PlanStaleError(Exception):
+    pass
+
+
+class DeadlineError(Exception):
+    pass
+
+
+class TagJournal(object):
+    """Append-only journal (json lines) of completed tagging steps.
+
+    Each `create_git_tag` and `create_git_ref` (or ref update) is recorded
+    per product as soon as it completes, so that an interrupted run may be
+    resumed without repeating work or api calls.  Entries are keyed on the
+    requested git tag, product name, and target sha.
+
+    Parameters
+    ----------
+    path: str
+        journal file path -- created if it does not exist
+
+    git_tag: str
+        requested git tag -- entries for other tags are ignored
+
+    resume: bool, optional
+        Load the entries of previous runs.  Otherwise, previous entries are
+        ignored (but not removed).
+    """
+
+    def __init__(self, path, git_tag, resume=False):
+        self.path = path
+        self.git_tag = git_tag
+        self._lock = threading.Lock()
+        # (product, sha) -> {'tag_sha': str, 'ref': bool}
+        self._entries = {}
+
+        if resume:
+            self._load()
+
+    def _load(self):
+        try:
+            f = open(self.path, 'r')
+        except FileNotFoundError:
+            return
+
+        with f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # a partially written line from an interrupted run
+                    continue
+                if rec.get('git_tag') != self.git_tag:
+                    continue
+                self._update(rec)
+
+        debug("loaded {n} journal entries from: {path}".format(
+            n=len(self._entries),
+            path=self.path,
+        ))
+
+    def _update(self, rec):
+        entry = self._entries.setdefault(
+            (rec['product'], rec['sha']),
+            {'tag_sha': None, 'ref': False},
+        )
+        if rec['step'] == 'tag':
+            entry['tag_sha'] = rec['tag_sha']
+        elif rec['step'] == 'ref':
+            entry['ref'] = True
+
+    def record(self, step, product, repo, t_tag, tag_sha):
+        """Append a completed step to the journal.
+
+        Parameters
+        ----------
+        step: str
+            `tag` or `ref`
+
+        product: str
+            product name
+
+        repo: github.Repository.Repository
+
+        t_tag: codekit.pygithub.TargetTag
+
+        tag_sha: str
+            sha of the created git tag object
+        """
+        rec = {
+            'git_tag': self.git_tag,
+            'product': product,
+            'repo': repo.full_name,
+            'step': step,
+            'tag': t_tag.name,
+            'sha': t_tag.sha,
+            'tag_sha': tag_sha,
+            'time': codetools.current_timestamp(),
+        }
+
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(rec, sort_keys=True) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._update(rec)
+
+    def is_done(self, product, sha):
+        """Return `True` if a product has been completely tagged"""
+        with self._lock:
+            entry = self._entries.get((product, sha))
+            return bool(entry and entry['ref'])
+
+    def tag_sha(self, product, sha):
+        """Return the sha of a previously created git tag object, if any"""
+        with self._lock:
+            entry = self._entries.get((product, sha))
+            return entry['tag_sha'] if entry else None
+
+    def filter_done(self, products, sha_key=lambda data: data['sha']):
+        """Return `products` without the completely tagged products"""
+        pending = {}
+        for name, data in products.items():
+            if self.is_done(name, sha_key(data)):
+                debug("  {p} already tagged (journal)".format(p=name))
+                continue
+            pending[name] = data
+
+        n = len(products) - len(pending)
+        if n:
+            info("skipping {n} product(s) already tagged per journal".format(
+                n=n))
+
+        return pending
+
+
 def parse_args():
     """Parse command-line arguments"""
     prog = 'github-tag-release'
@@ -102,6 +253,36 @@ def parse_args():
                     --manifest-only \\
                     'w.2018.18'
 
+                # resolve and check a release ahead of time...
+                {prog} \\
+                    --org 'lsst' \\
+                    --allow-team 'Data Management' \\
+                    --allow-team 'DM Externals' \\
+                    --external-team 'DM Externals' \\
+                    --manifest 'b3595' \\
+                    --plan-out plan.json \\
+                    'w.2018.18'
+
+                # ...and later create the tags without re-checking
+                {prog} \\
+                    --org 'lsst' \\
+                    --allow-team 'Data Management' \\
+                    --manifest 'b3595' \\
+                    --apply plan.json \\
+                    'w.2018.18'
+
+                # verify only afw and the products it depends upon
+                {prog} \\
+                    --org 'lsst' \\
+                    --allow-team 'Data Management' \\
+                    --allow-team 'DM Externals' \\
+                    --external-team 'DM Externals' \\
+                    --manifest 'b3595' \\
+                    --manifest-only \\
+                    --only-deps-of afw \\
+                    --verify \\
+                    'w.2018.18'
+
             Note that the access token must have access to these oauth scopes:
                 * read:org
                 * repo
@@ -152,14 +333,74 @@ def parse_args():
         '--token',
         default=None,
         help='Literal github personal access token string')
+    parser.add_argument(
+        '--token-pool',
+        default=None,
+        help='File (one token per line) or directory of additional github'
+             ' tokens.  Reads are spread over the ratelimits of all tokens'
+             ' while changes are made with the --token-path/--token token.')
+    parser.add_argument(
+        '--auth',
+        choices=['token', 'app'],
+        default='token',
+        help='Authenticate with a personal access token (--token-path or'
+             ' --token) or as a github app installation (--app-*), which has'
+             ' a higher ratelimit. (default: %(default)s)')
+    parser.add_argument(
+        '--app-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_ID'),
+        help='github app id (default: $DM_SQUARE_GITHUB_APP_ID)')
+    parser.add_argument(
+        '--app-key-path',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_KEY_PATH'),
+        help='Path to the private key (PEM) of the github app'
+             ' (default: $DM_SQUARE_GITHUB_APP_KEY_PATH)')
+    parser.add_argument(
+        '--app-installation-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_INSTALLATION_ID'),
+        help='Installation id of the github app.  Required if the app is'
+             ' installed in more than one org.'
+             ' (default: $DM_SQUARE_GITHUB_APP_INSTALLATION_ID)')
+    parser.add_argument(
+        '--cache-dir',
+        default=os.getenv('DM_SQUARE_CACHE_DIR'),
+        help='Directory for a persistent cache of github api responses,'
+             ' versiondb manifests, eups tags, and repos.yaml.'
+             ' Cached responses are revalidated with conditional requests,'
+             ' which do not count against the ratelimit.'
+             ' (default: $DM_SQUARE_CACHE_DIR)')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the --cache-dir cache, neither of github api'
+             ' responses nor of versiondb manifests, eups tags, and'
+             ' repos.yaml.')
+    parser.add_argument(
+        '--ratelimit-wait',
+        action='store_true',
+        help='Sleep until the github ratelimit resets, instead of exiting,'
+             ' when the estimated number of api calls exceeds the remaining'
+             ' ratelimit.')
+    parser.add_argument(
+        '--repos-yaml',
+        metavar='PATH',
+        help='Read repos.yaml from a local checkout of lsst/repos (or a'
+             ' path to the file) instead of fetching it from github.')
     parser.add_argument(
         '--versiondb-base-url',
         default=os.getenv('LSST_VERSIONDB_BASE_URL'),
-        help='Override the default versiondb base url')
+        help='Override the default versiondb base url. May be the path'
+             ' (or file:// url) of a local versiondb git clone.')
     parser.add_argument(
         '--eupstag-base-url',
         default=os.getenv('LSST_EUPSTAG_BASE_URL'),
         help='Override the default eupstag base url')
+    parser.add_argument(
+        '--eups-pkgroot',
+        default=os.getenv('LSST_EUPS_PKGROOT_MIRROR'),
+        help='Path of a local EUPS_PKGROOT mirror to read the eups tag from,'
+             ' instead of --eupstag-base-url.'
+             ' (default: $LSST_EUPS_PKGROOT_MIRROR)')
     parser.add_argument(
         '--force-tag',
         action='store_true',
@@ -182,6 +423,30 @@ def parse_args():
         default=None,
         type=int,
         help='Maximum number of products/repos to tags. (useful for testing)')
+    parser.add_argument(
+        '--only-deps-of',
+        action='append',
+        metavar='PRODUCT',
+        help='Only tag (or verify) PRODUCT and the products it depends upon,'
+             ' per the manifest. (can specify several times)')
+    parser.add_argument(
+        '--only-rdeps-of',
+        action='append',
+        metavar='PRODUCT',
+        help='Only tag (or verify) PRODUCT and the products which depend upon'
+             ' it, per the manifest. (can specify several times)')
+    parser.add_argument(
+        '--jobs',
+        default=1,
+        type=int,
+        help='Number of products to resolve to git repos concurrently.'
+             ' (default: 1)')
+    parser.add_argument(
+        '--write-jobs',
+        default=1,
+        type=int,
+        help='Number of products to create/update git tags for concurrently.'
+             ' (default: 1)')
     parser.add_argument(
         '--fail-fast',
         action='store_true',
@@ -226,7 +491,61 @@ def parse_args():
              ' will not create/update tag(s) or modify any state.'
              ' (mutually exclusive with --dry-run)')
 
-    return parser.parse_args()
+    plan_group = parser.add_mutually_exclusive_group()
+    plan_group.add_argument(
+        '--plan-out',
+        metavar='PLAN',
+        help='Write the resolved and checked set of products to tag to a'
+             ' json file and exit without creating/updating tag(s).'
+             ' (mutually exclusive with --apply)')
+    plan_group.add_argument(
+        '--apply',
+        metavar='PLAN',
+        help='Create/update the tag(s) in a plan written by --plan-out,'
+             ' without repeating the pre-flight checks. The tag, --org and'
+             ' --manifest must match the plan.'
+             ' (mutually exclusive with --plan-out)')
+    parser.add_argument(
+        '--journal',
+        metavar='FILE',
+        help='Append each completed tagging step to this file (json lines)'
+             ' so that an interrupted run may be resumed.')
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Skip products already tagged according to --journal,'
+             ' without any api calls.')
+    parser.add_argument(
+        '--deadline',
+        type=int,
+        default=None,
+        help='Stop tagging cleanly once this many seconds have elapsed'
+             ' since the start of the run. Use with --journal and --resume'
+             ' to continue later.')
+    parser.add_argument(
+        '--plan-max-age',
+        type=int,
+        default=None,
+        help='Refuse to --apply a plan older than this many seconds.')
+    parser.add_argument(
+        '--check-plan',
+        action='store_true',
+        help='Under --apply, confirm that the existing tag(s) are unchanged'
+             ' since the plan was written. (one api call per product)')
+
+    args = parser.parse_args()
+
+    if args.apply and args.verify:
+        parser.error('--apply is mutually exclusive with --verify')
+    if args.apply and (args.only_deps_of or args.only_rdeps_of):
+        parser.error('--apply is mutually exclusive with'
+                     ' --only-deps-of/--only-rdeps-of')
+    if args.resume and not args.journal:
+        parser.error('--resume requires --journal')
+    if args.auth == 'app' and not (args.app_id and args.app_key_path):
+        parser.error('--auth app requires --app-id and --app-key-path')
+
+    return args
 
 
 def cmp_dict(d1, d2, ignore_keys=[]):
@@ -247,14 +566,14 @@ def cross_reference_products(
 
     Parameters
     ----------
-    eups_products:
-    manifest:
+    eups_products: dict of codekit.records.ProductRecord
+    manifest: dict of codekit.records.ProductRecord
     fail_fast: bool
     ignore_manifest_versions: bool
 
     Returns
     -------
-    products: dict
+    products: dict of codekit.records.ProductRecord
 
     Raises
     ------
@@ -284,8 +603,9 @@ def cross_reference_products(
             # ignore the manifest eups_version string by simply setting it to
             # the eups tag value.  This ensures that the eups tag value will be
             # passed though.
-            manifest_data = manifest_data.copy()
-            manifest_data['eups_version'] = eups_data['eups_version']
+            manifest_data = manifest_data.replace(
+                eups_version=eups_data['eups_version'],
+            )
 
         if eups_data['eups_version'] != manifest_data['eups_version']:
             yikes = RuntimeError(textwrap.dedent("""\
@@ -302,8 +622,7 @@ def cross_reference_products(
             problems.append(yikes)
             error(yikes)
 
-        products[name] = eups_data.copy()
-        products[name].update(manifest_data)
+        products[name] = eups_data.merge(manifest_data)
 
     if problems:
         error("{n} product(s) have error(s)".format(n=len(problems)))
@@ -311,102 +630,158 @@ def cross_reference_products(
     return products, problems
 
 
-def get_repo_for_products(
+def resolve_product_repo(
     org,
-    products,
+    name,
+    data,
+    repo_index,
+    membership,
     allow_teams,
     ext_teams,
     deny_teams,
-    fail_fast=False
 ):
-    debug("allowed teams: {allow}".format(allow=allow_teams))
-    debug("external teams: {ext}".format(ext=ext_teams))
-    debug("denied teams: {deny}".format(deny=deny_teams))
+    """
+    Find the git repo of a product and check its team membership.
 
-    resolved_products = {}
+    Returns
+    -------
+    product: dict
+        A copy of `data` with the `repo` and `v` keys added.
 
-    global g
-    repos_yaml = g.get_repo("lsst/repos").get_contents("etc/repos.yaml")
-    repo_index = yaml.safe_load(repos_yaml.decoded_content)
+    Raises
+    ------
+    RuntimeError
+        If the product is not present in `repos.yaml`.
+    codekit.pygithub.CaughtOrganizationError
+    codekit.pygithub.CaughtRepositoryError
+    codekit.pygithub.RepositoryTeamMembershipError
+    """
+    debug("looking for git repo for: {name} [{ver}]".format(
+        name=name,
+        ver=data['eups_version']
+    ))
 
-    problems = []
-    for name, data in products.items():
-        debug("looking for git repo for: {name} [{ver}]".format(
-            name=name,
-            ver=data['eups_version']
-        ))
+    try:
+        entry = repo_index[name]
+    except KeyError as exc:
+        msg = f"repo {name} cannot be found in repos.yaml"
+        raise RuntimeError(msg) from exc
 
-        try:
-            entry = repo_index[name]
-            if isinstance(entry, dict):
-                entry = entry['url']
-            entry = re.sub(
-                r"^https?://github\.com/(.+?)(\.git)?$",
-                r"\1",
-                entry
-            )
-        except Exception as exc:
-            msg = f"repo {name} cannot be found in repos.yaml"
-            yikes = RuntimeError(msg)
-            if fail_fast:
-                raise yikes from exc
-            problems.append(yikes)
-            error(yikes)
-            continue
+    try:
+        # this is called from worker threads
+        repo = pygithub.get_github().get_repo(entry)
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        msg = "error getting repo by name: {r}".format(r=name)
+        raise pygithub.CaughtOrganizationError(org, e, msg) from None
 
-        try:
-            repo = g.get_repo(entry)
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = "error getting repo by name: {r}".format(r=name)
-            yikes = pygithub.CaughtOrganizationError(org, e, msg)
-            if fail_fast:
-                raise yikes from None
-            problems.append(yikes)
-            error(yikes)
+    debug("  found: {slug}".format(slug=repo.full_name))
 
-            continue
+    repo_team_names = membership.get_repo_team_names(repo)
 
-        debug("  found: {slug}".format(slug=repo.full_name))
+    debug("  teams: {teams}".format(teams=repo_team_names))
 
-        try:
-            repo_team_names = [t.name for t in repo.get_teams()]
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            yikes = pygithub.CaughtRepositoryError(repo, e, msg)
-            if fail_fast:
-                raise yikes from None
-            problems.append(yikes)
-            error(yikes)
+    pygithub.check_repo_teams(
+        repo,
+        allow_teams=allow_teams,
+        deny_teams=deny_teams,
+        team_names=repo_team_names
+    )
 
-            continue
+    has_ext_team = any(x in repo_team_names for x in ext_teams)
+    debug("  external repo: {v}".format(v=has_ext_team))
 
-        debug("  teams: {teams}".format(teams=repo_team_names))
+    product = data.copy()
+    product['repo'] = repo
+    product['v'] = has_ext_team
 
-        try:
-            pygithub.check_repo_teams(
-                repo,
-                allow_teams=allow_teams,
-                deny_teams=deny_teams,
-                team_names=repo_team_names
-            )
-        except pygithub.RepositoryTeamMembershipError as e:
-            if fail_fast:
-                raise
-            problems.append(e)
-            error(e)
+    return product
 
-            continue
 
-        has_ext_team = any(x in repo_team_names for x in ext_teams)
-        debug("  external repo: {v}".format(v=has_ext_team))
+def fetch_repo_index(path=None, cache_dir=None):
+    """Return an index of `lsst/repos` `etc/repos.yaml`
+
+    Parameters
+    ----------
+    path: str, optional
+        local checkout of `lsst/repos`. The file is fetched from github
+        otherwise.
+
+    cache_dir: str, optional
+        directory to persist the parsed index in
+
+    Returns
+    -------
+    repo_index: codekit.reposyaml.RepoIndex
+    """
+    repo_index = reposyaml.RepoIndex(
+        repo=None if path else pygithub.get_github().get_repo(
+            reposyaml.default_repo),
+        path=path,
+        cache_dir=cache_dir,
+    )
+    repo_index.build()
+    return repo_index
+
+
+def get_repo_for_products(
+    org,
+    products,
+    allow_teams,
+    ext_teams,
+    deny_teams,
+    fail_fast=False,
+    jobs=1,
+    membership=None,
+    repo_index=None,
+):
+    debug("allowed teams: {allow}".format(allow=allow_teams))
+    debug("external teams: {ext}".format(ext=ext_teams))
+    debug("denied teams: {deny}".format(deny=deny_teams))
+
+    resolved_products = {}
+
+    if repo_index is None:
+        repo_index = fetch_repo_index()
+
+    if membership is None:
+        membership = pygithub.OrgMembershipIndex(org)
+    # build the index up front rather than in the first worker thread
+    membership.build()
+
+    def resolve(item):
+        name, data = item
+        return resolve_product_repo(
+            org,
+            name,
+            data,
+            repo_index,
+            membership,
+            allow_teams=allow_teams,
+            ext_teams=ext_teams,
+            deny_teams=deny_teams,
+        )
 
-        resolved_products[name] = data.copy()
-        resolved_products[name]['repo'] = repo
-        resolved_products[name]['v'] = has_ext_team
+    problems = []
+    # results are consumed in product order so that the order of
+    # resolved_products, and of any errors, does not depend on --jobs
+    with codetools.OrderedThreadPool(jobs, fail_fast=fail_fast) as pool:
+        for (name, _), f in pool.map(resolve, products.items()):
+            try:
+                resolved_products[name] = f.result()
+            except github.RateLimitExceededException:
+                raise
+            except (
+                RuntimeError,
+                pygithub.CaughtOrganizationError,
+                pygithub.CaughtRepositoryError,
+                pygithub.RepositoryTeamMembershipError,
+            ) as e:
+                if fail_fast:
+                    raise
+                problems.append(e)
+                error(e)
 
     if problems:
         error("{n} product(s) have error(s)".format(n=len(problems)))
@@ -464,7 +839,7 @@ def cmp_existing_git_tag(
     return True
 
 
-def check_existing_git_tag(repo, t_tag, **kwargs):
+def check_existing_git_tag(repo, t_tag, tag_index=None, **kwargs):
     """
     Check for a pre-existng tag in the github repo.
 
@@ -474,6 +849,9 @@ def check_existing_git_tag(repo, t_tag, **kwargs):
         repo to inspect for an existing tagsdf
     t_tag: codekit.pygithub.TargetTag
         dict repesenting a target git tag
+    tag_index: codekit.pygithub.RepoTagIndex
+        index of the tags in `repo` (optional). A new index is created if one
+        is not provided.
 
     Returns
     -------
@@ -494,8 +872,11 @@ def check_existing_git_tag(repo, t_tag, **kwargs):
         tag=t_tag.name,
     ))
 
+    if tag_index is None:
+        tag_index = pygithub.RepoTagIndex(repo, prefix=t_tag.name)
+
     # find ref/tag by name
-    e_ref = pygithub.find_tag_by_name(repo, t_tag.name)
+    e_ref = tag_index.find_tag_by_name(t_tag.name)
     if not e_ref:
         debug("  not found: {tag}".format(tag=t_tag.name))
         return False
@@ -558,6 +939,9 @@ def check_product_tags(
     assert isinstance(tagger, github.InputGitAuthor), type(tagger)
 
     checked_products = {}
+    # one index per repo, which is also used by `tag_product()`.  As a single
+    # tag is made per repo, this is one api call per repo.
+    tag_indexes = {}
 
     problems = []
     for name, data in products.items():
@@ -584,11 +968,19 @@ def check_product_tags(
         # control whether to create a new tag or update an existing one
         update_tag = False
 
+        # the existing ref, if any, is kept so it does not have to be looked up
+        # again when moving a tag
+        tag_index = tag_indexes.get(repo.full_name)
+        if tag_index is None:
+            tag_index = pygithub.RepoTagIndex(repo, prefix=t_tag.name)
+            tag_indexes[repo.full_name] = tag_index
+
         try:
             # if the existing tag is in sync, do nothing
             if check_existing_git_tag(
                 repo,
                 t_tag,
+                tag_index=tag_index,
                 ignore_git_message=ignore_git_message,
                 ignore_git_tagger=ignore_git_tagger,
             ):
@@ -637,6 +1029,9 @@ def check_product_tags(
         checked_products[name] = data.copy()
         checked_products[name]['target_tag'] = t_tag
         checked_products[name]['update_tag'] = update_tag
+        checked_products[name]['existing_ref'] = \
+            tag_index.find_tag_by_name(t_tag.name)
+        checked_products[name]['tag_index'] = tag_index
 
     if problems:
         error("{n} product(s) have error(s)".format(n=len(problems)))
@@ -673,36 +1068,55 @@ def identify_products_missing_tags(products_to_tag):
     return problems
 
 
-def tag_products(
-    products,
-    fail_fast=False,
+def tag_product(
+    name,
+    data,
     dry_run=False,
+    journal=None,
+    deadline=None,
 ):
-    problems = []
-    for name, data in products.items():
-        repo = data['repo']
-        t_tag = data['target_tag']
+    """Create/update the git tag for a single product.
 
-        info(textwrap.dedent("""\
-            tagging repo: {repo} @
-              sha: {sha} as {gt}
-              (eups version: {et})
-              external repo: {v}
-              replace existing tag: {update}\
-            """).format(
-            repo=repo.full_name,
-            sha=t_tag.sha,
-            gt=t_tag.name,
-            et=data['eups_version'],
-            v=data['v'],
-            update=data['update_tag'],
-        ))
+    Raises
+    ------
+    DeadlineError
+        If `deadline` has passed.  No api calls are made.
 
-        if dry_run:
-            info('  (noop)')
-            continue
+    codekit.pygithub.CaughtRepositoryError
+        Upon a github api error.
+    """
+    repo = data['repo']
+    t_tag = data['target_tag']
+    # absent from products read from a plan
+    tag_index = data.get('tag_index')
+
+    if deadline is not None and time.monotonic() > deadline:
+        raise DeadlineError(name)
+
+    info(textwrap.dedent("""\
+        tagging repo: {repo} @
+          sha: {sha} as {gt}
+          (eups version: {et})
+          external repo: {v}
+          replace existing tag: {update}\
+        """).format(
+        repo=repo.full_name,
+        sha=t_tag.sha,
+        gt=t_tag.name,
+        et=data['eups_version'],
+        v=data['v'],
+        update=data['update_tag'],
+    ))
 
-        try:
+    if dry_run:
+        info('  (noop)')
+        return
+
+    try:
+        tag_sha = journal.tag_sha(name, t_tag.sha) if journal else None
+        if tag_sha:
+            debug("  using journaled tag object {sha}".format(sha=tag_sha))
+        else:
             tag_obj = repo.create_git_tag(
                 t_tag.name,
                 t_tag.message,
@@ -711,34 +1125,353 @@ def tag_products(
                 tagger=t_tag.tagger,
             )
             debug("  created tag object {tag_obj}".format(tag_obj=tag_obj))
-
-            if data['update_tag']:
+            tag_sha = tag_obj.sha
+            if journal:
+                journal.record('tag', name, repo, t_tag, tag_sha)
+
+        if data['update_tag']:
+            ref = data.get('existing_ref')
+            if ref is None and tag_index is not None:
+                ref = tag_index.find_tag_by_name(t_tag.name, safe=False)
+            if ref is None:
                 ref = pygithub.find_tag_by_name(
                     repo,
                     t_tag.name,
                     safe=False,
                 )
-                ref.edit(tag_obj.sha, force=True)
-                debug("  updated existing ref: {ref}".format(ref=ref))
+            ref.edit(tag_sha, force=True)
+            debug("  updated existing ref: {ref}".format(ref=ref))
+        else:
+            ref = repo.create_git_ref(
+                "refs/tags/{t}".format(t=t_tag.name),
+                tag_sha
+            )
+            debug("  created ref: {ref}".format(ref=ref))
+        if tag_index is not None:
+            tag_index.add(ref)
+        if journal:
+            journal.record('ref', name, repo, t_tag, tag_sha)
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        msg = "error creating tag: {t}".format(t=t_tag.name)
+        raise pygithub.CaughtRepositoryError(repo, e, msg) from None
+
+
+def tag_products(
+    products,
+    fail_fast=False,
+    dry_run=False,
+    journal=None,
+    deadline=None,
+    jobs=1,
+):
+    """Create/update git tags.
+
+    Parameters
+    ----------
+    products: dict
+        output of `check_product_tags()`
+
+    journal: TagJournal, optional
+        Record completed steps and skip git tag objects which have already
+        been created.
+
+    deadline: float, optional
+        `time.monotonic()` value after which no further products are tagged.
+
+    jobs: int, optional
+        Number of products to tag concurrently.  Under `fail_fast`, queued
+        products are not tagged after the first error but tags which are in
+        flight are allowed to complete.
+    """
+    problems = []
+    tagged = 0
+    deadline_reached = False
+
+    def tag(item):
+        name, data = item
+        return tag_product(
+            name,
+            data,
+            dry_run=dry_run,
+            journal=journal,
+            deadline=deadline,
+        )
+
+    with codetools.OrderedThreadPool(jobs, fail_fast=fail_fast) as pool:
+        for (name, data), f in pool.map(tag, products.items()):
+            try:
+                f.result()
+            except DeadlineError:
+                deadline_reached = True
+                # do not start tagging any more products
+                pool.cancel()
+            except pygithub.CaughtRepositoryError as e:
+                if fail_fast:
+                    raise
+                problems.append(e)
+                error(e)
             else:
-                ref = repo.create_git_ref(
-                    "refs/tags/{t}".format(t=t_tag.name),
-                    tag_obj.sha
-                )
-                debug("  created ref: {ref}".format(ref=ref))
+                tagged += 1
+
+    if deadline_reached:
+        yikes = DeadlineError(
+            "deadline reached; {n} product(s) not tagged".format(
+                n=len(products) - tagged - len(problems),
+            ))
+        problems.append(yikes)
+        error(yikes)
+
+    if problems:
+        msg = "{n} tag failures".format(n=len(problems))
+        raise codetools.DogpileError(problems, msg)
+
+
+def product_to_plan(data):
+    """Serialize a product from `check_product_tags()` into a json compatible
+    `dict`.
+    """
+    t_tag = data['target_tag']
+    ref = data.get('existing_ref')
+
+    return {
+        'repo': data['repo'].full_name,
+        'eups_version': data['eups_version'],
+        'v': data['v'],
+        'update_tag': data['update_tag'],
+        'target_tag': {
+            'name': t_tag.name,
+            'sha': t_tag.sha,
+            'message': t_tag.message,
+            'tagger': author_to_dict(t_tag.tagger),
+        },
+        'existing_ref': pygithub.git_ref_to_dict(ref) if ref else None,
+    }
+
+
+def product_from_plan(data):
+    """Inverse of `product_to_plan()`.  No github api calls are made.
+
+    The tagger date is set to the current time, as the tag is being created
+    now rather than when the plan was written.
+    """
+    repo = pygithub.get_repo_lazy(pygithub.get_github(), data['repo'])
+
+    t_data = data['target_tag']
+    tagger = github.InputGitAuthor(
+        t_data['tagger']['name'],
+        t_data['tagger']['email'],
+        codetools.current_timestamp(),
+    )
+    t_tag = codekit.pygithub.TargetTag(
+        name=t_data['name'],
+        sha=t_data['sha'],
+        message=t_data['message'],
+        tagger=tagger,
+    )
+
+    ref = data['existing_ref']
+    if ref is not None:
+        ref = pygithub.git_ref_from_dict(repo, ref)
+
+    return {
+        'repo': repo,
+        'eups_version': data['eups_version'],
+        'v': data['v'],
+        'update_tag': data['update_tag'],
+        'target_tag': t_tag,
+        'existing_ref': ref,
+    }
+
+
+def write_plan(path, products, **kwargs):
+    """Write a plan of products to tag as json.
+
+    Parameters
+    ----------
+    path: str
+        plan file path
+
+    products: dict
+        output of `check_product_tags()`
+
+    kwargs:
+        plan metadata -- `org`, `git_tag`, `manifest`, `eups_tag`
+    """
+    plan = dict(kwargs)
+    plan['version'] = PLAN_VERSION
+    plan['created'] = codetools.current_timestamp()
+    plan['products'] = {
+        name: product_to_plan(data) for name, data in products.items()
+    }
+
+    with open(path, 'w') as f:
+        json.dump(plan, f, indent=2, sort_keys=True)
+
+    info("wrote plan for {n} product(s) to: {path}".format(
+        n=len(products),
+        path=path,
+    ))
+
+
+def read_plan(path, org, git_tag, manifest, max_age=None):
+    """Read a plan written by `write_plan()`.  No github api calls are made.
+
+    Parameters
+    ----------
+    path: str
+        plan file path
+
+    org: str
+        name of github org -- must match the plan
+
+    git_tag: str
+        git tag -- must match the plan
+
+    manifest: str
+        versiondb manifest -- must match the plan
+
+    max_age: int, optional
+        maximum age of the plan in seconds
+
+    Returns
+    -------
+    products: dict
+        products to tag, in the same format as returned by
+        `check_product_tags()`
+
+    Raises
+    ------
+    RuntimeError
+        If the plan is incompatible, does not match the requested release, or
+        is too old.
+    """
+    with open(path, 'r') as f:
+        plan = json.load(f)
+
+    if plan.get('version') != PLAN_VERSION:
+        raise RuntimeError(
+            "unsupported plan version: {v}".format(v=plan.get('version')))
+
+    for key, value in (
+        ('org', org),
+        ('git_tag', git_tag),
+        ('manifest', manifest),
+    ):
+        if plan[key] != value:
+            raise RuntimeError(textwrap.dedent("""\
+                plan {path} does not match the requested release
+                  {key}: {value} (plan has: {plan_value})\
+                """).format(
+                path=path,
+                key=key,
+                value=value,
+                plan_value=plan[key],
+            ))
+
+    created = datetime.datetime.strptime(plan['created'], '%Y-%m-%dT%H:%M:%SZ')
+    age = (datetime.datetime.utcnow() - created).total_seconds()
+    debug("plan created: {created} ({age:.0f}s ago)".format(
+        created=plan['created'],
+        age=age,
+    ))
+    if max_age is not None and age > max_age:
+        raise RuntimeError(
+            "plan {path} is {age:.0f}s old (--plan-max-age {max_age})".format(
+                path=path,
+                age=age,
+                max_age=max_age,
+            ))
+
+    return {
+        name: product_from_plan(data)
+        for name, data in plan['products'].items()
+    }
+
+
+def check_plan(products, fail_fast=False):
+    """Check that the existing tags of planned products have not changed since
+    the plan was written.  One api call is made per product.
+
+    Returns
+    -------
+    problems: list
+    """
+    problems = []
+    for name, data in products.items():
+        repo = data['repo']
+        t_tag = data['target_tag']
+        planned_ref = data['existing_ref']
+
+        tag_index = pygithub.RepoTagIndex(repo, prefix=t_tag.name)
+        try:
+            ref = tag_index.find_tag_by_name(t_tag.name)
         except github.RateLimitExceededException:
             raise
         except github.GithubException as e:
-            msg = "error creating tag: {t}".format(t=t_tag.name)
+            msg = "error checking for existance of tag: {t}".format(
+                t=t_tag.name,
+            )
             yikes = pygithub.CaughtRepositoryError(repo, e, msg)
             if fail_fast:
                 raise yikes from None
             problems.append(yikes)
             error(yikes)
+            continue
 
-    if problems:
-        msg = "{n} tag failures".format(n=len(problems))
-        raise codetools.DogpileError(problems, msg)
+        planned_sha = planned_ref.object.sha if planned_ref else None
+        sha = ref.object.sha if ref else None
+
+        if sha != planned_sha:
+            yikes = PlanStaleError(textwrap.dedent("""\
+                tag {tag} in {repo} has changed since the plan was written
+                  planned ref sha: {planned_sha}
+                  current ref sha: {sha}\
+                """).format(
+                tag=t_tag.name,
+                repo=repo.full_name,
+                planned_sha=planned_sha,
+                sha=sha,
+            ))
+            if fail_fast:
+                raise yikes
+            problems.append(yikes)
+            error(yikes)
+
+    return problems
+
+
+def apply_plan(args, journal=None, deadline=None):
+    """Create/update the tags in a plan written by `--plan-out`."""
+    products_to_tag = read_plan(
+        args.apply,
+        org=args.org,
+        git_tag=args.tag,
+        manifest=args.manifest,
+        max_age=args.plan_max_age,
+    )
+
+    if journal:
+        products_to_tag = journal.filter_done(
+            products_to_tag,
+            sha_key=lambda data: data['target_tag'].sha,
+        )
+
+    if args.check_plan:
+        problems = check_plan(products_to_tag, fail_fast=args.fail_fast)
+        if problems:
+            msg = "{n} stale plan entries".format(n=len(problems))
+            raise codetools.DogpileError(problems, msg)
+
+    tag_products(
+        products_to_tag,
+        fail_fast=args.fail_fast,
+        dry_run=args.dry_run,
+        journal=journal,
+        deadline=deadline,
+        jobs=args.write_jobs,
+    )
 
 
 def run():
@@ -747,8 +1480,16 @@ def run():
 
     codetools.setup_logging(args.debug)
 
+    deadline = None
+    if args.deadline is not None:
+        deadline = time.monotonic() + args.deadline
+
     git_tag = args.tag
 
+    journal = None
+    if args.journal:
+        journal = TagJournal(args.journal, git_tag, resume=args.resume)
+
     # if email not specified, try getting it from the gitconfig
     git_email = codetools.lookup_email(args)
     # ditto for the name of the git user
@@ -795,23 +1536,75 @@ def run():
     )
     debug("using taggger: {tagger}".format(tagger=tagger))
 
-    global g
-    g = pygithub.login_github(token_path=args.token_path, token=args.token)
-    org = g.get_organization(args.org)
-    info("tagging repos in org: {org}".format(org=org.login))
+    # the manifest, eups tag, repos.yaml, and org team membership are
+    # independent of each other and are fetched concurrently with the github
+    # login.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        if not args.apply:
+            doc_cache = None
+            if args.cache_dir and not args.no_cache:
+                doc_cache = httpsession.DocumentCache(args.cache_dir)
+
+            manifest_f = executor.submit(
+                fetch_manifest,
+                manifest,
+                base_url=args.versiondb_base_url,
+                cache=doc_cache,
+            )
+            if not args.manifest_only:
+                eups_f = executor.submit(
+                    lambda: eups.EupsTag(
+                        eups_tag,
+                        base_url=args.eupstag_base_url,
+                        cache=doc_cache,
+                        pkgroot=args.eups_pkgroot).products
+                )
 
-    problems = []
+        global g
+        g = pygithub.login_github(
+            token_path=args.token_path,
+            token=args.token,
+            token_pool=args.token_pool,
+            auth=args.auth,
+            app_id=args.app_id,
+            app_key_path=args.app_key_path,
+            app_installation_id=args.app_installation_id,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            pool_size=max(
+                args.jobs,
+                args.write_jobs,
+                pygithub.DEFAULT_POOL_SIZE,
+            ),
+        )
+
+        if args.apply:
+            # skip all pre-flight checks
+            apply_plan(args, journal=journal, deadline=deadline)
+            return
+
+        repo_index_f = executor.submit(
+            fetch_repo_index,
+            path=args.repos_yaml,
+            cache_dir=None if args.no_cache else args.cache_dir,
+        )
+
+        org = g.get_organization(args.org)
+        info("tagging repos in org: {org}".format(org=org.login))
+
+        membership = pygithub.OrgMembershipIndex(org)
+        membership_f = executor.submit(membership.build)
 
-    manifest_products = versiondb.Manifest(
-        manifest,
-        base_url=args.versiondb_base_url).products
+        manifest_obj = manifest_f.result()
+        manifest_products = manifest_obj.products
+        if not args.manifest_only:
+            eups_products = eups_f.result()
+        repo_index = repo_index_f.result()
+        membership_f.result()
+
+    problems = []
 
     if not args.manifest_only:
         # cross-reference eups tag version strings with manifest
-        eups_products = eups.EupsTag(
-            eups_tag,
-            base_url=args.eupstag_base_url).products
-
         # do not fail-fast on non-write operations
         products, err = cross_reference_products(
             eups_products,
@@ -825,9 +1618,29 @@ def run():
         # tag version strings
         products = manifest_products
 
+    if args.only_deps_of or args.only_rdeps_of:
+        products = scope_products(
+            products,
+            manifest_obj.dependency_graph,
+            deps_of=args.only_deps_of,
+            rdeps_of=args.only_rdeps_of,
+        )
+
     if args.limit:
         products = dict(itertools.islice(products.items(), args.limit))
 
+    if journal:
+        # skip products completed by a previous run without any api calls
+        products = journal.filter_done(products)
+
+    # bail out (or wait) before starting if the ratelimit is too low to
+    # complete the run
+    pygithub.check_ratelimit(
+        g,
+        estimate_api_calls(products),
+        wait=args.ratelimit_wait,
+    )
+
     # do not fail-fast on non-write operations
     products, err = get_repo_for_products(
         org=org,
@@ -836,6 +1649,9 @@ def run():
         ext_teams=args.external_team,
         deny_teams=args.deny_team,
         fail_fast=False,
+        jobs=args.jobs,
+        membership=membership,
+        repo_index=repo_index,
     )
     problems += err
 
@@ -862,13 +1678,106 @@ def run():
         msg = "{n} pre-flight error(s)".format(n=len(problems))
         raise codetools.DogpileError(problems, msg)
 
+    if args.plan_out:
+        write_plan(
+            args.plan_out,
+            products_to_tag,
+            org=args.org,
+            git_tag=git_tag,
+            manifest=manifest,
+            eups_tag=None if args.manifest_only else eups_tag,
+        )
+        return
+
     tag_products(
         products_to_tag,
         fail_fast=args.fail_fast,
         dry_run=args.dry_run,
+        journal=journal,
+        deadline=deadline,
+        jobs=args.write_jobs,
     )
 
 
+def fetch_manifest(name, **kwargs):
+    """Return a `versiondb.Manifest` with its products already fetched and
+    parsed."""
+    m = versiondb.Manifest(name, **kwargs)
+    m.products
+    return m
+
+
+def scope_products(products, graph, deps_of=None, rdeps_of=None):
+    """Select the products related to the named products by dependency.
+
+    Parameters
+    ----------
+    products: dict
+        products to select from
+
+    graph: codekit.versiondb.DependencyGraph
+
+    deps_of: list of str, optional
+        Select these products and all of their (transitive) dependencies.
+
+    rdeps_of: list of str, optional
+        Select these products and all of their (transitive) reverse
+        dependencies.  If both `deps_of` and `rdeps_of` are specified, only
+        products selected by both are kept.
+
+    Returns
+    -------
+    products: dict
+        The selected subset of `products`.
+
+    Raises
+    ------
+    RuntimeError
+        If a named product is not in the manifest.
+    """
+    assert deps_of or rdeps_of
+
+    def closure(names, transitive):
+        selected = set()
+        for name in names:
+            try:
+                selected |= transitive(name)
+            except KeyError as e:
+                raise RuntimeError(e.args[0]) from None
+            selected.add(name)
+        return selected
+
+    keep = None
+    if deps_of:
+        keep = closure(deps_of, graph.transitive_dependencies)
+    if rdeps_of:
+        rdeps = closure(rdeps_of, graph.transitive_reverse_dependencies)
+        keep = rdeps if keep is None else keep & rdeps
+
+    scoped = {k: v for k, v in products.items() if k in keep}
+    info("selected {n} of {total} products by dependency".format(
+        n=len(scoped),
+        total=len(products),
+    ))
+
+    return scoped
+
+
+def estimate_api_calls(products):
+    """Estimate the number of github api calls needed to tag products.
+
+    Parameters
+    ----------
+    products: dict
+        products to tag
+
+    Returns
+    -------
+    calls: int
+    """
+    return API_CALLS_FIXED + len(products) * API_CALLS_PER_PRODUCT
+
+
 def main():
     try:
         try:
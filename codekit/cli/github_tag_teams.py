@@ -5,10 +5,14 @@ from codekit import codetools, pygithub
 import argparse
 import codekit.progressbar as pbar
 import github
-import re
+import os
 import sys
 import textwrap
 
+# a shorter common prefix of the tag names, eg. `w` for `w.2018.18` and
+# `wk_2019`, would index most of the tags in a repo to find a few
+MIN_TAG_PREFIX_LEN = 3
+
 
 class GitTagExistsError(Exception):
     pass
@@ -112,11 +116,67 @@ def parse_args():
         '--token',
         default=None,
         help='Literal github personal access token string')
+    parser.add_argument(
+        '--token-pool',
+        default=None,
+        help='File (one token per line) or directory of additional github'
+             ' tokens.  Reads are spread over the ratelimits of all tokens'
+             ' while changes are made with the --token-path/--token token.')
+    parser.add_argument(
+        '--auth',
+        choices=['token', 'app'],
+        default='token',
+        help='Authenticate with a personal access token (--token-path or'
+             ' --token) or as a github app installation (--app-*), which has'
+             ' a higher ratelimit. (default: %(default)s)')
+    parser.add_argument(
+        '--app-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_ID'),
+        help='github app id (default: $DM_SQUARE_GITHUB_APP_ID)')
+    parser.add_argument(
+        '--app-key-path',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_KEY_PATH'),
+        help='Path to the private key (PEM) of the github app'
+             ' (default: $DM_SQUARE_GITHUB_APP_KEY_PATH)')
+    parser.add_argument(
+        '--app-installation-id',
+        default=os.getenv('DM_SQUARE_GITHUB_APP_INSTALLATION_ID'),
+        help='Installation id of the github app.  Required if the app is'
+             ' installed in more than one org.'
+             ' (default: $DM_SQUARE_GITHUB_APP_INSTALLATION_ID)')
+    parser.add_argument(
+        '--cache-dir',
+        default=os.getenv('DM_SQUARE_CACHE_DIR'),
+        help='Directory for a persistent cache of github api responses.'
+             ' Cached responses are revalidated with conditional requests,'
+             ' which do not count against the ratelimit.'
+             ' (default: $DM_SQUARE_CACHE_DIR)')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the github api response cache.')
+    parser.add_argument(
+        '--ratelimit-wait',
+        action='store_true',
+        help='Sleep until the github ratelimit resets, instead of exiting,'
+             ' when the estimated number of api calls exceeds the remaining'
+             ' ratelimit.')
     parser.add_argument(
         '-d', '--debug',
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    parser.add_argument(
+        '--jobs',
+        default=1,
+        type=int,
+        help='Number of repos to create tags in concurrently. (default: 1)')
+    parser.add_argument(
+        '--no-fail-fast',
+        action='store_false',
+        dest='fail_fast',
+        help='Continue tagging the remaining repos after github API error(s).'
+             ' By default, no more repos are tagged after the first error.')
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
 
     delete_group = parser.add_mutually_exclusive_group()
@@ -132,12 +192,12 @@ def parse_args():
              ' -- normally this would be an error.'
              ' (mutually exclusive with --delete)')
 
-    return parser.parse_args()
+    args = parser.parse_args()
 
+    if args.auth == 'app' and not (args.app_id and args.app_key_path):
+        parser.error('--auth app requires --app-id and --app-key-path')
 
-def tag_name_from_ref(ref):
-    assert isinstance(ref, github.GitRef.GitRef), type(ref)
-    return re.sub(r'^refs/tags/', '', ref.ref)
+    return args
 
 
 # XXX this should be refactored to operate similar to
@@ -209,12 +269,23 @@ def find_tags_in_repo(repo, tags):
         tags=tags,
     ))
 
+    # tags which share a common prefix are looked up with a single api call,
+    # otherwise each tag is indexed separately
+    prefix = os.path.commonprefix(tags)
+    if len(prefix) < MIN_TAG_PREFIX_LEN:
+        prefix = None
+    tag_indexes = {}
+
     found_tags = {}
     for t in tags:
-        ref = pygithub.find_tag_by_name(repo, t)
+        p = prefix or t
+        if p not in tag_indexes:
+            tag_indexes[p] = pygithub.RepoTagIndex(repo, prefix=p)
+
+        ref = tag_indexes[p].find_tag_by_name(t)
         if ref and ref.ref:
             debug("  found: {tag} ({ref})".format(tag=t, ref=ref.ref))
-            name = tag_name_from_ref(ref)
+            name = pygithub.tag_name_from_ref(ref)
             found_tags[name] = ref
             continue
 
@@ -223,41 +294,12 @@ def find_tags_in_repo(repo, tags):
     return found_tags
 
 
-cached_teams = {}
-
-
-def find_repo_teams(repo):
-    # Repository objects are unhashable, so we can't use memoization ;(
-    if repo.full_name in cached_teams:
-        return cached_teams[repo.full_name]
-
-    try:
-        # flatten iterator so the results are cached
-        teams = list(repo.get_teams())
-    except github.RateLimitExceededException:
-        raise
-    except github.GithubException as e:
-        msg = 'error getting teams'
-        raise pygithub.CaughtRepositoryError(repo, e, msg) from None
-
-    cached_teams[repo.full_name] = teams
-
-    return teams
-
-
-def get_candidate_teams(org, target_teams):
-    assert isinstance(org, github.Organization.Organization), type(org)
-
-    try:
-        teams = list(org.get_teams())
-    except github.RateLimitExceededException:
-        raise
-    except github.GithubException as e:
-        msg = 'error getting teams'
-        raise pygithub.CaughtOrganizationError(org, e, msg) from None
+def get_candidate_teams(membership, target_teams):
+    assert isinstance(membership, pygithub.OrgMembershipIndex),\
+        type(membership)
 
     debug("looking for teams: {teams}".format(teams=target_teams))
-    tag_teams = [t for t in teams if t.name in target_teams]
+    tag_teams = membership.get_teams_by_name(target_teams)
     debug("found teams: {teams}".format(teams=tag_teams))
 
     if not tag_teams:
@@ -266,9 +308,9 @@ def get_candidate_teams(org, target_teams):
     return tag_teams
 
 
-def get_candidate_repos(teams):
+def get_candidate_repos(membership, teams):
     # flatten generator to list so it can be itererated over multiple times
-    repos = list(pygithub.get_repos_by_team(teams))
+    repos = list(membership.get_repos_by_team(teams))
 
     # find length of longest repo name to nicely format output
     names = [r.full_name for r in repos]
@@ -279,8 +321,8 @@ def get_candidate_repos(teams):
     for r in repos:
         # list only teams which were used to select the repo as a candiate
         # for tagging
-        s_teams = [t.name for t in find_repo_teams(r)
-                   if t.name in team_names]
+        s_teams = [t for t in membership.get_repo_team_names(r)
+                   if t in team_names]
         info("  {repo: >{w}} {teams}".format(
             w=max_name_len,
             repo=r.full_name,
@@ -290,7 +332,13 @@ def get_candidate_repos(teams):
     return repos
 
 
-def check_repos(repos, allow_teams, deny_teams, fail_fast=False):
+def check_repos(
+    membership,
+    repos,
+    allow_teams,
+    deny_teams,
+    fail_fast=False
+):
     problems = []
     for r in repos:
         try:
@@ -298,7 +346,7 @@ def check_repos(repos, allow_teams, deny_teams, fail_fast=False):
                 r,
                 allow_teams=allow_teams,
                 deny_teams=deny_teams,
-                team_names=[t.name for t in find_repo_teams(r)],
+                membership=membership,
             )
         except pygithub.RepositoryTeamMembershipError as e:
             if fail_fast:
@@ -311,7 +359,24 @@ def check_repos(repos, allow_teams, deny_teams, fail_fast=False):
     return problems
 
 
-def tag_repos(absent_tags, **kwargs):
+def tag_repos(absent_tags, jobs=1, fail_fast=True, **kwargs):
+    """Create tags in repos.
+
+    Parameters
+    ----------
+    absent_tags: dict
+        output of `check_tags()`
+
+    jobs: int, optional
+        Number of repos to tag concurrently.
+
+    fail_fast: bool, optional
+        Do not start tagging any more repos after the first error.  Repos
+        which are already being tagged are allowed to complete.
+
+    kwargs:
+        passed to `create_tags()`
+    """
     if not absent_tags:
         info('nothing to do')
         return
@@ -326,10 +391,34 @@ def tag_repos(absent_tags, **kwargs):
             tags=absent_tags[k]['need_tags']
         ))
 
-    for k in absent_tags:
-        r = absent_tags[k]['repo']
-        tags = absent_tags[k]['need_tags']
-        create_tags(r, tags, **kwargs)
+    def tag(k):
+        create_tags(absent_tags[k]['repo'], absent_tags[k]['need_tags'],
+                    **kwargs)
+
+    problems = []
+    with codetools.OrderedThreadPool(jobs, fail_fast=fail_fast) as pool:
+        for k, f in pool.map(tag, absent_tags):
+            try:
+                f.result()
+            except github.RateLimitExceededException:
+                raise
+            except github.GithubException as e:
+                msg = 'error creating tag(s)'
+                yikes = pygithub.CaughtRepositoryError(
+                    absent_tags[k]['repo'],
+                    e,
+                    msg,
+                )
+                problems.append(yikes)
+                error(yikes)
+            except pygithub.CaughtRepositoryError as e:
+                # from get_default_ref()
+                problems.append(e)
+                error(e)
+
+    if problems:
+        msg = "{n} repo(s) have tag failures".format(n=len(problems))
+        raise codetools.DogpileError(problems, msg)
 
 
 def create_tags(repo, tags, tagger, dry_run=False):
@@ -385,7 +474,8 @@ def untag_repos(present_tags, **kwargs):
         info("  {repo: >{w}} {tags}".format(
             w=max_name_len,
             repo=k,
-            tags=[tag_name_from_ref(ref) for ref in present_tags[k]['tags']]
+            tags=[pygithub.tag_name_from_ref(ref)
+                  for ref in present_tags[k]['tags']]
         ))
 
     for k in present_tags:
@@ -433,16 +523,38 @@ def run():
     debug(tagger)
 
     global g
-    g = pygithub.login_github(token_path=args.token_path, token=args.token)
+    g = pygithub.login_github(
+        token_path=args.token_path,
+        token=args.token,
+        token_pool=args.token_pool,
+        auth=args.auth,
+        app_id=args.app_id,
+        app_key_path=args.app_key_path,
+        app_installation_id=args.app_installation_id,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        pool_size=max(args.jobs, pygithub.DEFAULT_POOL_SIZE),
+    )
     org = g.get_organization(gh_org_name)
     info("tagging repos in org: {org}".format(org=org.login))
 
-    tag_teams = get_candidate_teams(org, args.allow_team)
-    target_repos = get_candidate_repos(tag_teams)
+    # team membership of all repos in the org
+    membership = pygithub.OrgMembershipIndex(org)
+
+    tag_teams = get_candidate_teams(membership, args.allow_team)
+    target_repos = get_candidate_repos(membership, tag_teams)
+
+    # bail out (or wait) before starting if the ratelimit is too low to
+    # complete the run
+    pygithub.check_ratelimit(
+        g,
+        estimate_api_calls(target_repos, tags),
+        wait=args.ratelimit_wait,
+    )
 
     problems = []
     # do not fail-fast on non-write operations
     problems += check_repos(
+        membership,
         target_repos,
         args.allow_team,
         args.deny_team,
@@ -468,7 +580,32 @@ def run():
     if args.delete:
         untag_repos(present_tags, dry_run=args.dry_run)
     else:
-        tag_repos(absent_tags, tagger=tagger, dry_run=args.dry_run)
+        tag_repos(
+            absent_tags,
+            jobs=args.jobs,
+            fail_fast=args.fail_fast,
+            tagger=tagger,
+            dry_run=args.dry_run,
+        )
+
+
+def estimate_api_calls(repos, tags):
+    """Estimate the number of github api calls needed to tag repos.
+
+    For each repo, the existing tags are looked up and the default ref is
+    resolved.  Each tag needs a tag object and a ref.
+
+    Parameters
+    ----------
+    repos: list of github.Repository.Repository
+
+    tags: list of str
+
+    Returns
+    -------
+    calls: int
+    """
+    return len(repos) * (2 + 2 * len(tags))
 
 
 def main():
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+from codekit.codetools import debug, error, info
+from codekit import codetools, httpsession, versiondb
+import argparse
+import os
+import sys
+import textwrap
+
+
+def parse_args():
+    """Parse command-line arguments"""
+    prog = 'versiondb-history'
+
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=textwrap.dedent("""
+            Index the products of a range of versiondb manifests in a local
+            sqlite database and query which builds contain a given git sha or
+            eups version of a product.
+
+            Examples:
+
+                # index b1000 - b1999
+                {prog} ingest --start 1000 --end 1999 --jobs 8
+
+                # index builds newer than the last indexed build
+                {prog} ingest --update
+
+                {prog} query --product afw --sha 0b5d6f3
+                {prog} query --product afw --eups-version 16.0-1-g0b5d6f3
+                {prog} query --product afw --changes
+        """).format(prog=prog),
+        epilog='Part of codekit: https://github.com/lsst-sqre/sqre-codekit'
+    )
+
+    parser.add_argument(
+        '--db',
+        default=os.getenv(
+            'LSST_VERSIONDB_HISTORY',
+            '~/.versiondb_history.sqlite3',
+        ),
+        help='sqlite database file'
+             ' (default: $LSST_VERSIONDB_HISTORY or'
+             ' ~/.versiondb_history.sqlite3)')
+    parser.add_argument(
+        '-d', '--debug',
+        action='count',
+        default=codetools.debug_lvl_from_env(),
+        help='Debug mode (can specify several times)')
+    parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
+
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    ingest = subparsers.add_parser(
+        'ingest',
+        help='fetch and index manifests')
+    ingest.add_argument(
+        '--start',
+        type=int,
+        default=1,
+        help='first build number to index (default: 1)')
+    ingest.add_argument(
+        '--end',
+        type=int,
+        help='last build number to index')
+    ingest.add_argument(
+        '--update',
+        action='store_true',
+        help='Index builds after the last indexed build (or --start) until'
+             ' --max-missing consecutive builds do not exist.')
+    ingest.add_argument(
+        '--max-missing',
+        type=int,
+        default=10,
+        help='Number of consecutive missing builds which ends --update'
+             ' (default: 10)')
+    ingest.add_argument(
+        '--jobs',
+        type=int,
+        default=4,
+        help='Number of manifests to fetch concurrently (default: 4)')
+    ingest.add_argument(
+        '--versiondb-base-url',
+        default=os.getenv('LSST_VERSIONDB_BASE_URL'),
+        help='Override the default versiondb base url. May be the path'
+             ' (or file:// url) of a local versiondb git clone.')
+    ingest.add_argument(
+        '--cache-dir',
+        default=os.getenv('DM_SQUARE_CACHE_DIR'),
+        help='Directory for a persistent cache of versiondb manifests.'
+             ' (default: $DM_SQUARE_CACHE_DIR)')
+
+    query = subparsers.add_parser(
+        'query',
+        help='query indexed manifests')
+    query.add_argument(
+        '--product',
+        required=True,
+        help='eups product name')
+    group = query.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        '--sha',
+        help='List builds in which the product is at this git sha.'
+             ' May be abbreviated.')
+    group.add_argument(
+        '--eups-version',
+        help='List builds in which the product is at this eups version.')
+    group.add_argument(
+        '--changes',
+        action='store_true',
+        help='List builds in which the eups version of the product changed.')
+
+    args = parser.parse_args()
+
+    if args.command == 'ingest' and not args.update and args.end is None:
+        parser.error('ingest requires --end or --update')
+
+    return args
+
+
+def ingest(history, args):
+    if args.update:
+        found = history.update(
+            start=args.start,
+            jobs=args.jobs,
+            max_missing=args.max_missing,
+        )
+    else:
+        found = history.ingest(
+            range(args.start, args.end + 1),
+            jobs=args.jobs,
+            fail_fast=False,
+        )
+
+    info("ingested {n} manifest(s)".format(n=found))
+
+
+def query(history, args):
+    if args.changes:
+        for build, eups_version, sha in history.changes(args.product):
+            print(build, eups_version, sha)
+        return
+
+    if args.sha:
+        builds = history.builds_with_sha(args.product, args.sha)
+    else:
+        builds = history.builds_with_eups_version(
+            args.product,
+            args.eups_version,
+        )
+
+    for b in builds:
+        print(b)
+
+
+def run():
+    args = parse_args()
+
+    codetools.setup_logging(args.debug)
+
+    cache = None
+    if getattr(args, 'cache_dir', None):
+        cache = httpsession.DocumentCache(args.cache_dir)
+
+    with versiondb.ManifestHistory(
+        args.db,
+        base_url=getattr(args, 'versiondb_base_url', None),
+        cache=cache,
+    ) as history:
+        if args.command == 'ingest':
+            ingest(history, args)
+        else:
+            query(history, args)
+
+
+def main():
+    try:
+        try:
+            run()
+        except codetools.DogpileError as e:
+            error(e)
+            n = len(e.errors)
+            sys.exit(n if n < 256 else 255)
+        else:
+            sys.exit(0)
+    except SystemExit as e:
+        debug("exit {status}".format(status=str(e)))
+        raise e
+
+
+if __name__ == '__main__':
+    main()
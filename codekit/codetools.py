@@ -8,6 +8,7 @@ from datetime import datetime
 from pkg_resources import get_distribution
 from public import public
 import argparse
+import concurrent.futures
 import gitconfig
 import os
 import shutil
@@ -223,6 +224,56 @@ def github_token(token_path=None, token=None):
     return token
 
 
+@public
+def github_tokens(token_pool):
+    """Return a list of github oauth tokens read from a pool of tokens.
+
+    Parameters
+    ----------
+    token_pool : str
+        Path to either a file with one token per line (blank lines and lines
+        starting with `#` are ignored) or a directory of token files, as
+        written by `github-auth`.
+
+    Returns
+    -------
+    tokens : `list` of `string`
+        Tokens in file or (sorted) filename order, without duplicates.
+
+    Raises
+    ------
+    EnvironmentError
+        If `token_pool` does not exist or contains no tokens.
+    """
+    token_pool = os.path.expandvars(os.path.expanduser(token_pool))
+
+    if os.path.isdir(token_pool):
+        lines = []
+        for name in sorted(os.listdir(token_pool)):
+            path = os.path.join(token_pool, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            with open(path, 'r') as fdo:
+                lines.append(fdo.readline())
+    elif os.path.isfile(token_pool):
+        with open(token_pool, 'r') as fdo:
+            lines = fdo.readlines()
+    else:
+        raise EnvironmentError("No token pool at %s" % token_pool)
+
+    tokens = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#') or line in tokens:
+            continue
+        tokens.append(line)
+
+    if not tokens:
+        raise EnvironmentError("No tokens in %s" % token_pool)
+
+    return tokens
+
+
 @public
 def gitusername():
     """
@@ -309,6 +360,95 @@ class TempDir(object):
         self._temp_dir = None
 
 
+@public
+class OrderedThreadPool(object):
+    """ContextManager for running a callable over many items on a bounded pool
+    of threads while consuming the results in submission order.
+
+    If `fail_fast` is `True`, the first call to raise an exception cancels all
+    work which has not yet started.  Calls which are already running are
+    allowed to finish and the context manager does not exit until they have.
+    Queued work is also cancelled if an exception propagates out of the
+    `with` block.
+
+    For example::
+
+        with OrderedThreadPool(jobs=4) as pool:
+            for item, future in pool.map(fetch, items):
+                print(item, future.result())
+
+    Parameters
+    ----------
+    jobs: int
+        Maximum number of concurrent calls.
+
+    fail_fast: bool
+        Cancel all pending work upon the first exception.
+    """
+
+    def __init__(self, jobs=1, fail_fast=False):
+        super(OrderedThreadPool, self).__init__()
+        self.jobs = jobs if jobs and jobs > 0 else 1
+        self.fail_fast = fail_fast
+        self._executor = None
+        self._futures = []
+        self._failed = False
+
+    def __enter__(self):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.jobs)
+        return self
+
+    def __exit__(self, ttype, value, traceback):
+        if ttype is not None:
+            self.cancel()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def cancel(self):
+        """Cancel all submitted work which has not yet started."""
+        for f in list(self._futures):
+            f.cancel()
+
+    def _on_done(self, future):
+        if not self.fail_fast or future.cancelled():
+            return
+        if future.exception() is not None:
+            self._failed = True
+            self.cancel()
+
+    def map(self, fn, items):
+        """Call `fn(item)` for every item.
+
+        Parameters
+        ----------
+        fn: callable
+            Called with a single item as the only argument.
+
+        items: iterable
+
+        Returns
+        -------
+        generator of `(item, concurrent.futures.Future)` tuples, in the same
+        order as `items`.  Each future has completed when it is yielded.
+        Futures which were cancelled by `fail_fast` are not yielded.
+        """
+        submitted = []
+        for item in items:
+            f = self._executor.submit(fn, item)
+            self._futures.append(f)
+            f.add_done_callback(self._on_done)
+            if self._failed:
+                f.cancel()
+            submitted.append((item, f))
+
+        for item, f in submitted:
+            concurrent.futures.wait([f])
+            if f.cancelled():
+                continue
+            yield item, f
+
+
 @public
 def current_timestamp():
     """Returns current time as ISO8601 formatted string in the Zulu TZ"""
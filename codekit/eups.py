@@ -1,14 +1,37 @@
 """EUPS distrib tag related utility functions."""
 
+from codekit import httpsession
 from codekit.codetools import debug
+from codekit.records import ProductRecord
 from public import public
+import asyncio
+import collections.abc
+import concurrent.futures
+import io
 import logging
+import mmap
+import os
 import re
-import requests
+import sys
 import textwrap
+import types
+import urllib.parse
 
 default_pkgroot = 'https://eups.lsst.codes/stack/src'
 
+# DocumentCache namespace of parsed products -- change if the format changes
+parsed_kind = 'eups.tag.v2'
+
+# maximum number of tags fetched concurrently by `iter_tags()`
+DEFAULT_JOBS = 10
+
+# tag name patterns
+weekly_pattern = r'^w_\d{4}_\d{2}$'
+daily_pattern = r'^d_\d{4}_\d{2}_\d{2}$'
+
+# tag file location used by eups when a pkgroot `config.txt` does not set one
+default_taglist_url = '%(base)s/tags/%(tag)s.list'
+
 
 @public
 def setup_logging(verbosity=0):
@@ -35,112 +58,100 @@ class EupsTag(object):
         Base url to the path for `tags` under an `EUPS_PKGROOT`. Optional.
 
         Eg., `https://eups.lsst.codes/stack/src/tags`
+
+    session: requests.Session
+        Session to fetch with. Optional. The shared
+        `codekit.httpsession` session is used otherwise.
+
+    cache: codekit.httpsession.DocumentCache
+        Cache of tag files and parsed products. Optional. A cached tag file
+        is revalidated with a conditional request.
+
+    pkgroot: str
+        Path (or `file://` url) of a local `EUPS_PKGROOT` mirror. Optional.
+        Takes precedence over `base_url`. The tag file is located per the
+        pkgroot `config.txt`, memory-mapped, and products are parsed lazily
+        upon access.
     """
 
-    def __init__(self, name, base_url=None):
+    def __init__(
+        self,
+        name,
+        base_url=None,
+        session=None,
+        cache=None,
+        pkgroot=None,
+    ):
         self.name = name
-        # note that we are not parsing `config.txt` from the pkgroot and are
-        # assuming tags live under `./tags/`
+        self.session = session
+        self.cache = cache
+        self.pkgroot = pkgroot
+        # note that we are not parsing `config.txt` from an http pkgroot and
+        # are assuming tags live under `./tags/`
         self.base_url = '/'.join((default_pkgroot, 'tags'))
         if base_url:
             self.base_url = base_url
 
-    def __fetch_tag_file(self):
+    def __fetch_tag_lines(self):
+        """Return an iterable of the lines of the tag file, and the whole text
+        if it was cached."""
         # construct url
         tag_url = '/'.join((self.base_url, self.name + '.list'))
-        debug("fetching: {url}".format(url=tag_url))
-
-        r = requests.get(tag_url)
-        r.raise_for_status()
-
-        self.__text = r.text
-
-    def __parse_tag_text(self):
-        products = {}
-
-        parsed_name = None
-        for n, line in enumerate(self.__text.splitlines(), start=1):
-            if not isinstance(line, str):
-                line = str(line, 'utf-8')
-
-            if line.startswith('EUPS'):
-                pat = r'^EUPS distribution ([^ ]+) version list. Version 1.0$'
-                m = re.match(pat, line)
-                if not m:
-                    raise RuntimeError(textwrap.dedent("""
-                        Unknown line format:
-                          {line}
-                        """).format(
-                        line=line,
-                    ))
-                parsed_name = m.group(1)
-                continue
-            # versiondb ref, present in d_2018_05_08 and later
-            if line.startswith('#BUILD'):
-                pat = r'^#BUILD=(b\d{4})$'
-                m = re.match(pat, line)
-                if not m:
-                    raise RuntimeError(textwrap.dedent("""
-                        Unparsable versiondb manifest:
-                          {line}
-                        """).format(
-                        line=line,
-                    ))
-                manifest = m.group(1)
-                continue
-            # skip commented out and blank lines
-            if line.startswith('#') or line == '':
-                continue
 
-            try:
-                # extract the repo and eups tag
-                (name, flavor, eups_version) = line.split()[0:3]
-            except ValueError as e:
-                raise ValueError(
-                    "error parsing eups tag {name} at line {n}:\n{e}".format(
-                        name=self.name,
-                        n=n,
-                        e=e,
-                    ))
-
-            products[name] = {
-                'name': name,
-                'flavor': flavor,
-                'eups_version': eups_version,
-            }
-
-        # sanity check tag name in the file
-        if not self.name == parsed_name:
-            raise RuntimeError(textwrap.dedent("""
-                name in data              : ({dname})
-                  does not match file name: ({fname})\
-                """).format(
-                dname=parsed_name,
-                fname=self.name,
-            ))
+        if self.cache:
+            text = self.cache.fetch(tag_url, session=self.session)
+            return io.StringIO(text), text
 
-        try:
-            self.__manifest = manifest
-        except NameError:
-            self.__manifest = None
-        self.__products = products
+        return httpsession.iter_lines(tag_url, session=self.session), None
 
     def __process(self):
-        self.__fetch_tag_file()
-        self.__parse_tag_text()
+        if self.pkgroot:
+            index = TagFileIndex(tag_path(self.pkgroot, self.name), self.name)
+            self.__products = index
+            self.__manifest = index.manifest
+            return
+
+        lines, text = self.__fetch_tag_lines()
+
+        if text is not None:
+            kind = "{k}.{name}".format(k=parsed_kind, name=self.name)
+            parsed = self.cache.load_parsed(kind, text)
+            if parsed is not None:
+                self.__products, self.__manifest = parsed
+                return
+
+        header = {}
+        products = {
+            p.name: p for p in parse_tag_lines(lines, self.name, header=header)
+        }
+
+        self.__manifest = header.get('manifest')
+        self.__products = products
+
+        if text is not None:
+            self.cache.save_parsed(
+                kind,
+                text,
+                (self.__products, self.__manifest),
+            )
 
     @property
     def products(self):
-        """Return List of products described by the tag"""
+        """Return read-only Dict of products described by the tag
+
+        The values are `codekit.records.ProductRecord` objects.
+        """
         # check for cached data
         try:
-            return self.__products
+            products = self.__products
         except AttributeError:
-            pass
-
-        self.__process()
+            self.__process()
+            products = self.__products
 
-        return self.__products
+        if isinstance(products, TagFileIndex):
+            # already read-only
+            return products
+        return types.MappingProxyType(products)
 
     @property
     def manifest(self):
@@ -156,6 +167,411 @@ class EupsTag(object):
         return self.__manifest
 
 
+@public
+def parse_tag_lines(lines, name, header=None):
+    """Parse the lines of an eups distrib tag file.
+
+    Parameters
+    ----------
+    lines: iterable of str or bytes
+        Lines of the tag file.  The lines are consumed as the products are
+        yielded.
+
+    name: str
+        Name of the tag. Eg., `w_2018_18` or `v15_0`
+
+    header: dict, optional
+        If specified, the tag name and the versiondb manifest ID, if present
+        in the file, are stored as `header['name']` and
+        `header['manifest']`.
+
+    Yields
+    ------
+    product: codekit.records.ProductRecord
+
+    Raises
+    ------
+    RuntimeError
+        If the tag is unparsable or `name` does not match the file content.
+        The name check is done after the last product is yielded.
+    """
+    if header is None:
+        header = {}
+
+    for n, line in enumerate(lines, start=1):
+        if not isinstance(line, str):
+            line = str(line, 'utf-8')
+        line = line.rstrip('\r\n')
+
+        if _parse_header_line(line, header):
+            continue
+
+        yield _parse_product_line(line, name, n)
+
+    _check_tag_name(name, header.get('name'))
+
+
+def _parse_header_line(line, header):
+    """Parse a header, comment, or blank line of a tag file into `header`.
+
+    Returns
+    -------
+    parsed: bool
+        `False` if `line` is a product line.
+    """
+    if line.startswith('EUPS'):
+        pat = r'^EUPS distribution ([^ ]+) version list. Version 1.0$'
+        m = re.match(pat, line)
+        if not m:
+            raise RuntimeError(textwrap.dedent("""
+                Unknown line format:
+                  {line}
+                """).format(
+                line=line,
+            ))
+        header['name'] = m.group(1)
+        return True
+    # versiondb ref, present in d_2018_05_08 and later
+    if line.startswith('#BUILD'):
+        pat = r'^#BUILD=(b\d{4})$'
+        m = re.match(pat, line)
+        if not m:
+            raise RuntimeError(textwrap.dedent("""
+                Unparsable versiondb manifest:
+                  {line}
+                """).format(
+                line=line,
+            ))
+        header['manifest'] = m.group(1)
+        return True
+    # skip commented out and blank lines
+    if line.startswith('#') or line == '':
+        return True
+
+    return False
+
+
+def _parse_product_line(line, name, n):
+    try:
+        # extract the repo and eups tag
+        (product, flavor, eups_version) = line.split()[0:3]
+    except ValueError as e:
+        raise ValueError(
+            "error parsing eups tag {name} at line {n}:\n{e}".format(
+                name=name,
+                n=n,
+                e=e,
+            ))
+
+    return ProductRecord(
+        product,
+        flavor=flavor,
+        eups_version=eups_version,
+    )
+
+
+def _check_tag_name(name, parsed_name):
+    # sanity check tag name in the file
+    if not name == parsed_name:
+        raise RuntimeError(textwrap.dedent("""
+            name in data              : ({dname})
+              does not match file name: ({fname})\
+            """).format(
+            dname=parsed_name,
+            fname=name,
+        ))
+
+
+@public
+def read_pkgroot_config(pkgroot):
+    """Read the `config.txt` of a local `EUPS_PKGROOT`.
+
+    The file is a list of `KEY = value` lines. Blank lines and `#` comments
+    are ignored.
+
+    Parameters
+    ----------
+    pkgroot: str
+        Path of the pkgroot.
+
+    Returns
+    -------
+    config: dict
+        Empty if the pkgroot does not have a `config.txt`.
+    """
+    config = {}
+    try:
+        f = open(os.path.join(pkgroot, 'config.txt'), 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return config
+
+    with f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            key, sep, value = line.partition('=')
+            if sep:
+                config[key.strip()] = value.strip()
+
+    return config
+
+
+@public
+def tag_path(pkgroot, name):
+    """Return the path of a tag file in a local `EUPS_PKGROOT`.
+
+    The location is taken from the `TAGLIST_URL` (or `TAGLIST_DIR`) of the
+    pkgroot `config.txt`, if set, else `tags/<name>.list` as with eups.
+
+    Parameters
+    ----------
+    pkgroot: str
+        Path (or `file://` url) of the pkgroot.
+
+    name: str
+        Name of the tag. Eg., `w_2018_18` or `v15_0`
+    """
+    if pkgroot.startswith('file://'):
+        pkgroot = urllib.parse.urlparse(pkgroot).path
+    pkgroot = os.path.expandvars(os.path.expanduser(pkgroot))
+
+    config = read_pkgroot_config(pkgroot)
+
+    template = default_taglist_url
+    if 'TAGLIST_URL' in config:
+        template = config['TAGLIST_URL']
+    elif 'TAGLIST_DIR' in config:
+        template = '%(base)s/' + config['TAGLIST_DIR'] + '/%(tag)s.list'
+
+    path = template % {'base': pkgroot, 'tag': name}
+    if path.startswith('file://'):
+        path = urllib.parse.urlparse(path).path
+
+    return path
+
+
+@public
+class TagFileIndex(collections.abc.Mapping):
+    """Read-only `dict` of the products of a memory-mapped local tag file.
+
+    Upon creation, the file is scanned once for the header and the offset of
+    each product line.  A product line is parsed into a
+    `codekit.records.ProductRecord` when it is first accessed.
+
+    Parameters
+    ----------
+    path: str
+        Path of the tag file.
+
+    name: str
+        Name of the tag. Eg., `w_2018_18` or `v15_0`
+
+    Raises
+    ------
+    RuntimeError
+        If the tag is unparsable or `name` does not match the file content.
+    """
+
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name
+
+        debug("reading: {path}".format(path=path))
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self._data = b''
+            else:
+                self._data = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._offsets = {}
+        self._records = {}
+        header = self.__index()
+
+        self.manifest = header.get('manifest')
+        _check_tag_name(name, header.get('name'))
+
+    def __index(self):
+        """Record the `(start, end, line number)` of each product line"""
+        header = {}
+        data = self._data
+        size = len(data)
+        intern = sys.intern
+
+        start = 0
+        n = 0
+        while start < size:
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = size
+            n += 1
+
+            line = data[start:end].rstrip(b'\r')
+            if line[:1] in (b'', b'#', b'E'):
+                if _parse_header_line(str(line, 'utf-8'), header):
+                    start = end + 1
+                    continue
+
+            fields = line.split(None, 1)
+            if fields:
+                product = intern(str(fields[0], 'utf-8'))
+                self._offsets[product] = (start, end, n)
+
+            start = end + 1
+
+        return header
+
+    def __getitem__(self, product):
+        try:
+            return self._records[product]
+        except KeyError:
+            pass
+
+        start, end, n = self._offsets[product]
+        line = str(self._data[start:end], 'utf-8').rstrip('\r')
+        record = self._records[product] = \
+            _parse_product_line(line, self.name, n)
+
+        return record
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, product):
+        return product in self._offsets
+
+
+@public
+def list_tags(pattern=None, base_url=None, pkgroot=None, session=None):
+    """Return the names of the tags published in an `EUPS_PKGROOT`.
+
+    Parameters
+    ----------
+    pattern: str, optional
+        Regex the tag names must match. Eg., `eups.weekly_pattern`.
+
+    base_url: str, optional
+        Base url to the path for `tags` under an http `EUPS_PKGROOT`. The
+        tag names are scraped from the directory listing.
+
+    pkgroot: str, optional
+        Path (or `file://` url) of a local `EUPS_PKGROOT` mirror. Takes
+        precedence over `base_url`.
+
+    session: requests.Session, optional
+        Passed to `codekit.httpsession.get()`.
+
+    Returns
+    -------
+    names: list of str
+        sorted tag names
+    """
+    if pkgroot:
+        tags_dir = os.path.dirname(tag_path(pkgroot, 'x'))
+        files = os.listdir(tags_dir)
+    else:
+        if not base_url:
+            base_url = '/'.join((default_pkgroot, 'tags'))
+        r = httpsession.get(base_url + '/', session=session)
+        files = re.findall(r'href="(?:[^"]*/)?([^"/]+)"', r.text)
+
+    names = set()
+    for f in files:
+        if not f.endswith('.list'):
+            continue
+        name = f[:-len('.list')]
+        if pattern and not re.match(pattern, name):
+            continue
+        names.add(name)
+
+    return sorted(names)
+
+
+@public
+async def iter_tags(names, jobs=DEFAULT_JOBS, **kwargs):
+    """Fetch and parse many eups tags concurrently.
+
+    Each tag is fetched and parsed by `EupsTag` on a pool of `jobs` threads,
+    so the calls may share a (thread-safe) session, cache, or local pkgroot.
+
+    Parameters
+    ----------
+    names: iterable of str
+        tag names
+
+    jobs: int, optional
+        Maximum number of tags fetched concurrently.
+
+    kwargs:
+        passed to `EupsTag`
+
+    Yields
+    ------
+    (name, manifest, products): tuple
+        in order of completion. See `EupsTag.manifest` and
+        `EupsTag.products`.
+
+    Raises
+    ------
+    requests.exceptions.HTTPError
+        Or any other error fetching or parsing a tag. Outstanding fetches are
+        cancelled.
+    """
+    loop = asyncio.get_event_loop()
+    # bounds the number of concurrent fetches -- the others are queued
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+
+    def fetch(name):
+        et = EupsTag(name, **kwargs)
+        return name, et.manifest, et.products
+
+    tasks = [loop.run_in_executor(executor, fetch, n) for n in names]
+    try:
+        for f in asyncio.as_completed(tasks):
+            yield await f
+    finally:
+        # queued fetches are cancelled.  Fetches which are already running
+        # can not be, but their futures are and so need not be waited on.
+        for t in tasks:
+            t.cancel()
+        # retrieve the outcome of every task before the loop may be closed
+        await asyncio.gather(*tasks, return_exceptions=True)
+        executor.shutdown(wait=False)
+
+
+@public
+def fetch_tags(names, jobs=DEFAULT_JOBS, **kwargs):
+    """Synchronous version of `iter_tags()`, run on a private event loop.
+
+    For example, to build the version history of a product over all weekly
+    tags::
+
+        names = eups.list_tags(pattern=eups.weekly_pattern)
+        for name, manifest, products in eups.fetch_tags(names, jobs=20):
+            print(name, products['afw']['eups_version'])
+
+    Yields
+    ------
+    (name, manifest, products): tuple
+        in order of completion
+    """
+    loop = asyncio.new_event_loop()
+    agen = iter_tags(names, jobs=jobs, **kwargs)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
+
+
 @public
 def git_tag2eups_tag(git_tag):
     """Convert git tag to an acceptable eups tag format
@@ -0,0 +1,341 @@
+"""Shared HTTP session for fetching non-github-api resources (versiondb
+manifests, eups tags, etc.)."""
+
+from codekit.codetools import debug
+from public import public
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import hashlib
+import json
+import os
+import pickle
+import requests
+import tempfile
+import threading
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (10, 60)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_POOL_MAXSIZE = 10
+
+# transient server errors to retry on
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# configured by get_session() / set_session()
+_session = None
+_session_lock = threading.Lock()
+
+timeout = DEFAULT_TIMEOUT
+
+
+@public
+def make_session(
+    retries=DEFAULT_RETRIES,
+    backoff_factor=DEFAULT_BACKOFF_FACTOR,
+    pool_maxsize=DEFAULT_POOL_MAXSIZE,
+):
+    """Create a `requests.Session` with a keep-alive connection pool, bounded
+    retries with exponential backoff, and compression.
+
+    Parameters
+    ----------
+    retries: int, optional
+        Maximum number of retries of connection errors and transient (5xx)
+        server errors.
+
+    backoff_factor: float, optional
+        See `urllib3.util.retry.Retry`.
+
+    pool_maxsize: int, optional
+        Maximum number of connections kept alive per host.
+
+    Returns
+    -------
+    session: requests.Session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        # return the final response, which the caller checks, rather than
+        # raising MaxRetryError
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_maxsize)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    return session
+
+
+@public
+def get_session():
+    """Return the shared session, creating it upon first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+    return _session
+
+
+@public
+def set_session(session):
+    """Replace the shared session.  Eg., to share a single session across
+    batch tooling or to change retry behavior.
+
+    Parameters
+    ----------
+    session: requests.Session or None
+        `None` causes a new default session to be created upon next use.
+    """
+    global _session
+    assert session is None or isinstance(session, requests.Session), \
+        type(session)
+
+    with _session_lock:
+        _session = session
+
+
+@public
+def get(url, session=None, **kwargs):
+    """`GET` a url with the shared session and raise upon an http error.
+
+    Parameters
+    ----------
+    url: str
+
+    session: requests.Session, optional
+        Session to use instead of the shared session.
+
+    kwargs:
+        passed to `requests.Session.get()`. The module `timeout` is used
+        unless `timeout` is specified.
+
+    Returns
+    -------
+    r: requests.Response
+
+    Raises
+    ------
+    requests.exceptions.HTTPError
+    """
+    if session is None:
+        session = get_session()
+    kwargs.setdefault('timeout', timeout)
+
+    debug("fetching: {url}".format(url=url))
+
+    r = session.get(url, **kwargs)
+    r.raise_for_status()
+
+    return r
+
+
+@public
+def iter_lines(url, session=None, **kwargs):
+    """`GET` a url with the shared session and yield the lines of the
+    response body as they are received, rather than reading the whole body
+    into memory.
+
+    Parameters
+    ----------
+    url: str
+
+    session: requests.Session, optional
+        Session to use instead of the shared session.
+
+    kwargs:
+        passed to `get()`
+
+    Yields
+    ------
+    line: str
+
+    Raises
+    ------
+    requests.exceptions.HTTPError
+    """
+    r = get(url, session=session, stream=True, **kwargs)
+    if r.encoding is None:
+        r.encoding = 'utf-8'
+
+    with r:
+        yield from r.iter_lines(decode_unicode=True)
+
+
+class OfflineCacheMiss(Exception):
+    """A document is not present in the cache while in offline mode"""
+    def __init__(self, url):
+        self.url = url
+
+    def __str__(self):
+        return "not in cache (offline): {url}".format(url=self.url)
+
+
+@public
+class DocumentCache(object):
+    """Persistent cache of fetched documents and of the objects parsed from
+    them.
+
+    Raw documents are keyed by url.  Documents which are `immutable` are
+    never fetched again once cached, other documents are revalidated with a
+    conditional request (`ETag` / `Last-Modified`).  Parsed objects are
+    pickled, keyed by a hash of the document content (and a caller supplied
+    `kind`), so that an unchanged document is not parsed again.
+
+    Parameters
+    ----------
+    path: str
+        Directory to store the cache in.  It is created if it does not exist.
+
+    offline: bool, optional
+        Do not make any requests.  Cached documents are returned as is and
+        `OfflineCacheMiss` is raised for documents which are not cached.
+    """
+
+    def __init__(self, path, offline=False):
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        self.offline = offline
+
+        self._docs_dir = os.path.join(self.path, 'documents')
+        self._parsed_dir = os.path.join(self.path, 'parsed')
+        os.makedirs(self._docs_dir, exist_ok=True)
+        os.makedirs(self._parsed_dir, exist_ok=True)
+
+    @staticmethod
+    def _hash(*values):
+        h = hashlib.sha256()
+        for v in values:
+            h.update(v.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    @staticmethod
+    def _write(path, data):
+        """Atomically write `data` (bytes) to `path`"""
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path),
+            suffix='.tmp',
+        )
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _doc_path(self, url):
+        return os.path.join(self._docs_dir, self._hash(url) + '.json')
+
+    def _load_doc(self, url):
+        try:
+            with open(self._doc_path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fetch(self, url, immutable=False, session=None):
+        """Return the text of a document, from the cache if possible.
+
+        Parameters
+        ----------
+        url: str
+
+        immutable: bool, optional
+            The document never changes once published and a cached copy need
+            not be revalidated.
+
+        session: requests.Session, optional
+            Passed to `get()`.
+
+        Returns
+        -------
+        text: str
+
+        Raises
+        ------
+        OfflineCacheMiss
+            If in offline mode and `url` is not cached.
+        requests.exceptions.HTTPError
+        """
+        doc = self._load_doc(url)
+
+        if doc and (immutable or self.offline):
+            debug("cache hit: {url}".format(url=url))
+            return doc['text']
+        if self.offline:
+            raise OfflineCacheMiss(url)
+
+        headers = {}
+        if doc and doc.get('etag'):
+            headers['If-None-Match'] = doc['etag']
+        if doc and doc.get('last_modified'):
+            headers['If-Modified-Since'] = doc['last_modified']
+
+        r = get(url, session=session, headers=headers)
+        if r.status_code == 304 and doc:
+            debug("cache hit (304): {url}".format(url=url))
+            return doc['text']
+
+        doc = {
+            'url': url,
+            'text': r.text,
+            'etag': r.headers.get('ETag'),
+            'last_modified': r.headers.get('Last-Modified'),
+        }
+        self._write(self._doc_path(url), json.dumps(doc).encode('utf-8'))
+
+        return doc['text']
+
+    def _parsed_path(self, kind, text):
+        return os.path.join(
+            self._parsed_dir,
+            "{kind}-{h}.pickle".format(kind=kind, h=self._hash(kind, text)),
+        )
+
+    def load_parsed(self, kind, text):
+        """Return the object previously stored for `kind` and `text`, or
+        `None`.
+
+        An entry which can not be unpickled, e.g. because it was written by
+        an incompatible version of codekit, is removed and treated as a
+        miss."""
+        path = self._parsed_path(kind, text)
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            debug("discarding cached {kind}: {path}: {e!r}".format(
+                kind=kind,
+                path=path,
+                e=e,
+            ))
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    def save_parsed(self, kind, text, obj):
+        """Store an object parsed from `text`.
+
+        Parameters
+        ----------
+        kind: str
+            namespace of the object -- should change whenever the parser
+            output format does
+
+        text: str
+            document content the object was parsed from
+
+        obj:
+            any pickle-able object
+        """
+        self._write(
+            self._parsed_path(kind, text),
+            pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL),
+        )
@@ -2,17 +2,55 @@
 pygithub based help functions for interacting with the github api.
 """
 
-from codekit.codetools import debug
+from codekit import httpsession
+from codekit.codetools import debug, info
 from github import Github
 from public import public
 import codekit.codetools as codetools
 import collections
+import datetime
+import email.utils
 import github
+import hashlib
 import itertools
+import json
+import jwt
+import os
+import re
+import requests
+import tempfile
 import textwrap
+import threading
+import time
+import urllib.parse
 
 github.MainClass.DEFAULT_TIMEOUT = 15  # timeouts creating teams w/ many repos
 
+DEFAULT_CACHE_SIZE = 100 * 1024 * 1024  # bytes
+
+# keep-alive connections to the api shared by all clients
+DEFAULT_POOL_SIZE = 10
+
+# max page size of the github api
+DEFAULT_PER_PAGE = 100
+
+# api paths which do not count against the ratelimit
+RATELIMIT_EXEMPT_PATHS = ('/rate_limit',)
+
+# http methods which github asks to be made serially
+MUTATING_METHODS = ('POST', 'PATCH', 'PUT', 'DELETE')
+
+# maximum number of times a request is retried after a secondary ratelimit
+SECONDARY_RATELIMIT_RETRIES = 5
+
+GITHUB_API_URL = 'https://api.github.com'
+
+# github app jwts may be valid for at most 10 minutes
+APP_JWT_LIFETIME = 9 * 60  # seconds
+
+# installation tokens are valid for 1 hour
+APP_TOKEN_REFRESH_MARGIN = 5 * 60  # seconds
+
 
 @public
 def setup_logging(verbosity=0):
@@ -21,6 +59,1021 @@ def setup_logging(verbosity=0):
         github.enable_console_debug_logging()
 
 
+class RequestsConnection(object):
+    """Mimic the httplib connection object that `github.Requester` expects,
+    using a `requests.Session` which is shared by all instances.
+
+    pygithub persists a single connection object per `Github` instance and
+    stores the state of the in-flight request on it, which makes it unsafe to
+    use a `Github` object from more than one thread.  A new instance of this
+    class is created for every request, while the keep-alive connection pool
+    of the shared session is reused.
+
+    The shared session is created by `codekit.httpsession.make_session()`,
+    with a keep-alive pool of `pool_size` connections and retries of
+    idempotent requests upon transient server errors.
+    """
+    protocol = 'https'
+    default_port = 443
+
+    # created on first use
+    session = None
+    pool_size = DEFAULT_POOL_SIZE
+    _session_lock = threading.Lock()
+
+    # optional codekit.pygithub.ResponseCache -- configured by login_github()
+    cache = None
+    # optional codekit.pygithub.RateLimitScheduler -- configured by
+    # login_github()
+    scheduler = None
+    # optional codekit.pygithub.ConcurrencyController -- configured by
+    # login_github()
+    controller = None
+    # optional codekit.pygithub.TokenPool -- configured by login_github().
+    # Replaces the ratelimit scheduler for requests made with its first token.
+    token_pool = None
+    # optional codekit.pygithub.GithubAppAuth -- configured by login_github()
+    app_auth = None
+
+    def __init__(self, host, port=None, strict=False, timeout=None, **kwargs):
+        self.host = host
+        self.port = port if port else self.default_port
+        self.timeout = timeout
+        self.verify = kwargs.get('verify', True)
+
+    @classmethod
+    def get_session(cls):
+        with cls._session_lock:
+            if RequestsConnection.session is None:
+                RequestsConnection.session = httpsession.make_session(
+                    pool_maxsize=RequestsConnection.pool_size,
+                )
+        return RequestsConnection.session
+
+    @classmethod
+    def set_pool_size(cls, pool_size):
+        """Resize the keep-alive connection pool of the shared session.
+        Connections in the current pool are discarded."""
+        with cls._session_lock:
+            if pool_size == RequestsConnection.pool_size:
+                return
+            RequestsConnection.pool_size = pool_size
+            if RequestsConnection.session is not None:
+                RequestsConnection.session.close()
+                RequestsConnection.session = None
+
+    def request(self, verb, url, input, headers):
+        self.verb = verb
+        self.url = url
+        self.input = input
+        self.headers = headers
+
+    def getresponse(self):
+        netloc = self.host
+        if self.port != self.default_port:
+            netloc += ":{port}".format(port=self.port)
+        url = "{proto}://{netloc}{path}".format(
+            proto=self.protocol,
+            netloc=netloc,
+            path=self.url,
+        )
+
+        cache = self.cache
+        if cache is not None and cache.is_cacheable(self.verb, self.url):
+            return self._cached_getresponse(cache, url)
+
+        r = self._request(url, self.headers)
+        return github.Requester.RequestsResponse(r)
+
+    def _request(self, url, headers):
+        path = urllib.parse.urlparse(self.url).path
+        exempt = path.endswith(RATELIMIT_EXEMPT_PATHS)
+
+        scheduler = None if exempt else self.scheduler
+        controller = self.controller
+        mutating = self.verb in MUTATING_METHODS
+        # exempt requests are not representative of api latency
+        endpoint = None if exempt else (self.verb, path)
+
+        for attempt in itertools.count(1):
+            request_headers = headers
+
+            # the ratelimit of a specific token may be queried
+            if not exempt and self.token_pool is not None and \
+                    self.token_pool.is_pooled(headers.get('Authorization')):
+                token, scheduler = self.token_pool.select(mutating)
+                request_headers = dict(
+                    headers,
+                    Authorization="token {t}".format(t=token),
+                )
+
+            app_auth = self.app_auth
+            if app_auth is not None and \
+                    app_auth.is_app(request_headers.get('Authorization')):
+                request_headers = dict(
+                    request_headers,
+                    Authorization="token {t}".format(t=app_auth.token()),
+                )
+
+            # a ratelimit sleep must not hold a concurrency slot (or the
+            # mutation lock)
+            if scheduler is not None:
+                scheduler.acquire()
+            if controller is not None:
+                controller.acquire(mutating)
+
+            r = None
+            congested = False
+            retry_after = None
+            start = time.monotonic()
+            try:
+                r = self.get_session().request(
+                    self.verb,
+                    url,
+                    headers=request_headers,
+                    data=self.input,
+                    timeout=self.timeout,
+                    verify=self.verify,
+                )
+            except (
+                requests.exceptions.Timeout,
+                requests.exceptions.ConnectionError,
+            ):
+                congested = True
+                raise
+            finally:
+                if controller is not None:
+                    retry_after = controller.release(
+                        mutating,
+                        r,
+                        time.monotonic() - start,
+                        endpoint=endpoint,
+                        congested=congested,
+                    )
+                if scheduler is not None:
+                    scheduler.update(None if r is None else r.headers)
+
+            if retry_after is None or attempt > SECONDARY_RATELIMIT_RETRIES:
+                return r
+
+            # the controller pauses all requests for `retry_after`
+            info("secondary ratelimit: retrying {verb} {path} in {s:.0f}s"
+                 .format(verb=self.verb, path=self.url, s=retry_after))
+
+    def _cached_getresponse(self, cache, url):
+        key = cache.key(url, self.headers)
+        entry = cache.get(key)
+
+        headers = dict(self.headers)
+        if entry:
+            headers.update(cache.validators(entry))
+
+        r = self._request(url, headers)
+
+        if r.status_code == 304 and entry:
+            debug("cache hit (304): {url}".format(url=url))
+            return CachedResponse(entry, r.headers)
+
+        if r.status_code == 200:
+            cache.set(key, r)
+
+        return github.Requester.RequestsResponse(r)
+
+    def close(self):
+        return
+
+
+class HTTPSRequestsConnection(RequestsConnection):
+    pass
+
+
+class HTTPRequestsConnection(RequestsConnection):
+    protocol = 'http'
+    default_port = 80
+
+
+class CachedResponse(object):
+    """Mimic the httplib response object for a cached response body which has
+    been revalidated by a `304 Not Modified` response.
+
+    Headers from the `304` response, such as the current ratelimit, take
+    precedence over the cached headers.
+    """
+
+    def __init__(self, entry, headers):
+        self.status = entry['status']
+        self.headers = requests.structures.CaseInsensitiveDict(
+            entry['headers'])
+        self.headers.update(headers)
+        self.text = entry['body']
+
+    def getheaders(self):
+        return list(self.headers.items())
+
+    def read(self):
+        return self.text
+
+
+class ResponseCache(object):
+    """Persistent, size capped, on-disk cache of github api `GET` responses.
+
+    Responses are stored along with their `ETag` / `Last-Modified` headers and
+    are always revalidated with a conditional request.  Github does not count
+    `304 Not Modified` replies against the ratelimit.
+
+    Entries are keyed by the request URL and the identity (a hash) of the
+    `Authorization` and `Accept` headers.  The least recently used entries are
+    evicted when the total size of the cache exceeds `max_size`.
+
+    Parameters
+    ----------
+    path: str
+        Directory to store cache entries in.  It is created if it does not
+        exist.
+
+    max_size: int, optional
+        Maximum size of the cache in bytes.
+    """
+
+    # never cache these api paths
+    uncached_paths = RATELIMIT_EXEMPT_PATHS
+
+    def __init__(self, path, max_size=DEFAULT_CACHE_SIZE):
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # total size of all entries -- computed on first write
+        self._size = None
+
+        os.makedirs(self.path, exist_ok=True)
+        debug("using github response cache: {path}".format(path=self.path))
+
+    def is_cacheable(self, verb, url):
+        path = urllib.parse.urlparse(url).path
+        return verb == 'GET' and not path.endswith(self.uncached_paths)
+
+    def key(self, url, headers):
+        h = hashlib.sha256()
+        for v in (
+            url,
+            headers.get('Authorization', ''),
+            headers.get('Accept', ''),
+        ):
+            h.update(v.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        """Return cached entry as a `dict` or `None`"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # mark as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return entry
+
+    def validators(self, entry):
+        """Return conditional request headers to revalidate an entry"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def set(self, key, r):
+        """Store a `requests.Response` if it can be revalidated"""
+        etag = r.headers.get('ETag')
+        last_modified = r.headers.get('Last-Modified')
+        if not (etag or last_modified):
+            return
+
+        entry = {
+            'url': r.url,
+            'status': r.status_code,
+            'headers': dict(r.headers),
+            'body': r.text,
+            'etag': etag,
+            'last_modified': last_modified,
+        }
+
+        path = self._entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        size = os.path.getsize(tmp_path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            try:
+                self._size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+            self._size += size
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def _entries(self):
+        for name in os.listdir(self.path):
+            if not name.endswith('.json'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            yield name, st
+
+    def _scan_size(self):
+        return sum(st.st_size for _, st in self._entries())
+
+    def _evict(self):
+        # least recently used first
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        self._size = sum(st.st_size for _, st in entries)
+
+        for name, st in entries:
+            if self._size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                continue
+            self._size -= st.st_size
+            debug("evicted from cache: {name}".format(name=name))
+
+
+class RateLimitScheduler(object):
+    """Pace github api requests so that the ratelimit is not exhausted.
+
+    The budget is tracked from the `X-RateLimit-*` headers of every response,
+    which are authoritative, less the requests which have been reserved with
+    `delay()` but whose response has not yet been seen.  Responses which do
+    not count against the ratelimit (e.g. a 304 revalidation) thus do not
+    deplete the budget.
+
+    Requests are not delayed while the remaining budget is above
+    `pace_below` (a fraction of the limit).  Below that, a token bucket,
+    refilled at the rate which would spread the remaining calls evenly until
+    the limit resets, paces requests.  When the budget is exhausted, requests
+    sleep until the reset time.
+
+    Parameters
+    ----------
+    pace_below: float, optional
+        Fraction of the ratelimit below which requests are paced.
+
+    burst: int, optional
+        Number of requests which may be made back-to-back while pacing.
+    """
+
+    def __init__(self, pace_below=0.1, burst=10):
+        self.pace_below = pace_below
+        self.burst = burst
+        self._lock = threading.Lock()
+
+        # unknown until the first response has been seen
+        self._header_remaining = None
+        self.limit = None
+        self.reset = None
+        # requests reserved by `delay()` without a response yet
+        self._in_flight = 0
+
+        self._tokens = burst
+        self._last = time.monotonic()
+
+    @property
+    def remaining(self):
+        """Number of calls left in the current window, less those in flight,
+        or `None` if it is not known."""
+        with self._lock:
+            return self._remaining()
+
+    def _remaining(self):
+        if self._header_remaining is None:
+            return None
+        return self._header_remaining - self._in_flight
+
+    def update(self, headers):
+        """Release the request reserved by `delay()` and update the budget
+        from the headers of its response.
+
+        Parameters
+        ----------
+        headers: dict-like or None
+            http response headers, or `None` if no response was received.
+        """
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            limit = int(headers['X-RateLimit-Limit'])
+            reset = int(headers['X-RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            remaining = None
+
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+            if remaining is None:
+                return
+
+            self._header_remaining = remaining
+            self.limit = limit
+            self.reset = reset
+
+    def delay(self):
+        """Reserve a request and return the number of seconds to wait before
+        making it.
+
+        Returns
+        -------
+        delay: float
+            seconds
+        """
+        with self._lock:
+            remaining = self._remaining()
+            # released by `update()`
+            self._in_flight += 1
+
+            if remaining is None:
+                return 0
+
+            now = time.time()
+            if self.reset <= now:
+                # the window has rolled over; wait for fresh headers
+                self._header_remaining = None
+                return 0
+
+            if remaining <= 0:
+                # +1s of slop for clock skew
+                return self.reset - now + 1
+
+            remaining -= 1
+
+            if remaining >= self.limit * self.pace_below:
+                return 0
+
+            # token bucket
+            mono = time.monotonic()
+            rate = (remaining + 1) / max(self.reset - now, 1)
+            self._tokens = min(
+                self.burst,
+                self._tokens + (mono - self._last) * rate,
+            )
+            self._last = mono
+            self._tokens -= 1
+
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / rate
+
+    def acquire(self):
+        """Block until a request may be made.  The reservation is released by
+        `update()`."""
+        wait = self.delay()
+        if wait > 0:
+            debug("ratelimit: sleeping for {s:.1f}s".format(s=wait))
+            time.sleep(wait)
+
+
+class TokenPool(object):
+    """Spread github api requests over the ratelimits of several tokens.
+
+    Each token has its own `RateLimitScheduler`, which tracks the remaining
+    quota of the token from the `X-RateLimit-*` headers of the responses to
+    requests made with it.  Read requests are sent with the token which has
+    the most remaining quota, tokens for which it is not yet known (or whose
+    window has reset) being tried first.  Mutating requests
+    (`MUTATING_METHODS`) are always sent with the first token so that all
+    changes are made by a single identity.
+
+    Parameters
+    ----------
+    tokens: list of str
+        github personal access tokens.  The first is used for mutating
+        requests.
+
+    pace_below: float, optional
+        See `RateLimitScheduler`.
+    """
+
+    def __init__(self, tokens, pace_below=0.1):
+        assert tokens, 'at least one token is required'
+
+        self.tokens = list(tokens)
+        self.schedulers = collections.OrderedDict(
+            (t, RateLimitScheduler(pace_below=pace_below))
+            for t in self.tokens
+        )
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def is_pooled(self, authorization):
+        """Return `True` if a request with the `Authorization` header value
+        `authorization` should be spread over the pool.  Only requests made
+        with the first token are, so that clients explicitly using another
+        token are not affected."""
+        return authorization == "token {t}".format(t=self.tokens[0])
+
+    @staticmethod
+    def headroom(scheduler, now=None):
+        """Return the number of calls a scheduler has left in the current
+        ratelimit window, or `inf` if it is not known."""
+        if now is None:
+            now = time.time()
+        remaining = scheduler.remaining
+        if remaining is None or scheduler.reset <= now:
+            return float('inf')
+        return remaining
+
+    def select(self, mutating=False):
+        """Return a `(token, scheduler)` pair to make a request with.
+
+        The caller should `acquire()` the scheduler before making the request
+        and `update()` it from the response headers.
+
+        Parameters
+        ----------
+        mutating: bool, optional
+            The request modifies state on github.
+        """
+        if mutating:
+            token = self.tokens[0]
+        else:
+            now = time.time()
+            # ties go to the earlier token
+            token = max(
+                self.tokens,
+                key=lambda t: self.headroom(self.schedulers[t], now),
+            )
+        return token, self.schedulers[token]
+
+
+class GithubAppAuthError(Exception):
+    """Authentication as a github app installation failed"""
+    def __init__(self, msg, r=None):
+        self.msg = msg
+        self.r = r
+
+    def __str__(self):
+        if self.r is None:
+            return self.msg
+        return "{msg}: {status} {text}".format(
+            msg=self.msg,
+            status=self.r.status_code,
+            text=self.r.text,
+        )
+
+
+@public
+class GithubAppAuth(object):
+    """Authenticate as an installation of a github app.
+
+    A JWT, signed with the private key of the app, is exchanged for an
+    installation access token.  Installation tokens expire after an hour
+    and the ratelimit of an installation scales with the size of the org it
+    is installed in.
+
+    `Github` clients are created with `placeholder` as their token.
+    `RequestsConnection` replaces it with the current installation token,
+    which is refreshed `refresh_margin` seconds before it expires.
+
+    Parameters
+    ----------
+    app_id: int or str
+        github app id
+
+    private_key: str
+        PEM encoded RSA private key of the app.
+
+    installation_id: int or str, optional
+        If not specified, the app must have exactly one installation.
+
+    base_url: str, optional
+        github api url
+
+    refresh_margin: int, optional
+        seconds
+    """
+
+    def __init__(
+        self,
+        app_id,
+        private_key,
+        installation_id=None,
+        base_url=GITHUB_API_URL,
+        refresh_margin=APP_TOKEN_REFRESH_MARGIN,
+    ):
+        self.app_id = str(app_id)
+        self.private_key = private_key
+        self.installation_id = installation_id
+        self.base_url = base_url.rstrip('/')
+        self.refresh_margin = refresh_margin
+
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = None
+
+    @classmethod
+    def from_key_file(cls, app_id, key_path, **kwargs):
+        """Create an instance with the private key read from `key_path`."""
+        key_path = os.path.expandvars(os.path.expanduser(key_path))
+        with open(key_path, 'r') as f:
+            return cls(app_id, f.read(), **kwargs)
+
+    @property
+    def placeholder(self):
+        """Token which `Github` clients of the installation are created
+        with."""
+        return "github-app-{id}".format(id=self.app_id)
+
+    def is_app(self, authorization):
+        """Return `True` if a request with the `Authorization` header value
+        `authorization` is to be made with the installation token."""
+        return authorization == "token {t}".format(t=self.placeholder)
+
+    def make_jwt(self, now=None):
+        """Return a JWT identifying the app, signed with its private key.
+
+        Raises
+        ------
+        GithubAppAuthError
+            If RS256 signing is unavailable (`cryptography` is required).
+        """
+        if now is None:
+            now = time.time()
+        now = int(now)
+
+        payload = {
+            # allow for clock drift
+            'iat': now - 60,
+            'exp': now + APP_JWT_LIFETIME,
+            'iss': self.app_id,
+        }
+        try:
+            encoded = jwt.encode(payload, self.private_key, algorithm='RS256')
+        except NotImplementedError:
+            raise GithubAppAuthError(
+                'signing a github app jwt requires the cryptography package'
+            ) from None
+
+        # pyjwt < 2.0 returns bytes
+        if isinstance(encoded, bytes):
+            encoded = encoded.decode('ascii')
+        return encoded
+
+    def _app_request(self, method, path):
+        r = RequestsConnection.get_session().request(
+            method,
+            self.base_url + path,
+            headers={
+                'Authorization': "Bearer {jwt}".format(jwt=self.make_jwt()),
+                'Accept': 'application/vnd.github.machine-man-preview+json',
+            },
+            timeout=github.MainClass.DEFAULT_TIMEOUT,
+        )
+        if r.status_code >= 400:
+            raise GithubAppAuthError(
+                "{method} {path} failed".format(method=method, path=path),
+                r,
+            )
+        return r.json()
+
+    def find_installation_id(self):
+        """Return the id of the only installation of the app."""
+        installations = self._app_request('GET', '/app/installations')
+        if len(installations) != 1:
+            raise GithubAppAuthError(textwrap.dedent("""\
+                github app {id} has {n} installations, an installation id is
+                required\
+                """).format(id=self.app_id, n=len(installations)))
+        return installations[0]['id']
+
+    def token(self, now=None):
+        """Return a current installation access token, obtaining a new one if
+        it expires within `refresh_margin` seconds."""
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            if self._token is None \
+                    or self._expires_at - now < self.refresh_margin:
+                self._refresh()
+            return self._token
+
+    def _refresh(self):
+        if self.installation_id is None:
+            self.installation_id = self.find_installation_id()
+
+        data = self._app_request(
+            'POST',
+            "/app/installations/{id}/access_tokens".format(
+                id=self.installation_id),
+        )
+
+        # eg. 2016-07-11T22:14:10Z
+        expires_at = datetime.datetime.strptime(
+            data['expires_at'],
+            '%Y-%m-%dT%H:%M:%SZ',
+        ).replace(tzinfo=datetime.timezone.utc)
+
+        self._token = data['token']
+        self._expires_at = expires_at.timestamp()
+        debug("github app installation token expires at {t}".format(
+            t=data['expires_at']))
+
+
+class ConcurrencyController(object):
+    """Adapt the number of in-flight github api requests to the highest
+    rate github will sustain.
+
+    The concurrency limit is adjusted by additive-increase /
+    multiplicative-decrease (AIMD): it grows by ~1 for every `limit`
+    successful requests and is halved (at most once per `cooldown` seconds)
+    upon a timeout or connection error, a 5xx response (including those
+    retried by the session), a secondary ratelimit, or a request taking more
+    than `latency_factor` times the typical latency of its endpoint.
+
+    The typical latency is an exponentially weighted moving average of the
+    successful (non-304) responses of each endpoint -- the method and the
+    shape of the path, eg. `GET /repos/*/*/git/*/*/*`.
+
+    A secondary (abuse) ratelimit -- a 403 or 429 with `Retry-After`, or a 403
+    mentioning the secondary ratelimit -- pauses all requests for exactly
+    the `Retry-After` seconds (or an exponential backoff from 60s, per the
+    github docs, when it is absent) and the request should be retried.
+
+    Mutating requests (`MUTATING_METHODS`) are made one at a time, as github
+    asks, and at least `mutation_interval` seconds apart.
+
+    Parameters
+    ----------
+    initial: int, optional
+        Initial concurrency limit.
+
+    max_limit: int, optional
+        Upper bound of the concurrency limit.  Should not exceed the size of
+        the connection pool.
+
+    latency_factor: float, optional
+
+    ewma_weight: float, optional
+        Weight of the latest response in the latency moving average.
+
+    cooldown: float, optional
+        Minimum seconds between decreases.
+
+    mutation_interval: float, optional
+        Minimum seconds between mutating requests.
+    """
+
+    # initial wait after a secondary ratelimit without `Retry-After`
+    secondary_backoff = 60
+
+    def __init__(
+        self,
+        initial=4,
+        max_limit=DEFAULT_POOL_SIZE,
+        latency_factor=4.0,
+        ewma_weight=0.2,
+        cooldown=1.0,
+        mutation_interval=0,
+    ):
+        self.max_limit = max_limit
+        self.limit = float(min(initial, max_limit))
+        self.latency_factor = latency_factor
+        self.ewma_weight = ewma_weight
+        self.cooldown = cooldown
+        self.mutation_interval = mutation_interval
+
+        self._cond = threading.Condition()
+        self._mutation_lock = threading.Lock()
+        self._in_flight = 0
+        self._paused_until = 0
+        self._last_decrease = 0
+        self._last_mutation = 0
+        self._backoff = self.secondary_backoff
+        # endpoint key -> moving average latency
+        self._baseline = {}
+
+    @staticmethod
+    def endpoint_key(verb, path):
+        """Return the key under which the latency of a request is averaged.
+
+        The resource type -- the first path component and the one following
+        `{owner}/{repo}` -- are kept and the others, mostly owner, repo, and
+        ref names, are replaced by `*`.  Eg., `GET /repos/*/*/git/*/*/*`.
+        """
+        parts = path.strip('/').split('/')
+        shape = [
+            p if i in (0, 3) else '*' for i, p in enumerate(parts)
+        ]
+        return "{verb} /{path}".format(verb=verb, path='/'.join(shape))
+
+    @staticmethod
+    def session_retried_errors(r):
+        """Return `True` if the session (urllib3) transparently retried a
+        request after an error or a 5xx response"""
+        retries = getattr(getattr(r, 'raw', None), 'retries', None)
+        history = getattr(retries, 'history', None) or ()
+        return any(
+            h.error is not None or (h.status or 0) >= 500 for h in history
+        )
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Return the seconds to wait of a `Retry-After` header, which is
+        either a number of seconds or an http date, or `None`."""
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(when.timestamp() - time.time(), 0)
+
+    @staticmethod
+    def is_secondary_ratelimit(r):
+        """Return `True` if a response is a secondary ratelimit error"""
+        if r.status_code not in (403, 429):
+            return False
+        if 'Retry-After' in r.headers:
+            return True
+        if r.headers.get('X-RateLimit-Remaining') == '0':
+            # the primary ratelimit -- see RateLimitScheduler
+            return False
+        if r.status_code == 429:
+            return True
+        text = r.text.lower()
+        return 'secondary rate limit' in text or 'abuse' in text
+
+    def acquire(self, mutating=False):
+        """Block until a request may be made.  Every `acquire()` must be
+        followed by a `release()`."""
+        if mutating:
+            self._mutation_lock.acquire()
+
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if mutating:
+                    wait = max(
+                        wait,
+                        self._last_mutation + self.mutation_interval -
+                        time.monotonic(),
+                    )
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                if self._in_flight < max(int(self.limit), 1):
+                    break
+                self._cond.wait()
+
+            self._in_flight += 1
+
+    def release(
+        self,
+        mutating=False,
+        r=None,
+        latency=None,
+        endpoint=None,
+        congested=False,
+    ):
+        """Record the outcome of a request.  Must be called, even if the
+        request raised an exception.
+
+        Parameters
+        ----------
+        mutating: bool
+            As passed to `acquire()`.
+
+        r: requests.Response, optional
+            `None` if the request failed without a response.
+
+        latency: float, optional
+            seconds
+
+        endpoint: (str, str), optional
+            http method and url path of the request.  The latency is not
+            tracked unless this is specified.
+
+        congested: bool, optional
+            The request failed with a timeout or connection error.
+
+        Returns
+        -------
+        retry_after: float or None
+            If not `None`, the request hit a secondary ratelimit and should
+            be retried.  All requests are paused for this many seconds.
+        """
+        retry_after = None
+
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if mutating:
+                self._last_mutation = now
+
+            if congested:
+                self._decrease(now)
+            elif r is not None:
+                if self.is_secondary_ratelimit(r):
+                    retry_after = self.parse_retry_after(
+                        r.headers.get('Retry-After'))
+                    if retry_after is None:
+                        retry_after = self._backoff
+                        self._backoff *= 2
+                    self._paused_until = max(
+                        self._paused_until,
+                        now + retry_after,
+                    )
+                    self._decrease(now, force=True)
+                elif r.status_code >= 500 or self.session_retried_errors(r):
+                    self._decrease(now)
+                elif r.status_code < 400:
+                    self._backoff = self.secondary_backoff
+                    if self._is_slow(r, latency, endpoint):
+                        self._decrease(now)
+                    else:
+                        # additive increase of ~1 per `limit` requests
+                        self.limit = min(
+                            self.limit + 1 / self.limit,
+                            self.max_limit,
+                        )
+
+            self._cond.notify_all()
+
+        if mutating:
+            self._mutation_lock.release()
+
+        return retry_after
+
+    def _is_slow(self, r, latency, endpoint):
+        """Update the latency average of an endpoint and return `True` if
+        `latency` is well above it."""
+        # a 304 is served without the work of a full response
+        if latency is None or endpoint is None or r.status_code == 304:
+            return False
+
+        key = self.endpoint_key(*endpoint)
+        baseline = self._baseline.get(key)
+        if baseline is None:
+            self._baseline[key] = latency
+            return False
+
+        self._baseline[key] = \
+            self.ewma_weight * latency + (1 - self.ewma_weight) * baseline
+        return latency > baseline * self.latency_factor
+
+    def _decrease(self, now, force=False):
+        if not force and now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit / 2, 1.0)
+        debug("concurrency limit: {n:.1f}".format(n=self.limit))
+
+
+class RateLimitBudgetError(Exception):
+    """The remaining github ratelimit is too small to complete an operation"""
+    def __init__(self, needed, remaining, limit, reset):
+        self.needed = needed
+        self.remaining = remaining
+        self.limit = limit
+        self.reset = reset
+
+    def __str__(self):
+        return textwrap.dedent("""\
+            Insufficient github ratelimit
+              estimated api calls needed: {needed}
+              remaining api calls:        {remaining} (of {limit})
+              ratelimit reset at:         {reset}\
+            """.format(
+            needed=self.needed,
+            remaining=self.remaining,
+            limit=self.limit,
+            reset=self.reset,
+        ))
+
+
+# applies to all `Github` objects created after this module is imported
+github.Requester.Requester.injectConnectionClasses(
+    HTTPRequestsConnection,
+    HTTPSRequestsConnection,
+)
+
+
 class CaughtRepositoryError(Exception):
     """Simple exception class intended to bundle together a
     github.Repository.Repository object and a thrown exception
@@ -155,9 +1208,566 @@ class TargetTag(collections.UserDict):
         return self[item]
 
 
+class OrgMembershipIndex(object):
+    """In memory index of the team <-> repo membership of a github org.
+
+    The repos of every team in the org are listed once, on first use, rather
+    than asking for the teams of each repo.  As an org has far fewer teams
+    than repos this is much cheaper in API calls.
+
+    Repos which do not belong to the indexed org have their teams retrieved
+    directly from the github API.
+
+    Parameters
+    ----------
+    org: github.Organization.Organization
+        org to index
+    """
+
+    def __init__(self, org):
+        assert isinstance(org, github.Organization.Organization), type(org)
+
+        self.org = org
+        self._lock = threading.Lock()
+        self._teams = None
+        # keyed by lowercased repo full_name as github names are case
+        # insensitive
+        self._repos_by_team = {}
+        self._teams_by_repo = {}
+
+    def build(self):
+        """Retrieve the team membership of the org from github.  This is done
+        automatically upon first use of the index.
+
+        Raises
+        ------
+        codekit.pygithub.CaughtOrganizationError
+        codekit.pygithub.CaughtTeamError
+        """
+        with self._lock:
+            if self._teams is not None:
+                return
+
+            debug("indexing team membership of org: {o}".format(
+                o=self.org.login
+            ))
+
+            try:
+                teams = list(iter_paginated(self.org.get_teams()))
+            except github.RateLimitExceededException:
+                raise
+            except github.GithubException as e:
+                msg = 'error getting teams'
+                raise CaughtOrganizationError(self.org, e, msg) from None
+
+            repos_by_team = {}
+            teams_by_repo = {}
+            for t in teams:
+                try:
+                    repos = list(iter_paginated(t.get_repos()))
+                except github.RateLimitExceededException:
+                    raise
+                except github.GithubException as e:
+                    raise CaughtTeamError(t, e) from None
+
+                debug("  '{t}' {n} repo(s)".format(t=t.name, n=len(repos)))
+                repos_by_team[t.name] = repos
+                for r in repos:
+                    teams_by_repo.setdefault(r.full_name.lower(), []).append(t)
+
+            self._repos_by_team = repos_by_team
+            self._teams_by_repo = teams_by_repo
+            self._teams = teams
+
+    @property
+    def teams(self):
+        """Return list of all `github.Team.Team` objects in the org"""
+        self.build()
+        return self._teams
+
+    def get_teams_by_name(self, team_names):
+        """Find team(s) in the org by name(s).
+
+        Parameters
+        ----------
+        team_names: list(str)
+            list of team names to search for
+
+        Returns
+        -------
+        list of github.Team.Team objects
+        """
+        return [t for t in self.teams if t.name in team_names]
+
+    def get_repos_by_team(self, teams):
+        """Find repos by membership in github team(s).
+
+        Parameters
+        ----------
+        teams: list(github.Team.Team)
+            list of Team objects
+
+        Returns
+        -------
+        generator of github.Repository.Repository objects
+            Each repo is returned once, even if it is a member of several of
+            `teams`.
+        """
+        self.build()
+        return unique_repos(itertools.chain.from_iterable(
+            self._repos_by_team.get(t.name, []) for t in teams
+        ))
+
+    def get_repo_teams(self, repo):
+        """Find the teams which a repo is a member of.
+
+        Parameters
+        ----------
+        repo: github.Repository.Repository
+
+        Returns
+        -------
+        list of github.Team.Team objects
+
+        Raises
+        ------
+        codekit.pygithub.CaughtRepositoryError
+            Upon error retrieving the teams of a repo outside of the org
+        """
+        assert isinstance(repo, github.Repository.Repository), type(repo)
+
+        self.build()
+
+        owner = repo.full_name.split('/')[0]
+        if owner.lower() == self.org.login.lower():
+            return self._teams_by_repo.get(repo.full_name.lower(), [])
+
+        try:
+            return list(repo.get_teams())
+        except github.RateLimitExceededException:
+            raise
+        except github.GithubException as e:
+            msg = 'error getting teams'
+            raise CaughtRepositoryError(repo, e, msg) from None
+
+    def get_repo_team_names(self, repo):
+        """Same as `get_repo_teams()` but returns a list of team names."""
+        return [t.name for t in self.get_repo_teams(repo)]
+
+
+class RepoTagIndex(object):
+    """In memory index of the git tag refs in a github repo.
+
+    All tag refs starting with `prefix` are retrieved with a single, paginated,
+    `matching-refs` call, on first use.  Lookups of tag names starting with
+    `prefix` are then answered without any further API calls, including
+    lookups of tags which do not exist.  Lookups of names which do not start
+    with `prefix` fall back to one `get_git_ref` call per name, the result of
+    which is also cached.
+
+    Parameters
+    ----------
+    repo: github.Repository.Repository
+        repo to index
+
+    prefix: str, optional
+        Only index tags whose name starts with this string.  All tags are
+        indexed by default.
+    """
+
+    def __init__(self, repo, prefix=''):
+        assert isinstance(repo, github.Repository.Repository), type(repo)
+
+        self.repo = repo
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # tag name -> github.GitRef.GitRef or None, if it is known to not exist
+        self._refs = None
+
+    def build(self):
+        """Retrieve the matching tag refs from github.  This is done
+        automatically upon first use of the index.
+
+        Raises
+        ------
+        github.GithubException
+            Upon error from github api
+        """
+        with self._lock:
+            if self._refs is not None:
+                return
+
+            refs = github.PaginatedList.PaginatedList(
+                github.GitRef.GitRef,
+                self.repo._requester,
+                "{url}/git/matching-refs/tags/{prefix}".format(
+                    url=self.repo.url,
+                    prefix=self.prefix,
+                ),
+                None
+            )
+            self._refs = {tag_name_from_ref(r): r for r in refs}
+
+    def find_tag_by_name(self, tag_name, safe=True):
+        """Find tag by name in the index.
+
+        Parameters
+        ----------
+        tag_name: str
+            Short name of tag (not a fully qualified ref).
+
+        safe: bool, optional
+            Defaults to `True`. When `True`, `None` is returned on failure.
+            When `False`, an exception will be raised upon failure.
+
+        Returns
+        -------
+        gh : :class:`github.GitRef` instance or `None`
+
+        Raises
+        ------
+        github.UnknownObjectException
+            If git tag name does not exist in repo.
+        """
+        self.build()
+
+        with self._lock:
+            known = tag_name in self._refs or tag_name.startswith(self.prefix)
+            ref = self._refs.get(tag_name)
+
+        if not known:
+            # the lock is not held during the api call; concurrent lookups of
+            # the same name may both make it
+            ref = find_tag_by_name(self.repo, tag_name)
+            with self._lock:
+                ref = self._refs.setdefault(tag_name, ref)
+
+        if ref is None and not safe:
+            raise github.UnknownObjectException(404, {'message': 'Not Found'})
+
+        return ref
+
+    def add(self, ref):
+        """Add a newly created (or updated) tag ref to the index."""
+        assert isinstance(ref, github.GitRef.GitRef), type(ref)
+
+        self.build()
+        with self._lock:
+            self._refs[tag_name_from_ref(ref)] = ref
+
+    def remove(self, tag_name):
+        """Record that a tag has been deleted."""
+        self.build()
+        with self._lock:
+            self._refs[tag_name] = None
+
+
+def _parse_link_header(link):
+    """Return `dict` of rel -> url of a `Link` header"""
+    links = {}
+    for m in re.finditer(r'<([^>]+)>;\s*rel="([^"]+)"', link or ''):
+        links[m.group(2)] = m.group(1)
+    return links
+
+
+# `PaginatedList` does not expose the parameters of its requests.  Its
+# private (name mangled) attributes are read instead, which couples
+# `iter_paginated()` to the internals of pygithub (as of 1.40).
+PAGINATED_LIST_ATTRS = (
+    'requester',
+    'contentClass',
+    'firstUrl',
+    'firstParams',
+    'headers',
+    'list_item',
+)
+
+
+def _paginated_list_request(plist):
+    """Return `dict` of the request parameters of a `PaginatedList`, or
+    `None` if they can not be found."""
+    try:
+        return {
+            a: getattr(plist, '_PaginatedList__' + a)
+            for a in PAGINATED_LIST_ATTRS
+        }
+    except AttributeError:
+        return None
+
+
+@public
+def iter_paginated(plist, per_page=DEFAULT_PER_PAGE, jobs=None):
+    """Iterate over a `github.PaginatedList.PaginatedList`, eg.
+    `org.get_repos()`, fetching all pages after the first concurrently.
+
+    The first page is requested with `per_page` items and the number of pages
+    is read from its `Link: rel="last"` header.  The remaining pages are then
+    requested in parallel, and items are yielded in listing order as the
+    pages arrive.
+
+    The request parameters are read from the private attributes of
+    `PaginatedList` (see `PAGINATED_LIST_ATTRS`).  Should a pygithub release
+    not have them, `plist` is iterated serially instead.
+
+    Parameters
+    ----------
+    plist: github.PaginatedList.PaginatedList
+
+    per_page: int, optional
+        Number of items per page (github allows at most 100).
+
+    jobs: int, optional
+        Maximum number of concurrent page requests. Defaults to the size of
+        the shared connection pool.
+
+    Yields
+    ------
+    items of the list. Eg., `github.Repository.Repository`
+
+    Raises
+    ------
+    github.GithubException
+        Upon error from github api
+    """
+    assert isinstance(plist, github.PaginatedList.PaginatedList), type(plist)
+
+    req = _paginated_list_request(plist)
+    if req is None:
+        debug("PaginatedList internals not found; fetching pages serially")
+        yield from plist
+        return
+
+    requester = req['requester']
+    content_class = req['contentClass']
+    url = req['firstUrl']
+    params = dict(req['firstParams'] or {})
+    headers = req['headers']
+    list_item = req['list_item']
+
+    params['per_page'] = per_page
+
+    def fetch(page):
+        # the requester opens a new RequestsConnection per request, so it may
+        # be used from several threads at once
+        page_params = dict(params)
+        if page > 1:
+            page_params['page'] = page
+        r_headers, data = requester.requestJsonAndCheck(
+            'GET',
+            url,
+            parameters=page_params,
+            headers=headers,
+        )
+        data = data if data else []
+        if isinstance(data, dict) and list_item in data:
+            data = data[list_item]
+
+        items = [
+            content_class(requester, r_headers, element, completed=False)
+            for element in data if element is not None
+        ]
+        return r_headers, items
+
+    r_headers, items = fetch(1)
+    yield from items
+
+    last = _parse_link_header(r_headers.get('link')).get('last')
+    if not last:
+        return
+
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(last).query)
+    last_page = int(query['page'][0])
+    debug("fetching pages 2-{n} of {url}".format(n=last_page, url=url))
+
+    jobs = jobs or RequestsConnection.pool_size
+    with codetools.OrderedThreadPool(jobs, fail_fast=True) as pool:
+        for _, f in pool.map(fetch, range(2, last_page + 1)):
+            yield from f.result()[1]
+
+
+@public
+def unique_repos(repos):
+    """Yield repos, skipping those already seen. Eg., repos which are a
+    member of several teams."""
+    seen = set()
+    for r in repos:
+        # github names are case insensitive
+        key = r.full_name.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        yield r
+
+
+@public
+def tag_name_from_ref(ref):
+    """Return the short name of a git tag ref. Eg., `refs/tags/foo` -> `foo`"""
+    assert isinstance(ref, github.GitRef.GitRef), type(ref)
+    return re.sub(r'^refs/tags/', '', ref.ref)
+
+
+@public
+def get_repo_lazy(g, full_name):
+    """Return a `Repository` for `full_name` without making an api call.
+
+    Unlike `g.get_repo(full_name, lazy=True)`, the `full_name` attribute may be
+    accessed without causing the object to be completed.
+
+    Parameters
+    ----------
+    g: github.MainClass.Github
+        github object
+
+    full_name: str
+        `<owner>/<repo>`
+
+    Returns
+    -------
+    repo: github.Repository.Repository
+    """
+    assert isinstance(g, github.MainClass.Github), type(g)
+
+    repo = g.get_repo(full_name, lazy=True)
+    return github.Repository.Repository(
+        repo._requester,
+        {},
+        {'url': repo.url, 'full_name': full_name},
+        completed=False,
+    )
+
+
+@public
+def git_ref_to_dict(ref):
+    """Serialize a `GitRef` to a `dict` without making an api call.
+
+    Parameters
+    ----------
+    ref: github.GitRef.GitRef
+
+    Returns
+    -------
+    ref: dict
+        The same layout as the github api `git/refs` resource.
+    """
+    assert isinstance(ref, github.GitRef.GitRef), type(ref)
+
+    return {
+        'ref': ref.ref,
+        'url': ref.url,
+        'object': {
+            'sha': ref.object.sha,
+            'type': ref.object.type,
+            'url': ref.object.url,
+        },
+    }
+
+
 @public
-def login_github(token_path=None, token=None):
-    """Log into GitHub using an existing token.
+def git_ref_from_dict(repo, data):
+    """Create a `GitRef` from the output of `git_ref_to_dict()` without
+    making an api call.
+
+    Parameters
+    ----------
+    repo: github.Repository.Repository
+        repo which the ref belongs to
+
+    data: dict
+
+    Returns
+    -------
+    ref: github.GitRef.GitRef
+    """
+    assert isinstance(repo, github.Repository.Repository), type(repo)
+
+    return github.GitRef.GitRef(repo._requester, {}, data, completed=True)
+
+
+@public
+class GithubClientFactory(object):
+    """Hands out a `Github` client per thread.
+
+    All clients share the keep-alive connection pool (and so TLS
+    connections), response cache, and ratelimit scheduler of
+    `RequestsConnection`, and use the same timeout.  As every request is made
+    with its own `RequestsConnection`, a `Github` object, and the objects
+    fetched with it, may also be used from threads other than the one which
+    obtained it from `get()`.
+
+    Parameters
+    ----------
+    token: str
+        github personal access token
+
+    pool_size: int, optional
+        Size of the shared keep-alive connection pool. Should be at least the
+        number of threads making concurrent requests.
+
+    timeout: int, optional
+        Request timeout in seconds. `github.MainClass.DEFAULT_TIMEOUT` is
+        used otherwise.
+    """
+
+    def __init__(self, token, pool_size=None, timeout=None):
+        self.token = token
+        self.timeout = timeout
+        if self.timeout is None:
+            self.timeout = github.MainClass.DEFAULT_TIMEOUT
+
+        if pool_size:
+            RequestsConnection.set_pool_size(pool_size)
+
+        self._local = threading.local()
+
+    def get(self):
+        """Return the `Github` client of the calling thread, creating it upon
+        first use."""
+        try:
+            return self._local.g
+        except AttributeError:
+            pass
+
+        g = self._local.g = Github(self.token, timeout=self.timeout)
+        return g
+
+    __call__ = get
+
+
+# configured by login_github()
+_client_factory = None
+
+
+@public
+def get_github():
+    """Return the `Github` client of the calling thread.
+
+    Workers should use this, rather than sharing the `Github` object
+    returned by `login_github()`.
+
+    Raises
+    ------
+    RuntimeError
+        If `login_github()` has not been called.
+    """
+    if _client_factory is None:
+        raise RuntimeError('login_github() has not been called')
+    return _client_factory.get()
+
+
+@public
+def login_github(
+    token_path=None,
+    token=None,
+    cache_dir=None,
+    pool_size=None,
+    token_pool=None,
+    auth='token',
+    app_id=None,
+    app_key_path=None,
+    app_installation_id=None,
+):
+    """Log into GitHub using an existing token or as a github app
+    installation.
 
     Parameters
     ----------
@@ -168,14 +1778,80 @@ def login_github(token_path=None, token=None):
         Literal token string. If specified, this value is used instead of
         reading from the token_path file.
 
+    cache_dir: str, optional
+        Directory for a persistent cache of api responses.  Responses are
+        not cached unless this is specified.
+
+    pool_size: int, optional
+        Size of the keep-alive connection pool shared by all clients.  Should
+        be at least the number of threads making concurrent requests.
+
+    token_pool: str, optional
+        Path to a file or directory of additional tokens, see
+        `codetools.github_tokens()`.  Read requests are spread over the
+        ratelimits of all of the tokens while mutating requests are made with
+        the token from `token_path` or `token` (or the app installation).
+
+    auth: str, optional
+        `token` to authenticate with `token_path` or `token`, or `app` to
+        authenticate as an installation of the github app `app_id`.  See
+        `GithubAppAuth`.
+
+    app_id: str, optional
+        github app id.  Required if `auth` is `app`.
+
+    app_key_path: str, optional
+        Path to the private key of the app.  Required if `auth` is `app`.
+
+    app_installation_id: str, optional
+        Required if the app has more than one installation.
+
     Returns
     -------
     gh : :class:`github.GitHub` instance
-        A GitHub login instance.
+        A GitHub login instance for the calling thread.  Other threads should
+        use `get_github()`.
+
+    Raises
+    ------
+    ValueError
+        If `auth` is unknown, or is `app` and `app_id` or `app_key_path` is
+        missing.
     """
+    global _client_factory
+
+    RequestsConnection.app_auth = None
+    if auth == 'token':
+        token = codetools.github_token(token_path=token_path, token=token)
+    elif auth == 'app':
+        if not (app_id and app_key_path):
+            raise ValueError('app auth requires an app id and a private key')
+        RequestsConnection.app_auth = GithubAppAuth.from_key_file(
+            app_id,
+            app_key_path,
+            installation_id=app_installation_id,
+        )
+        token = RequestsConnection.app_auth.placeholder
+    else:
+        raise ValueError("unknown auth mode: {auth}".format(auth=auth))
+
+    RequestsConnection.cache = ResponseCache(cache_dir) if cache_dir else None
+    RequestsConnection.scheduler = RateLimitScheduler()
+    RequestsConnection.token_pool = None
+    if token_pool:
+        tokens = [token] + [
+            t for t in codetools.github_tokens(token_pool) if t != token
+        ]
+        RequestsConnection.token_pool = TokenPool(tokens)
+        info("spreading requests over {n} github tokens".format(
+            n=len(tokens)))
+    RequestsConnection.controller = ConcurrencyController(
+        max_limit=pool_size or RequestsConnection.pool_size,
+    )
+
+    _client_factory = GithubClientFactory(token, pool_size=pool_size)
 
-    token = codetools.github_token(token_path=token_path, token=token)
-    g = Github(token)
+    g = _client_factory.get()
     debug_ratelimit(g)
     return g
 
@@ -229,15 +1905,17 @@ def get_repos_by_team(teams):
     Returns
     -------
     generator of github.Repository.Repository objects
+        Each repo is returned once, even if it is a member of several of
+        `teams`.
 
     Raises
     ------
     github.GithubException
         Upon error from github api
     """
-    return itertools.chain.from_iterable(
-        t.get_repos() for t in teams
-    )
+    return unique_repos(itertools.chain.from_iterable(
+        iter_paginated(t.get_repos()) for t in teams
+    ))
 
 
 @public
@@ -264,7 +1942,7 @@ def get_teams_by_name(org, team_names):
     assert isinstance(org, github.Organization.Organization), type(org)
 
     try:
-        org_teams = list(org.get_teams())
+        org_teams = list(iter_paginated(org.get_teams()))
     except github.RateLimitExceededException:
         raise
     except github.GithubException as e:
@@ -303,7 +1981,79 @@ def debug_ratelimit(g):
 
 
 @public
-def check_repo_teams(repo, allow_teams, deny_teams, team_names=None):
+def check_ratelimit(g, needed, wait=False):
+    """Check that the remaining github ratelimit is sufficient to make
+    `needed` api calls prior to starting an operation.
+
+    Parameters
+    ----------
+    g: github.MainClass.Github
+        github object
+
+    needed: int
+        Estimated number of api calls
+
+    wait: bool, optional
+        Sleep until the ratelimit resets, instead of raising an exception,
+        if the remaining budget is insufficient.
+
+    Raises
+    ------
+    RateLimitBudgetError
+        If the remaining ratelimit is less than `needed` and `wait` is
+        `False` or if `needed` exceeds the total ratelimit.
+    """
+    assert isinstance(g, github.MainClass.Github), type(g)
+
+    pool = RequestsConnection.token_pool
+    if pool is None:
+        rates = [g.get_rate_limit().rate]
+    else:
+        # the budget of the pool is the sum of the budgets of its tokens
+        rates = [
+            Github(t, timeout=github.MainClass.DEFAULT_TIMEOUT)
+            .get_rate_limit().rate
+            for t in pool.tokens
+        ]
+    remaining = sum(r.remaining for r in rates)
+    limit = sum(r.limit for r in rates)
+    # the whole budget is not available until every token has reset
+    reset_at = max(r.reset for r in rates)
+
+    debug(textwrap.dedent("""\
+        estimated api calls: {needed}
+          ratelimit remaining: {remaining} (of {limit})\
+        """).format(
+        needed=needed,
+        remaining=remaining,
+        limit=limit,
+    ))
+
+    if needed <= remaining:
+        return
+
+    err = RateLimitBudgetError(needed, remaining, limit, reset_at)
+    if not wait or needed > limit:
+        raise err
+
+    # rate.reset is a naive utc datetime
+    reset = reset_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+    sleep = max(reset - time.time(), 0) + 1
+    info("waiting {s:.0f}s for github ratelimit reset at {reset}".format(
+        s=sleep,
+        reset=reset_at,
+    ))
+    time.sleep(sleep)
+
+
+@public
+def check_repo_teams(
+    repo,
+    allow_teams,
+    deny_teams,
+    team_names=None,
+    membership=None,
+):
     """Check if repo teams match allow/deny lists
 
     Parameters
@@ -322,6 +2072,10 @@ def check_repo_teams(repo, allow_teams, deny_teams, team_names=None):
         Providing this list saves retrieving the list of teams from the github
         API.
 
+    membership: codekit.pygithub.OrgMembershipIndex
+        index to look up the teams of the repo in, if `team_names` is not
+        provided (optional).
+
     Raises
     ------
     RepositoryTeamMembershipError
@@ -330,7 +2084,9 @@ def check_repo_teams(repo, allow_teams, deny_teams, team_names=None):
     assert isinstance(repo, github.Repository.Repository), type(repo)
 
     # fetch team names if a list was not passed
-    if not team_names:
+    if not team_names and membership:
+        team_names = membership.get_repo_team_names(repo)
+    elif not team_names:
         try:
             team_names = [t.name for t in repo.get_teams()]
         except github.RateLimitExceededException:
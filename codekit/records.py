@@ -0,0 +1,110 @@
+"""Compact product records shared by versiondb manifests and eups tags."""
+
+from public import public
+import collections.abc
+import sys
+
+
+@public
+class ProductRecord(collections.abc.Mapping):
+    """Immutable record of a single product in a versiondb manifest or eups
+    tag.
+
+    Records are slotted and their strings are interned, so that the many
+    copies of the same product name / version / sha across manifests share
+    storage.
+
+    A record may be used as a read-only `dict` with the keys `name`, `sha`,
+    `eups_version`, `flavor`, and `dependencies`.  Fields which are `None`
+    are not present as keys, eg., eups tags do not have a `sha`.  The value
+    of `record['dependencies']` is a new `list` while the attribute
+    `record.dependencies` is a `tuple`.
+
+    Parameters
+    ----------
+    name: str
+        eups product name
+
+    sha: str, optional
+        git sha1
+
+    eups_version: str, optional
+
+    flavor: str, optional
+        eups flavor
+
+    dependencies: iterable of str, optional
+        names of the products this product depends upon
+    """
+
+    __slots__ = ('name', 'sha', 'eups_version', 'flavor', 'dependencies')
+
+    def __init__(
+        self,
+        name,
+        sha=None,
+        eups_version=None,
+        flavor=None,
+        dependencies=None,
+    ):
+        intern = sys.intern
+        if dependencies is not None:
+            dependencies = tuple(intern(d) for d in dependencies)
+
+        for k, v in (
+            ('name', name),
+            ('sha', sha),
+            ('eups_version', eups_version),
+            ('flavor', flavor),
+        ):
+            object.__setattr__(self, k, intern(v) if v is not None else None)
+        object.__setattr__(self, 'dependencies', dependencies)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("{cls} is immutable".format(
+            cls=type(self).__name__))
+
+    def __delattr__(self, key):
+        raise AttributeError("{cls} is immutable".format(
+            cls=type(self).__name__))
+
+    def __reduce__(self):
+        return (type(self), tuple(getattr(self, k) for k in self.__slots__))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+        if key == 'dependencies':
+            return list(value)
+        return value
+
+    def __iter__(self):
+        return (k for k in self.__slots__ if getattr(self, k) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "{cls}({fields})".format(
+            cls=type(self).__name__,
+            fields=', '.join("{k}={v!r}".format(k=k, v=getattr(self, k))
+                             for k in self),
+        )
+
+    def copy(self):
+        """Return a mutable `dict` copy of the record"""
+        return dict(self)
+
+    def replace(self, **kwargs):
+        """Return a new record with the given fields replaced"""
+        fields = {k: getattr(self, k) for k in self.__slots__}
+        fields.update(kwargs)
+        return type(self)(**fields)
+
+    def merge(self, other):
+        """Return a new record with the fields of `self` updated by the
+        present fields of `other` -- analogous to `dict.update()`."""
+        return self.replace(**{k: getattr(other, k) for k in other})
@@ -0,0 +1,180 @@
+"""lsst/repos `repos.yaml` related utility functions."""
+
+from codekit.codetools import debug
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import yaml
+
+default_repo = 'lsst/repos'
+default_path = 'etc/repos.yaml'
+
+# libyaml is an order of magnitude faster than the pure python loader
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def git_blob_sha(data):
+    """Return the git blob sha1 of `data` (bytes) -- the same value as the
+    `sha` of a github contents api response for an unmodified file."""
+    h = hashlib.sha1()
+    h.update("blob {n}\0".format(n=len(data)).encode('utf-8'))
+    h.update(data)
+    return h.hexdigest()
+
+
+class RepoIndex(object):
+    """Index of eups product name -> github repo `<owner>/<name>` from the
+    `repos.yaml` file of `lsst/repos`.
+
+    The whole file is parsed and normalized once so that resolving a product
+    is a `dict` lookup.  If `cache_dir` is specified, the normalized index is
+    persisted, keyed by the git blob sha of `repos.yaml`, and an unchanged
+    file is not parsed again.
+
+    Parameters
+    ----------
+    repo: github.Repository.Repository, optional
+        `lsst/repos` repo to fetch `repos.yaml` from with the github contents
+        api.
+
+    path: str, optional
+        Path to a local checkout of `lsst/repos` or to a `repos.yaml` file.
+        Takes precedence over `repo`.
+
+    cache_dir: str, optional
+        Directory to persist the index in.
+    """
+
+    def __init__(self, repo=None, path=None, cache_dir=None):
+        if repo is None and path is None:
+            raise ValueError('one of repo or path is required')
+
+        self.repo = repo
+        self.path = path
+        self.cache_dir = None
+        if cache_dir:
+            self.cache_dir = os.path.join(
+                os.path.expandvars(os.path.expanduser(cache_dir)),
+                'repos',
+            )
+        self._lock = threading.Lock()
+        self._repos = None
+
+    def __fetch(self):
+        """Return the raw `repos.yaml` and its blob sha"""
+        if self.path:
+            path = os.path.expandvars(os.path.expanduser(self.path))
+            if os.path.isdir(path):
+                path = os.path.join(path, default_path)
+            debug("reading: {path}".format(path=path))
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            return data, git_blob_sha(data)
+
+        debug("fetching: {repo}/{path}".format(
+            repo=self.repo.full_name,
+            path=default_path,
+        ))
+        content = self.repo.get_contents(default_path)
+        return content.decoded_content, content.sha
+
+    def __cache_file(self, sha):
+        return os.path.join(self.cache_dir, "{sha}.json".format(sha=sha))
+
+    def __load(self, sha):
+        if not self.cache_dir:
+            return None
+
+        try:
+            with open(self.__cache_file(sha), 'r', encoding='utf-8') as f:
+                repos = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        debug("loaded repos.yaml index: {sha}".format(sha=sha))
+        return repos
+
+    def __save(self, sha, repos):
+        if not self.cache_dir:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(repos, f)
+        os.replace(tmp_path, self.__cache_file(sha))
+
+    @staticmethod
+    def normalize(entry):
+        """Return the `<owner>/<name>` of a `repos.yaml` entry.
+
+        Parameters
+        ----------
+        entry: str or dict
+            Either a url or a `dict` with a `url` key.
+        """
+        if isinstance(entry, dict):
+            entry = entry['url']
+
+        return re.sub(
+            r"^https?://github\.com/(.+?)(\.git)?$",
+            r"\1",
+            entry
+        )
+
+    @classmethod
+    def parse(cls, data):
+        """Parse and normalize the text of `repos.yaml`.
+
+        Returns
+        -------
+        repos: dict
+            eups product name -> `<owner>/<name>`
+        """
+        raw = yaml.load(data, Loader=Loader)
+
+        repos = {}
+        for name, entry in raw.items():
+            try:
+                repos[name] = cls.normalize(entry)
+            except (KeyError, TypeError):
+                debug("skipping unparsable repos.yaml entry: {name}".format(
+                    name=name,
+                ))
+
+        return repos
+
+    def build(self):
+        """Fetch and index `repos.yaml`.  This is done automatically upon
+        first use of the index."""
+        with self._lock:
+            if self._repos is not None:
+                return
+
+            data, sha = self.__fetch()
+
+            repos = self.__load(sha)
+            if repos is None:
+                repos = self.parse(data)
+                self.__save(sha, repos)
+
+            self._repos = repos
+
+    @property
+    def repos(self):
+        """Return `dict` of eups product name -> `<owner>/<name>`"""
+        self.build()
+        return self._repos
+
+    def __getitem__(self, name):
+        return self.repos[name]
+
+    def __contains__(self, name):
+        return name in self.repos
+
+    def __len__(self):
+        return len(self.repos)
@@ -1,15 +1,31 @@
 """versionDB related utility functions."""
 
-from codekit.codetools import debug
+from codekit import codetools, httpsession
+from codekit.codetools import debug, error, info
+from codekit.records import ProductRecord
 from public import public
+import array
+import bisect
+import collections.abc
+import heapq
+import io
 import logging
+import os
 import re
 import requests
+import sqlite3
+import subprocess
 import textwrap
+import threading
+import types
+import urllib.parse
 
 default_base_url =\
     'https://raw.githubusercontent.com/lsst/versiondb/master/manifests'
 
+# DocumentCache namespace of parsed products -- change if the format changes
+parsed_kind = 'versiondb.manifest.v2'
+
 
 @public
 def setup_logging(verbosity=0):
@@ -24,8 +40,153 @@ def setup_logging(verbosity=0):
         requests_log.propagate = True
 
 
+class ManifestNotFoundError(Exception):
+    """A manifest does not exist in a local versiondb clone"""
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    def __str__(self):
+        return "manifest {name} not found in {path}".format(
+            name=self.name,
+            path=self.path,
+        )
+
+
+def is_local(base_url):
+    """Return `True` if `base_url` is a `file://` url or a local path"""
+    scheme = urllib.parse.urlparse(base_url).scheme
+    # a windows drive letter would parse as a single character scheme
+    return scheme == 'file' or len(scheme) <= 1
+
+
+@public
+class LocalVersionDB(object):
+    """Reads manifests from a local clone of `lsst/versiondb`.
+
+    Manifest blobs are streamed from a single long-lived `git cat-file
+    --batch` process, rather than spawning a process (or making an http
+    request) per manifest.  Reads are serialized and the instance may be
+    shared between threads.
+
+    Parameters
+    ----------
+    path: str
+        Path to (or `file://` url of) the clone or its `manifests` directory.
+        The working tree is not used -- manifests are read from `ref`.
+
+    ref: str, optional
+        git ref to read manifests from.
+    """
+
+    # path of the manifests in the versiondb repo
+    manifests_dir = 'manifests'
+
+    def __init__(self, path, ref='HEAD'):
+        if path.startswith('file://'):
+            path = urllib.parse.urlparse(path).path
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        self.ref = ref
+
+        self._lock = threading.Lock()
+        self._proc = None
+        self._prefix = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ttype, value, traceback):
+        self.close()
+
+    def __start(self):
+        # path of `self.path` relative to the top of the repo
+        prefix = subprocess.check_output(
+            ['git', 'rev-parse', '--show-prefix'],
+            cwd=self.path,
+            universal_newlines=True,
+        ).strip()
+        self._prefix = prefix or self.manifests_dir + '/'
+
+        debug("starting git cat-file --batch in {path}".format(
+            path=self.path))
+        self._proc = subprocess.Popen(
+            ['git', 'cat-file', '--batch'],
+            cwd=self.path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def close(self):
+        """Stop the `git cat-file` process"""
+        with self._lock:
+            if self._proc is None:
+                return
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc.stdout.close()
+            self._proc = None
+
+    def read(self, name):
+        """Return the text of a manifest.
+
+        Parameters
+        ----------
+        name: str
+            Name of the manifest . Eg., `b1234`
+
+        Returns
+        -------
+        text: str
+
+        Raises
+        ------
+        ManifestNotFoundError
+        """
+        with self._lock:
+            if self._proc is None:
+                self.__start()
+
+            obj = "{ref}:{prefix}{name}.txt".format(
+                ref=self.ref,
+                prefix=self._prefix,
+                name=name,
+            )
+            self._proc.stdin.write(obj.encode('utf-8') + b'\n')
+            self._proc.stdin.flush()
+
+            # `<sha> blob <size>` or `<obj> missing`
+            header = self._proc.stdout.readline().decode('utf-8')
+            if not header:
+                raise RuntimeError("git cat-file exited unexpectedly")
+            fields = header.split()
+            if fields[-1] == 'missing' or fields[1] != 'blob':
+                raise ManifestNotFoundError(name, self.path)
+
+            size = int(fields[2])
+            # content is followed by a newline
+            data = self._proc.stdout.read(size + 1)[:size]
+
+        return data.decode('utf-8')
+
+
+_local_versiondbs = {}
+_local_versiondbs_lock = threading.Lock()
+
+
+@public
+def get_local_versiondb(path):
+    """Return the shared `LocalVersionDB` of a clone, creating it upon first
+    use."""
+    with _local_versiondbs_lock:
+        try:
+            return _local_versiondbs[path]
+        except KeyError:
+            db = _local_versiondbs[path] = LocalVersionDB(path)
+            return db
+
+
 # ~duplicates the Manifest class in lsst_buid/python/lsst/ci/prepare.py but
-# operates over http rather than on a local git clone
+# operates over http, or a local git clone via `LocalVersionDB`
 class Manifest(object):
     """Representation of a "versionDB" manifest. AKA `bNNNN`. AKA `bxxxx`. AKA
     `BUILD`. AKA `BUILD_ID`. AKA `manifest`.
@@ -40,96 +201,738 @@ class Manifest(object):
 
         Eg.:
             `https://raw.githubusercontent.com/lsst/versiondb/master/manifests`
+
+        A `file://` url or path of a local versiondb clone is read with a
+        shared `LocalVersionDB`.
+
+    session: requests.Session
+        Session to fetch with. Optional. The shared
+        `codekit.httpsession` session is used otherwise.
+
+    cache: codekit.httpsession.DocumentCache
+        Cache of manifest files and parsed products. Optional. A published
+        manifest never changes and a cached copy is not revalidated.
     """
 
-    def __init__(self, name, base_url=None):
+    def __init__(self, name, base_url=None, session=None, cache=None):
         self.name = name
+        self.session = session
+        self.cache = cache
         self.base_url = default_base_url
         if base_url:
             self.base_url = base_url
 
-    def __fetch_manifest_file(self):
+    def __fetch_manifest_lines(self):
+        """Return an iterable of the lines of the manifest file, and the whole
+        text if it was cached."""
+        if is_local(self.base_url):
+            text = get_local_versiondb(self.base_url).read(self.name)
+            return io.StringIO(text), text
+
         # construct url
         tag_url = '/'.join((self.base_url, self.name + '.txt'))
-        debug("fetching: {url}".format(url=tag_url))
-
-        r = requests.get(tag_url)
-        r.raise_for_status()
-
-        self.__text = r.text
 
-    def __parse_manifest_text(self):
-        products = {}
+        if self.cache:
+            text = self.cache.fetch(
+                tag_url,
+                immutable=True,
+                session=self.session,
+            )
+            return io.StringIO(text), text
 
-        for n, line in enumerate(self.__text.splitlines(), start=1):
-            if not isinstance(line, str):
-                line = str(line, 'utf-8')
+        return httpsession.iter_lines(tag_url, session=self.session), None
 
-            # skip commented out and blank lines
-            if line.startswith('#') or line == '':
-                continue
-            if line.startswith('BUILD'):
-                pat = r'^BUILD=(b\d{4})$'
-                m = re.match(pat, line)
-                if not m:
-                    raise RuntimeError(textwrap.dedent("""
-                        Unparsable versiondb manifest:
-                          {line}
-                        """).format(
-                        line=line,
-                    ))
-                parsed_name = m.group(1)
-                continue
+    def __process(self):
+        lines, text = self.__fetch_manifest_lines()
 
-            try:
-                # min of 3, max of 4 fields
-                fields = line.split()[0:4]
-                (name, sha, eups_version) = fields[0:3]
-            except ValueError as e:
-                raise ValueError(
-                    "error parsing manifest {name} at line {n}:\n{e}".format(
-                        name=self.name,
-                        n=n,
-                        e=e,
-                    )) from None
-
-            products[name] = {
-                'name': name,
-                'sha': sha,
-                'eups_version': eups_version,
-                'dependencies': [],
-            }
-
-            # the 4th field, if present, is a csv list of deps
-            if len(fields) == 4:
-                dependencies = fields[3:4][0].split(',')
-                products[name]['dependencies'] = dependencies
-
-        # sanity check tag name in the file
-        if not self.name == parsed_name:
-            raise RuntimeError(textwrap.dedent("""
-                name in data              : ({dname})
-                  does not match file name: ({fname})\
-                """).format(
-                dname=parsed_name,
-                fname=self.name,
-            ))
+        if self.cache and text is not None:
+            kind = "{k}.{name}".format(k=parsed_kind, name=self.name)
+            products = self.cache.load_parsed(kind, text)
+            if products is not None:
+                self.__products = products
+                return
 
-        self.__products = products
+        self.__products = {
+            p.name: p for p in parse_manifest_lines(lines, self.name)
+        }
 
-    def __process(self):
-        self.__fetch_manifest_file()
-        self.__parse_manifest_text()
+        if self.cache and text is not None:
+            self.cache.save_parsed(kind, text, self.__products)
 
     @property
     def products(self):
-        """Return Dict of products described by the manifest"""
+        """Return read-only Dict of products described by the manifest
+
+        The values are `codekit.records.ProductRecord` objects.
+        """
         # check for cached data
         try:
-            return self.__products
+            return types.MappingProxyType(self.__products)
         except AttributeError:
             pass
 
         self.__process()
 
-        return self.__products
+        return types.MappingProxyType(self.__products)
+
+    @property
+    def dependency_graph(self):
+        """Return the `DependencyGraph` of the products in the manifest"""
+        try:
+            return self.__graph
+        except AttributeError:
+            pass
+
+        self.__graph = DependencyGraph(self.products)
+
+        return self.__graph
+
+
+@public
+class DependencyGraph(object):
+    """Dependency graph of the products of a manifest.
+
+    Products are numbered (in name order) and the edges are stored as arrays
+    of product ids, in both directions.  Transitive closures are memoized.
+
+    Parameters
+    ----------
+    products: dict
+        product name -> `codekit.records.ProductRecord`. Eg.,
+        `Manifest.products`. Dependencies which are not themselves in
+        `products` are ignored.
+    """
+
+    def __init__(self, products):
+        self.names = sorted(products)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+        self._deps = [array.array('I') for _ in self.names]
+        self._rdeps = [array.array('I') for _ in self.names]
+        for name, i in self.ids.items():
+            for dep in products[name].dependencies or ():
+                try:
+                    j = self.ids[dep]
+                except KeyError:
+                    debug("{name} dependency {dep} is not in manifest".format(
+                        name=name,
+                        dep=dep,
+                    ))
+                    continue
+                if j in self._deps[i]:
+                    # deps are sometimes listed more than once
+                    continue
+                self._deps[i].append(j)
+                self._rdeps[j].append(i)
+
+        self._closure = {}
+        self._rclosure = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def __id(self, name):
+        try:
+            return self.ids[name]
+        except KeyError:
+            raise KeyError(
+                "product {name} is not in manifest".format(name=name)
+            ) from None
+
+    def __names(self, ids):
+        return frozenset(self.names[i] for i in ids)
+
+    def dependencies(self, name):
+        """Return `frozenset` of the direct dependencies of a product"""
+        return self.__names(self._deps[self.__id(name)])
+
+    def reverse_dependencies(self, name):
+        """Return `frozenset` of the products which directly depend upon a
+        product"""
+        return self.__names(self._rdeps[self.__id(name)])
+
+    def transitive_dependencies(self, name):
+        """Return `frozenset` of all products a product depends upon"""
+        i = self.__id(name)
+        return self.__names(self.__closure(i, self._deps, self._closure))
+
+    def transitive_reverse_dependencies(self, name):
+        """Return `frozenset` of all products which depend upon a product"""
+        i = self.__id(name)
+        return self.__names(self.__closure(i, self._rdeps, self._rclosure))
+
+    @staticmethod
+    def __closure(start, edges, memo):
+        """Return the `frozenset` of ids reachable from `start`, memoizing
+        the closure of every node visited."""
+        if start in memo:
+            return memo[start]
+
+        # iterative post-order dfs; a node is "visiting" while its
+        # descendants are on the stack
+        visiting = set()
+        stack = [(start, False)]
+        while stack:
+            i, expanded = stack.pop()
+            if i in memo:
+                continue
+
+            if expanded:
+                reachable = set(edges[i])
+                for j in edges[i]:
+                    reachable |= memo[j]
+                memo[i] = frozenset(reachable)
+                continue
+
+            visiting.add(i)
+            stack.append((i, True))
+            for j in edges[i]:
+                if j in memo:
+                    continue
+                if j in visiting:
+                    raise RuntimeError("dependency cycle detected")
+                stack.append((j, False))
+
+        return memo[start]
+
+    def topological_order(self):
+        """Return `list` of product names with every product after all of
+        its dependencies.  Ties are broken by name.
+
+        Raises
+        ------
+        RuntimeError
+            If the graph has a cycle.
+        """
+        pending = [len(d) for d in self._deps]
+        ready = [i for i, n in enumerate(pending) if n == 0]
+        heapq.heapify(ready)
+
+        order = []
+        while ready:
+            i = heapq.heappop(ready)
+            order.append(self.names[i])
+            for j in self._rdeps[i]:
+                pending[j] -= 1
+                if pending[j] == 0:
+                    heapq.heappush(ready, j)
+
+        if len(order) != len(self.names):
+            raise RuntimeError("dependency cycle detected")
+
+        return order
+
+
+@public
+class ManifestSet(collections.abc.Mapping):
+    """Memory efficient container of many manifests.
+
+    Consecutive manifests differ in only a few products.  Rather than a full
+    `dict` per build, each product has a list of the builds in which it
+    changed (or was added or removed) and its record as of that build -- the
+    first build is the base and later builds are stored as deltas.  The
+    records, whose strings are interned, are shared by all of the builds in
+    which a product is unchanged.
+
+    A `ManifestSet` is a read-only `dict` of manifest name ->
+    `ManifestView`, in the order the builds were added.
+
+    For example::
+
+        ms = ManifestSet.fetch(manifest_name(n) for n in range(3000, 3500))
+        ms['b3123']['afw'].sha
+        for build, record in ms.changes('afw'):
+            print(build, record.eups_version if record else 'removed')
+    """
+
+    def __init__(self):
+        self._builds = []
+        self._positions = {}
+        # product name -> (array of build positions, list of records)
+        self._history = {}
+
+    @classmethod
+    def fetch(cls, names, jobs=1, **kwargs):
+        """Fetch manifests concurrently into a new `ManifestSet`.
+
+        Parameters
+        ----------
+        names: iterable of str
+            manifest names, in build order
+
+        jobs: int, optional
+            Number of manifests to fetch concurrently.
+
+        kwargs:
+            passed to `Manifest`
+
+        Returns
+        -------
+        manifest_set: ManifestSet
+        """
+        ms = cls()
+
+        def fetch(name):
+            return Manifest(name, **kwargs).products
+
+        with codetools.OrderedThreadPool(jobs, fail_fast=True) as pool:
+            for name, f in pool.map(fetch, names):
+                ms.add(name, f.result())
+
+        return ms
+
+    @staticmethod
+    def _same(a, b):
+        return a is b or (
+            a is not None and b is not None and
+            a.sha == b.sha and
+            a.eups_version == b.eups_version and
+            a.dependencies == b.dependencies
+        )
+
+    def add(self, name, products):
+        """Add the next build.
+
+        Parameters
+        ----------
+        name: str
+            manifest name. Eg., `b1234`
+
+        products: dict
+            product name -> `codekit.records.ProductRecord`. Eg.,
+            `Manifest.products`.
+        """
+        if name in self._positions:
+            raise ValueError("manifest {name} is already present".format(
+                name=name))
+
+        pos = len(self._builds)
+        self._builds.append(name)
+        self._positions[name] = pos
+
+        for product, record in products.items():
+            try:
+                positions, records = self._history[product]
+            except KeyError:
+                positions, records = array.array('I'), []
+                self._history[product] = (positions, records)
+
+            if records and self._same(records[-1], record):
+                continue
+            positions.append(pos)
+            records.append(record)
+
+        # products which are no longer present
+        for product, (positions, records) in self._history.items():
+            if product in products or records[-1] is None:
+                continue
+            positions.append(pos)
+            records.append(None)
+
+    def _record(self, product, pos):
+        """Return the record of a product as of a build position, or
+        `None`."""
+        try:
+            positions, records = self._history[product]
+        except KeyError:
+            return None
+
+        i = bisect.bisect_right(positions, pos) - 1
+        if i < 0:
+            return None
+        return records[i]
+
+    def __getitem__(self, name):
+        return ManifestView(self, name, self._positions[name])
+
+    def __iter__(self):
+        return iter(self._builds)
+
+    def __len__(self):
+        return len(self._builds)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def products(self):
+        """Return `list` of the names of all products in any build"""
+        return list(self._history)
+
+    def changes(self, product):
+        """Iterate over the builds in which a product was added, changed, or
+        removed.
+
+        Yields
+        ------
+        (name, record): tuple
+            manifest name and the `codekit.records.ProductRecord` of the
+            product as of that build, or `None` if it was removed.
+        """
+        try:
+            positions, records = self._history[product]
+        except KeyError:
+            return
+
+        for pos, record in zip(positions, records):
+            yield self._builds[pos], record
+
+
+@public
+class ManifestView(collections.abc.Mapping):
+    """Read-only `dict` of the products of a single build in a
+    `ManifestSet`. Creating a view is O(1) and a product lookup is a binary
+    search of that product's changes."""
+
+    def __init__(self, manifest_set, name, pos):
+        self.name = name
+        self._set = manifest_set
+        self._pos = pos
+
+    def __getitem__(self, product):
+        record = self._set._record(product, self._pos)
+        if record is None:
+            raise KeyError(product)
+        return record
+
+    def __contains__(self, product):
+        return self._set._record(product, self._pos) is not None
+
+    def __iter__(self):
+        for product in self._set._history:
+            if self._set._record(product, self._pos) is not None:
+                yield product
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+@public
+def parse_manifest_lines(lines, name):
+    """Parse the lines of a versiondb manifest file.
+
+    Parameters
+    ----------
+    lines: iterable of str or bytes
+        Lines of the manifest file.  The lines are consumed as the
+        products are yielded.
+
+    name: str
+        Name of the manifest. Eg., `b1234`
+
+    Yields
+    ------
+    product: codekit.records.ProductRecord
+
+    Raises
+    ------
+    RuntimeError
+        If the manifest is unparsable or `name` does not match the manifest
+        content.  The name check is done after the last product is yielded.
+    """
+    parsed_name = None
+
+    for n, line in enumerate(lines, start=1):
+        if not isinstance(line, str):
+            line = str(line, 'utf-8')
+        line = line.rstrip('\r\n')
+
+        # skip commented out and blank lines
+        if line.startswith('#') or line == '':
+            continue
+        if line.startswith('BUILD'):
+            pat = r'^BUILD=(b\d{4})$'
+            m = re.match(pat, line)
+            if not m:
+                raise RuntimeError(textwrap.dedent("""
+                    Unparsable versiondb manifest:
+                      {line}
+                    """).format(
+                    line=line,
+                ))
+            parsed_name = m.group(1)
+            continue
+
+        try:
+            # min of 3, max of 4 fields
+            fields = line.split()[0:4]
+            (product, sha, eups_version) = fields[0:3]
+        except ValueError as e:
+            raise ValueError(
+                "error parsing manifest {name} at line {n}:\n{e}".format(
+                    name=name,
+                    n=n,
+                    e=e,
+                )) from None
+
+        # the 4th field, if present, is a csv list of deps
+        dependencies = []
+        if len(fields) == 4:
+            dependencies = fields[3].split(',')
+
+        yield ProductRecord(
+            product,
+            sha=sha,
+            eups_version=eups_version,
+            dependencies=dependencies,
+        )
+
+    # sanity check tag name in the file
+    if not name == parsed_name:
+        raise RuntimeError(textwrap.dedent("""
+            name in data              : ({dname})
+              does not match file name: ({fname})\
+            """).format(
+            dname=parsed_name,
+            fname=name,
+        ))
+
+
+@public
+def manifest_name(number):
+    """Return the manifest name of a build number. Eg., `1234` -> `b1234`"""
+    return "b{n:04d}".format(n=number)
+
+
+@public
+def manifest_number(name):
+    """Return the build number of a manifest name. Eg., `b1234` -> `1234`"""
+    m = re.match(r'^b(\d+)$', name)
+    if not m:
+        raise ValueError("invalid manifest name: {name}".format(name=name))
+    return int(m.group(1))
+
+
+class ManifestHistory(object):
+    """Local SQLite index of the products in a range of versiondb manifests.
+
+    Answers questions such as "which builds contain product P at sha X"
+    without fetching any manifests.  The index is built incrementally with
+    `ingest()` / `update()`.
+
+    Parameters
+    ----------
+    path: str
+        SQLite database file.  Created if it does not exist.
+
+    base_url: str, optional
+        Base url of the versiondb manifests, or the path of a local
+        versiondb clone.
+
+    cache: codekit.httpsession.DocumentCache, optional
+        Cache of manifest files.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS builds (
+            build INTEGER PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS products (
+            product TEXT NOT NULL,
+            build INTEGER NOT NULL,
+            sha TEXT NOT NULL,
+            eups_version TEXT NOT NULL,
+            PRIMARY KEY (product, build)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS products_sha
+            ON products (product, sha);
+        CREATE INDEX IF NOT EXISTS products_eups_version
+            ON products (product, eups_version);
+    """
+
+    def __init__(self, path, base_url=None, cache=None):
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        self.base_url = base_url
+        self.cache = cache
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(self.schema)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ttype, value, traceback):
+        self.close()
+
+    def _fetch(self, number):
+        """Return the products of a build, or `None` if the manifest does not
+        exist."""
+        m = Manifest(
+            manifest_name(number),
+            base_url=self.base_url,
+            cache=self.cache,
+        )
+        try:
+            return m.products
+        except ManifestNotFoundError:
+            return None
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+    def known_builds(self):
+        """Return `set` of build numbers which have been ingested"""
+        return {row[0] for row in self.conn.execute(
+            'SELECT build FROM builds')}
+
+    def last_build(self):
+        """Return the highest ingested build number, or `None`"""
+        row = self.conn.execute('SELECT MAX(build) FROM builds').fetchone()
+        return row[0]
+
+    def ingest(self, numbers, jobs=1, fail_fast=True):
+        """Fetch and index manifests.  Builds which have already been indexed
+        are skipped.  Builds which do not exist (yet) are not recorded.
+
+        Parameters
+        ----------
+        numbers: iterable of int
+            build numbers
+
+        jobs: int, optional
+            Number of manifests to fetch concurrently.
+
+        fail_fast: bool, optional
+            Stop upon the first error fetching or parsing a manifest.
+            Otherwise, errors are aggregated and raised as a
+            `codekit.codetools.DogpileError` after the other builds have
+            been ingested.
+
+        Returns
+        -------
+        found: int
+            Number of manifests which were ingested.
+        """
+        known = self.known_builds()
+        numbers = [n for n in numbers if n not in known]
+
+        found = 0
+        problems = []
+        with codetools.OrderedThreadPool(jobs, fail_fast=fail_fast) as pool:
+            for number, f in pool.map(self._fetch, numbers):
+                try:
+                    products = f.result()
+                except (
+                    requests.exceptions.RequestException,
+                    # unparsable manifest
+                    RuntimeError,
+                    ValueError,
+                ) as e:
+                    if fail_fast:
+                        raise
+                    problems.append(e)
+                    error(e)
+                    continue
+
+                if products is None:
+                    debug("  {b} does not exist".format(
+                        b=manifest_name(number)))
+                    continue
+
+                with self.conn:
+                    self.conn.execute(
+                        'INSERT INTO builds (build) VALUES (?)', (number,))
+                    self.conn.executemany(
+                        'INSERT INTO products'
+                        ' (product, build, sha, eups_version)'
+                        ' VALUES (?, ?, ?, ?)',
+                        ((p.name, number, p.sha, p.eups_version)
+                         for p in products.values()),
+                    )
+                found += 1
+                debug("  ingested {b}".format(b=manifest_name(number)))
+
+        if problems:
+            msg = "{n} manifest(s) could not be ingested".format(
+                n=len(problems))
+            raise codetools.DogpileError(problems, msg)
+
+        return found
+
+    def update(self, start=1, jobs=1, max_missing=10):
+        """Ingest new builds after the last ingested build until
+        `max_missing` consecutive builds do not exist.
+
+        Parameters
+        ----------
+        start: int, optional
+            first build to consider if the index is empty.
+
+        Returns
+        -------
+        found: int
+            Number of manifests which were ingested.
+        """
+        last = self.last_build()
+        n = start if last is None else last + 1
+
+        found = 0
+        while True:
+            batch = range(n, n + max_missing)
+            ingested = self.ingest(batch, jobs=jobs)
+            found += ingested
+            info("ingested {n} manifest(s) up to {b}".format(
+                n=found,
+                b=manifest_name(batch[-1]),
+            ))
+
+            last = self.last_build()
+            if last is None or last < batch.start:
+                # no builds found in the batch
+                break
+            n = last + 1
+
+        return found
+
+    def _builds(self, sql, args):
+        return [manifest_name(row[0]) for row in self.conn.execute(sql, args)]
+
+    def builds_with_sha(self, product, sha):
+        """Return list of manifest names in which `product` is at `sha`.
+
+        `sha` may be abbreviated.
+        """
+        # a prefix comparison, rather than GLOB/LIKE, so that `sha` is not
+        # interpreted as a pattern
+        return self._builds(
+            'SELECT build FROM products'
+            ' WHERE product = ? AND substr(sha, 1, ?) = ? ORDER BY build',
+            (product, len(sha), sha.lower()),
+        )
+
+    def builds_with_eups_version(self, product, eups_version):
+        """Return list of manifest names in which `product` is at
+        `eups_version`."""
+        return self._builds(
+            'SELECT build FROM products'
+            ' WHERE product = ? AND eups_version = ? ORDER BY build',
+            (product, eups_version),
+        )
+
+    def changes(self, product):
+        """Return the builds in which the `eups_version` of `product`
+        changed, including the first build in which it appeared.
+
+        Returns
+        -------
+        changes: list of (str, str, str)
+            `(manifest name, eups_version, sha)` tuples in build order
+        """
+        changes = []
+        prev = None
+        for build, eups_version, sha in self.conn.execute(
+            'SELECT build, eups_version, sha FROM products'
+            ' WHERE product = ? ORDER BY build',
+            (product,),
+        ):
+            if eups_version != prev:
+                changes.append((manifest_name(build), eups_version, sha))
+                prev = eups_version
+
+        return changes
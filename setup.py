@@ -60,6 +60,7 @@ setup(
     # package_data={},
     entry_points={
         'console_scripts': [
+            'eups-audit = codekit.cli.eups_audit:main',
             'github-auth = codekit.cli.github_auth:main',
             'github-decimate-org = codekit.cli.github_decimate_org:main',
             'github-fork-org = codekit.cli.github_fork_org:main',
@@ -68,6 +69,7 @@ setup(
             'github-mv-repos-to-team = codekit.cli.github_mv_repos_to_team:main',  # NOQA
             'github-tag-release = codekit.cli.github_tag_release:main',
             'github-tag-teams = codekit.cli.github_tag_teams:main',
+            'versiondb-history = codekit.cli.versiondb_history:main',
         ]
     }
 )
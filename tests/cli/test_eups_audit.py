@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+from codekit import codetools
+from codekit.cli import eups_audit
+import json
+
+codetools.setup_logging()
+
+manifest = """\
+BUILD=b1000
+apr 39b3212aa46217e4f485b02496381907da8b8d7a 1.5.2
+afw 2e4184deec9163e6d299463aa664649c647c901a 15.0 apr
+"""
+
+
+def tag_file(name, build, products):
+    lines = ["EUPS distribution {name} version list. Version 1.0".format(
+        name=name)]
+    if build:
+        lines.append("#BUILD=" + build)
+    lines += ["{p} generic {v}".format(p=p, v=v) for p, v in products]
+    return "\n".join(lines) + "\n"
+
+
+def make_fixtures(tmpdir, make_versiondb):
+    tags = tmpdir.mkdir('pkgroot').mkdir('tags')
+    tags.join('w_2018_01.list').write(tag_file(
+        'w_2018_01', 'b1000', [('apr', '1.5.2'), ('afw', '15.0')]))
+    tags.join('w_2018_02.list').write(tag_file(
+        'w_2018_02', 'b1000', [('apr', '1.5.3'), ('skymap', '15.0')]))
+    tags.join('v15_0.list').write(tag_file(
+        'v15_0', None, [('apr', '1.5.2')]))
+    tags.join('w_2018_03.list').write(tag_file(
+        'w_2018_03', 'b9999', [('apr', '1.5.2')]))
+
+    return {
+        'eups_pkgroot': str(tmpdir.join('pkgroot')),
+        'versiondb_base_url': make_versiondb({'b1000': manifest}),
+    }
+
+
+def test_audit_products():
+    missing, mismatched = eups_audit.audit_products(
+        {'a': {'eups_version': '1'}, 'b': {'eups_version': '2'}},
+        {'a': {'eups_version': '1.1'}},
+    )
+    assert missing == [{'product': 'b', 'eups_version': '2'}]
+    assert mismatched == [{
+        'product': 'a',
+        'eups_version': '1',
+        'manifest_eups_version': '1.1',
+    }]
+
+
+def test_audit_releases(tmpdir, make_versiondb):
+    kwargs = make_fixtures(tmpdir, make_versiondb)
+    tags = ['w_2018_01', 'w_2018_02', 'v15_0', 'w_2018_03', 'w_2018_04']
+
+    results = eups_audit.audit_releases(tags, jobs=2, **kwargs)
+
+    assert [r['eups_tag'] for r in results] == tags
+    status = {r['eups_tag']: r['status'] for r in results}
+    assert status == {
+        'w_2018_01': 'ok',
+        'w_2018_02': 'problems',
+        'v15_0': 'no-manifest',
+        # missing manifest
+        'w_2018_03': 'error',
+        # missing tag
+        'w_2018_04': 'error',
+    }
+
+    w_2018_02 = results[1]
+    assert w_2018_02['manifest'] == 'b1000'
+    assert w_2018_02['missing'] == \
+        [{'product': 'skymap', 'eups_version': '15.0'}]
+    assert w_2018_02['mismatched'] == [{
+        'product': 'apr',
+        'eups_version': '1.5.3',
+        'manifest_eups_version': '1.5.2',
+    }]
+
+    report = str(tmpdir.join('report.json'))
+    eups_audit.write_report(report, results)
+    with open(report) as f:
+        data = json.load(f)
+    assert data['summary'] == {
+        'releases': 5,
+        'ok': 1,
+        'problems': 1,
+        'no-manifest': 1,
+        'error': 2,
+    }
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+
+from codekit import codetools
+from codekit.cli import github_tag_release
+import codekit.pygithub
+import collections
+import github
+import json
+import pytest
+import requests
+import responses
+import sys
+import threading
+import time
+
+codetools.setup_logging()
+
+api = 'https://api.github.com'
+
+release = {
+    'org': 'lsst',
+    'git_tag': 'w.2018.18',
+    'manifest': 'b3595',
+}
+
+
+@pytest.fixture
+def client():
+    codekit.pygithub._client_factory = codekit.pygithub.GithubClientFactory(
+        'token')
+    yield codekit.pygithub.get_github()
+    codekit.pygithub._client_factory = None
+
+
+def tag_ref(full_name, name, sha):
+    return {
+        'ref': 'refs/tags/' + name,
+        'url': "{api}/repos/{r}/git/refs/tags/{t}".format(
+            api=api,
+            r=full_name,
+            t=name,
+        ),
+        'object': {
+            'sha': sha,
+            'type': 'tag',
+            'url': "{api}/repos/{r}/git/tags/{sha}".format(
+                api=api,
+                r=full_name,
+                sha=sha,
+            ),
+        },
+    }
+
+
+def product(g, full_name, sha, existing_sha=None):
+    """A product in the format returned by `check_product_tags()`"""
+    repo = codekit.pygithub.get_repo_lazy(g, full_name)
+    ref = None
+    if existing_sha:
+        ref = codekit.pygithub.git_ref_from_dict(
+            repo, tag_ref(full_name, release['git_tag'], existing_sha))
+
+    return {
+        'repo': repo,
+        'eups_version': '15.0',
+        'v': False,
+        'update_tag': ref is not None,
+        'target_tag': codekit.pygithub.TargetTag(
+            name=release['git_tag'],
+            sha=sha,
+            message='Version w.2018.18 release tag',
+            tagger=github.InputGitAuthor(
+                'sqreadmin',
+                'sqre-admin@lists.lsst.org',
+                codetools.current_timestamp(),
+            ),
+        ),
+        'existing_ref': ref,
+    }
+
+
+@pytest.fixture
+def plan(tmpdir, client):
+    path = str(tmpdir.join('plan.json'))
+    products = {
+        'afw': product(client, 'lsst/afw', 'a' * 40),
+        'base': product(client, 'lsst/base', 'b' * 40, existing_sha='c' * 40),
+    }
+    github_tag_release.write_plan(
+        path, products, eups_tag='w_2018_18', **release)
+    return path
+
+
+def test_plan_roundtrip(plan):
+    products = github_tag_release.read_plan(plan, **release)
+
+    assert sorted(products) == ['afw', 'base']
+    afw = products['afw']
+    assert afw['repo'].full_name == 'lsst/afw'
+    assert afw['target_tag'].name == 'w.2018.18'
+    assert afw['target_tag'].sha == 'a' * 40
+    assert afw['target_tag'].tagger._identity['name'] == 'sqreadmin'
+    assert afw['existing_ref'] is None
+    assert afw['update_tag'] is False
+
+    base = products['base']
+    assert base['update_tag'] is True
+    assert base['existing_ref'].ref == 'refs/tags/w.2018.18'
+    assert base['existing_ref'].object.sha == 'c' * 40
+
+
+@pytest.mark.parametrize('key', ['org', 'git_tag', 'manifest'])
+def test_plan_mismatch(plan, key):
+    kwargs = dict(release)
+    kwargs[key] = 'other'
+
+    with pytest.raises(RuntimeError) as e:
+        github_tag_release.read_plan(plan, **kwargs)
+    assert 'does not match' in str(e.value)
+
+
+def test_plan_max_age(plan):
+    with open(plan) as f:
+        data = json.load(f)
+    data['created'] = '2018-05-01T00:00:00Z'
+    with open(plan, 'w') as f:
+        json.dump(data, f)
+
+    # no limit by default
+    github_tag_release.read_plan(plan, **release)
+
+    with pytest.raises(RuntimeError) as e:
+        github_tag_release.read_plan(plan, max_age=3600, **release)
+    assert '--plan-max-age' in str(e.value)
+
+
+@responses.activate
+def test_check_plan(plan):
+    products = github_tag_release.read_plan(plan, **release)
+
+    # afw has been tagged and base retagged since the plan was written
+    responses.add(
+        responses.GET,
+        api + '/repos/lsst/afw/git/matching-refs/tags/w.2018.18',
+        json=[tag_ref('lsst/afw', 'w.2018.18', 'd' * 40)],
+    )
+    responses.add(
+        responses.GET,
+        api + '/repos/lsst/base/git/matching-refs/tags/w.2018.18',
+        json=[tag_ref('lsst/base', 'w.2018.18', 'e' * 40)],
+    )
+
+    problems = github_tag_release.check_plan(products)
+    assert len(problems) == 2
+    assert all(
+        isinstance(p, github_tag_release.PlanStaleError) for p in problems)
+
+    with pytest.raises(github_tag_release.PlanStaleError):
+        github_tag_release.check_plan(products, fail_fast=True)
+
+
+@responses.activate
+def test_check_plan_unchanged(plan):
+    products = github_tag_release.read_plan(plan, **release)
+
+    responses.add(
+        responses.GET,
+        api + '/repos/lsst/afw/git/matching-refs/tags/w.2018.18',
+        json=[],
+    )
+    responses.add(
+        responses.GET,
+        api + '/repos/lsst/base/git/matching-refs/tags/w.2018.18',
+        json=[tag_ref('lsst/base', 'w.2018.18', 'c' * 40)],
+    )
+
+    assert github_tag_release.check_plan(products) == []
+
+
+def test_journal_resume(tmpdir, client):
+    path = str(tmpdir.join('journal'))
+    afw = product(client, 'lsst/afw', 'a' * 40)
+    base = product(client, 'lsst/base', 'b' * 40)
+
+    journal = github_tag_release.TagJournal(path, 'w.2018.18')
+    journal.record('tag', 'afw', afw['repo'], afw['target_tag'], 'f' * 40)
+    journal.record('ref', 'afw', afw['repo'], afw['target_tag'], 'f' * 40)
+    journal.record('tag', 'base', base['repo'], base['target_tag'], 'e' * 40)
+    # entries for other tags are ignored
+    other = github_tag_release.TagJournal(path, 'w.2018.19')
+    other.record('ref', 'base', base['repo'], base['target_tag'], 'e' * 40)
+
+    # a run interrupted while writing an entry
+    with open(path, 'a') as f:
+        f.write('{"git_tag": "w.2018.18", "product": "ba')
+
+    journal = github_tag_release.TagJournal(path, 'w.2018.18', resume=True)
+    assert journal.is_done('afw', 'a' * 40)
+    assert not journal.is_done('base', 'b' * 40)
+    assert journal.tag_sha('base', 'b' * 40) == 'e' * 40
+    # a different target sha is a different entry
+    assert not journal.is_done('afw', '0' * 40)
+    assert journal.tag_sha('afw', '0' * 40) is None
+
+    pending = journal.filter_done({'afw': afw, 'base': base},
+                                  sha_key=lambda d: d['target_tag'].sha)
+    assert list(pending) == ['base']
+
+    # previous entries are ignored unless resuming
+    fresh = github_tag_release.TagJournal(path, 'w.2018.18')
+    assert not fresh.is_done('afw', 'a' * 40)
+
+
+@responses.activate
+def test_journal_tag_sha_reused(tmpdir, client):
+    path = str(tmpdir.join('journal'))
+    base = product(client, 'lsst/base', 'b' * 40)
+
+    journal = github_tag_release.TagJournal(path, 'w.2018.18')
+    journal.record('tag', 'base', base['repo'], base['target_tag'], 'e' * 40)
+
+    responses.add(
+        responses.POST,
+        api + '/repos/lsst/base/git/refs',
+        status=201,
+        json=tag_ref('lsst/base', 'w.2018.18', 'e' * 40),
+    )
+
+    journal = github_tag_release.TagJournal(path, 'w.2018.18', resume=True)
+    github_tag_release.tag_product('base', base, journal=journal)
+
+    # the journaled tag object is used rather than creating another
+    assert len(responses.calls) == 1
+    assert json.loads(responses.calls[0].request.body)['sha'] == 'e' * 40
+    assert journal.is_done('base', 'b' * 40)
+
+
+@responses.activate
+def test_tag_index_shared(client):
+    """the tag refs of a repo are fetched once, by `check_product_tags()`, and
+    the index is kept up to date by `tag_product()`"""
+    responses.add(
+        responses.GET,
+        api + '/repos/lsst/afw/git/matching-refs/tags/w.2018.18',
+        json=[],
+    )
+    responses.add(
+        responses.POST,
+        api + '/repos/lsst/afw/git/tags',
+        status=201,
+        json={'sha': 'f' * 40, 'tag': 'w.2018.18'},
+    )
+    responses.add(
+        responses.POST,
+        api + '/repos/lsst/afw/git/refs',
+        status=201,
+        json=tag_ref('lsst/afw', 'w.2018.18', 'f' * 40),
+    )
+
+    afw = product(client, 'lsst/afw', 'a' * 40)
+    products = {'afw': {
+        'repo': afw['repo'],
+        'sha': 'a' * 40,
+        'eups_version': '15.0',
+        'v': False,
+    }}
+    checked, problems = github_tag_release.check_product_tags(
+        products,
+        release['git_tag'],
+        tag_message_template='Version {git_tag} release tag',
+        tagger=afw['target_tag'].tagger,
+    )
+    assert problems == []
+    assert checked['afw']['existing_ref'] is None
+
+    github_tag_release.tag_product('afw', checked['afw'])
+
+    tag_index = checked['afw']['tag_index']
+    ref = tag_index.find_tag_by_name(release['git_tag'])
+    assert ref.object.sha == 'f' * 40
+    assert len(responses.calls) == 3
+
+
+def test_deadline(monkeypatch, client):
+    class Time(object):
+        # the deadline passes after the first product
+        now = iter([0] + [10] * 10)
+
+        @classmethod
+        def monotonic(cls):
+            return next(cls.now)
+
+    monkeypatch.setattr(github_tag_release, 'time', Time)
+
+    products = {
+        name: product(client, 'lsst/' + name, sha * 40)
+        for name, sha in (('afw', 'a'), ('base', 'b'), ('skymap', 'c'))
+    }
+
+    with pytest.raises(codetools.DogpileError) as e:
+        github_tag_release.tag_products(products, dry_run=True, deadline=5)
+
+    errors = e.value.errors
+    assert len(errors) == 1
+    assert isinstance(errors[0], github_tag_release.DeadlineError)
+    assert str(errors[0]) == 'deadline reached; 2 product(s) not tagged'
+
+    # no api calls are made once the deadline has passed
+    with pytest.raises(github_tag_release.DeadlineError):
+        github_tag_release.tag_product('afw', products['afw'], deadline=5)
+
+
+def fake_tag_product(failing=()):
+    """Stand-in for `tag_product()` which records the concurrency of calls
+    and fails for the `failing` products"""
+    state = {'called': [], 'running': 0, 'max_running': 0}
+    lock = threading.Lock()
+
+    def tag_product(name, data, **kwargs):
+        with lock:
+            state['called'].append(name)
+            state['running'] += 1
+            state['max_running'] = max(state['max_running'], state['running'])
+        try:
+            time.sleep(0.05)
+            if name in failing:
+                raise codekit.pygithub.CaughtRepositoryError(
+                    data['repo'],
+                    github.GithubException(422, {'message': 'nope'}),
+                    'error creating tag',
+                )
+        finally:
+            with lock:
+                state['running'] -= 1
+
+    return tag_product, state
+
+
+def some_products(g, n):
+    return collections.OrderedDict(
+        (name, product(g, 'lsst/' + name, 'a' * 40))
+        for name in ("p{n}".format(n=n) for n in range(n))
+    )
+
+
+def test_tag_products_concurrent(monkeypatch, client):
+    tag_product, state = fake_tag_product()
+    monkeypatch.setattr(github_tag_release, 'tag_product', tag_product)
+
+    github_tag_release.tag_products(some_products(client, 8), jobs=4)
+
+    assert sorted(state['called']) == sorted(some_products(client, 8))
+    assert 1 < state['max_running'] <= 4
+
+
+def test_tag_products_no_fail_fast(monkeypatch, client):
+    tag_product, state = fake_tag_product(failing=('p1', 'p4'))
+    monkeypatch.setattr(github_tag_release, 'tag_product', tag_product)
+
+    with pytest.raises(codetools.DogpileError) as e:
+        github_tag_release.tag_products(some_products(client, 6), jobs=2)
+
+    assert len(state['called']) == 6
+    assert [err.repo.full_name for err in e.value.errors] == \
+        ['lsst/p1', 'lsst/p4']
+
+
+def test_tag_products_fail_fast(monkeypatch, client):
+    tag_product, state = fake_tag_product(failing=('p0',))
+    monkeypatch.setattr(github_tag_release, 'tag_product', tag_product)
+
+    with pytest.raises(codekit.pygithub.CaughtRepositoryError):
+        github_tag_release.tag_products(
+            some_products(client, 6), jobs=1, fail_fast=True)
+
+    # queued products are not tagged after the first error
+    assert state['called'] == ['p0']
+
+
+def test_startup_fetch_error(monkeypatch):
+    """the manifest, eups tag, repos.yaml, and team membership are fetched
+    concurrently with the github login and a failed fetch is raised"""
+    logged_in = threading.Event()
+    fetched = []
+
+    def fetch_manifest(name, **kwargs):
+        # does not return before the login unless it is running concurrently
+        assert logged_in.wait(5)
+        raise requests.exceptions.HTTPError(
+            "404 Client Error: Not Found for url: .../{name}.txt".format(
+                name=name))
+
+    class EupsTag(object):
+        def __init__(self, name, **kwargs):
+            assert logged_in.wait(5)
+            fetched.append('eups')
+            self.products = {}
+
+    def login_github(**kwargs):
+        logged_in.set()
+        return github.Github('token')
+
+    def fetch_repo_index(**kwargs):
+        fetched.append('repos.yaml')
+
+    class OrgMembershipIndex(object):
+        def __init__(self, org):
+            pass
+
+        def build(self):
+            fetched.append('membership')
+
+    class Org(object):
+        login = 'lsst'
+
+    monkeypatch.setattr(github_tag_release, 'fetch_manifest', fetch_manifest)
+    monkeypatch.setattr(github_tag_release.eups, 'EupsTag', EupsTag)
+    monkeypatch.setattr(
+        github_tag_release, 'fetch_repo_index', fetch_repo_index)
+    monkeypatch.setattr(
+        github_tag_release.pygithub, 'login_github', login_github)
+    monkeypatch.setattr(
+        github_tag_release.pygithub, 'OrgMembershipIndex', OrgMembershipIndex)
+    monkeypatch.setattr(
+        github.Github, 'get_organization', lambda self, name: Org())
+    monkeypatch.delenv('DM_SQUARE_CACHE_DIR', raising=False)
+    monkeypatch.setattr(sys, 'argv', [
+        'github-tag-release',
+        '--manifest', 'b3595',
+        '--org', 'lsst',
+        '--allow-team', 'Data Management',
+        '--user', 'sqreadmin',
+        '--email', 'sqre-admin@lists.lsst.org',
+        '--token', 'token',
+        'w.2018.18',
+    ])
+
+    with pytest.raises(requests.exceptions.HTTPError) as e:
+        github_tag_release.run()
+    assert 'b3595.txt' in str(e.value)
+
+    # the other fetches are allowed to complete
+    assert sorted(fetched) == ['eups', 'membership', 'repos.yaml']
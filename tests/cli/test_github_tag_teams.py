@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+from codekit import codetools
+from codekit.cli import github_tag_teams
+import codekit.pygithub
+import collections
+import github
+import pytest
+import threading
+import time
+
+codetools.setup_logging()
+
+
+def repo(full_name):
+    return codekit.pygithub.get_repo_lazy(github.Github('token'), full_name)
+
+
+@pytest.fixture
+def tag_indexes(monkeypatch):
+    """Record the prefix of every RepoTagIndex created"""
+    prefixes = []
+
+    class RepoTagIndex(object):
+        def __init__(self, repo, prefix=''):
+            prefixes.append(prefix)
+
+        def find_tag_by_name(self, tag_name):
+            return None
+
+    monkeypatch.setattr(
+        github_tag_teams.pygithub,
+        'RepoTagIndex',
+        RepoTagIndex,
+    )
+    return prefixes
+
+
+def test_find_tags_common_prefix(tag_indexes):
+    github_tag_teams.find_tags_in_repo(
+        repo('example/a'), ['w.2018.18', 'w.2018.19'])
+    assert tag_indexes == ['w.2018.1']
+
+
+def test_find_tags_short_prefix(tag_indexes):
+    # too short a prefix to be worth indexing
+    github_tag_teams.find_tags_in_repo(
+        repo('example/a'), ['w.2018.18', 'wk_2019'])
+    assert tag_indexes == ['w.2018.18', 'wk_2019']
+
+    del tag_indexes[:]
+    github_tag_teams.find_tags_in_repo(
+        repo('example/a'), ['v15_0', '15.0'])
+    assert tag_indexes == ['v15_0', '15.0']
+
+
+class Recorder(object):
+    """Stand-in for `create_tags()` which records the concurrency of calls
+    and fails for some repos"""
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.called = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, repo, tags, **kwargs):
+        with self._lock:
+            self.called.append(repo.full_name)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(0.05)
+            error = self.errors.get(repo.full_name)
+            if error:
+                raise error(repo)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def github_error(repo):
+    return github.GithubException(422, {'message': 'Reference already exists'})
+
+
+def default_ref_error(repo):
+    return codekit.pygithub.CaughtRepositoryError(
+        repo,
+        github.GithubException(404, {'message': 'Not Found'}),
+        'error getting default ref',
+    )
+
+
+def absent_tags(n):
+    g = github.Github('token')
+    names = ["example/repo{n}".format(n=n) for n in range(n)]
+    return collections.OrderedDict(
+        (name, {
+            'repo': codekit.pygithub.get_repo_lazy(g, name),
+            'need_tags': ['w.2018.18'],
+        }) for name in names
+    )
+
+
+def test_tag_repos_concurrent(monkeypatch):
+    create_tags = Recorder()
+    monkeypatch.setattr(github_tag_teams, 'create_tags', create_tags)
+
+    github_tag_teams.tag_repos(absent_tags(8), jobs=4, tagger=None)
+
+    assert sorted(create_tags.called) == sorted(absent_tags(8))
+    assert 1 < create_tags.max_running <= 4
+
+
+def test_tag_repos_no_fail_fast(monkeypatch):
+    create_tags = Recorder({
+        'example/repo1': github_error,
+        'example/repo3': default_ref_error,
+    })
+    monkeypatch.setattr(github_tag_teams, 'create_tags', create_tags)
+
+    with pytest.raises(codetools.DogpileError) as e:
+        github_tag_teams.tag_repos(
+            absent_tags(6), jobs=2, fail_fast=False, tagger=None)
+
+    # every repo is attempted and all errors are reported
+    assert len(create_tags.called) == 6
+    errors = e.value.errors
+    assert [err.repo.full_name for err in errors] == \
+        ['example/repo1', 'example/repo3']
+    assert all(
+        isinstance(err, codekit.pygithub.CaughtRepositoryError)
+        for err in errors
+    )
+
+
+def test_tag_repos_fail_fast(monkeypatch):
+    create_tags = Recorder({'example/repo0': github_error})
+    monkeypatch.setattr(github_tag_teams, 'create_tags', create_tags)
+
+    with pytest.raises(codetools.DogpileError) as e:
+        github_tag_teams.tag_repos(
+            absent_tags(6), jobs=1, fail_fast=True, tagger=None)
+
+    # queued repos are not tagged after the first error
+    assert create_tags.called == ['example/repo0']
+    assert len(e.value.errors) == 1
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import codecs
+import os
+import pytest
+import subprocess
+
+
+@pytest.fixture
+def make_versiondb(tmpdir):
+    """Return a function which commits manifests to a local git repo laid
+    out as a clone of versiondb, and returns its path.
+
+    The function takes a `dict` of manifest name -> manifest file content.
+    """
+    def make(manifests):
+        repo = str(tmpdir.mkdir('versiondb'))
+        os.mkdir(os.path.join(repo, 'manifests'))
+        for name, text in manifests.items():
+            path = os.path.join(repo, 'manifests', name + '.txt')
+            with codecs.open(path, 'w', encoding='utf8') as file:
+                file.write(text)
+
+        def git(*args):
+            subprocess.check_call(('git', '-C', repo) + args)
+
+        git('init', '-q')
+        git('add', 'manifests')
+        git('-c', 'user.name=test', '-c', 'user.email=test@example.com',
+            'commit', '-q', '-m', ' '.join(sorted(manifests)))
+        return repo
+
+    return make
@@ -84,3 +84,58 @@ def test_d_2018_05_08(d_2018_05_08):
     assert products['skymap']['name'] == 'skymap'
     assert products['skymap']['flavor'] == 'generic'
     assert products['skymap']['eups_version'] == '15.0-4-g5589a47+3'
+
+
+@pytest.fixture
+def pkgroot(tmpdir, v15_0, d_2018_05_08):
+    root = tmpdir.mkdir('pkgroot')
+    tags = root.mkdir('tags')
+    tags.join('v15_0.list').write(v15_0)
+    tags.join('d_2018_05_08.list').write(d_2018_05_08)
+    return root
+
+
+@responses.activate
+def test_pkgroot(pkgroot):
+    # should not make any http requests
+    et = eups.EupsTag(name='d_2018_05_08', pkgroot=str(pkgroot))
+    assert et.manifest == 'b3601'
+
+    products = et.products
+    assert isinstance(products, eups.TagFileIndex)
+    assert 'apr' in products
+    assert products['skymap']['flavor'] == 'generic'
+    assert products['skymap']['eups_version'] == '15.0-4-g5589a47+3'
+    assert dict(products['apr']) == {
+        'name': 'apr',
+        'flavor': 'generic',
+        'eups_version': '1.5.2',
+    }
+
+    with pytest.raises(KeyError):
+        products['nope']
+
+    # the lazily parsed products match the streaming parser
+    with open(str(pkgroot.join('tags', 'd_2018_05_08.list'))) as f:
+        parsed = {p.name: p for p in eups.parse_tag_lines(f, 'd_2018_05_08')}
+    assert dict(products) == parsed
+
+
+def test_pkgroot_config(pkgroot, v15_0):
+    pkgroot.mkdir('taglists').join('v15_0.list').write(v15_0)
+    pkgroot.join('config.txt').write(
+        '# eups distrib server config\n'
+        'DISTRIB_CLASS = lsst.sconsUtils.eupsDistribBuilder.Distrib\n'
+        'TAGLIST_DIR = taglists\n'
+    )
+
+    path = eups.tag_path('file://' + str(pkgroot), 'v15_0')
+    assert path == str(pkgroot.join('taglists', 'v15_0.list'))
+
+    et = eups.EupsTag(name='v15_0', pkgroot=str(pkgroot))
+    assert et.manifest is None
+    assert et.products['afw']['eups_version'] == '15.0'
+
+    # the name in the file must match
+    with pytest.raises(RuntimeError):
+        eups.TagFileIndex(path, 'v16_0')
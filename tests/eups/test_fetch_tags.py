@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, eups
+import asyncio
+import pytest
+import requests
+import responses
+
+codetools.setup_logging()
+
+tags_url = 'https://eups.lsst.codes/stack/src/tags'
+
+names = ['w_2018_01', 'w_2018_02', 'd_2018_01_01', 'v15_0']
+
+
+def tag_file(name):
+    return "\n".join([
+        "EUPS distribution {name} version list. Version 1.0".format(
+            name=name),
+        "#BUILD=b1234",
+        "#product             flavor     version",
+        "afw                  generic    {name}".format(name=name),
+    ]) + "\n"
+
+
+@pytest.fixture
+def pkgroot(tmpdir):
+    root = tmpdir.mkdir('pkgroot')
+    tags = root.mkdir('tags')
+    for name in names:
+        tags.join(name + '.list').write(tag_file(name))
+    tags.join('README').write('not a tag')
+    return str(root)
+
+
+@responses.activate
+def test_list_tags_http():
+    listing = ''.join(
+        '<a href="{n}.list">{n}.list</a>\n'.format(n=n) for n in names
+    )
+    responses.add(responses.GET, tags_url + '/', body=listing)
+
+    assert eups.list_tags() == sorted(names)
+    assert eups.list_tags(pattern=eups.weekly_pattern) == \
+        ['w_2018_01', 'w_2018_02']
+
+
+def test_list_tags_pkgroot(pkgroot):
+    assert eups.list_tags(pkgroot=pkgroot) == sorted(names)
+    assert eups.list_tags(pattern=eups.daily_pattern, pkgroot=pkgroot) == \
+        ['d_2018_01_01']
+
+
+@responses.activate
+def test_fetch_tags_http():
+    for name in names:
+        responses.add(
+            responses.GET,
+            tags_url + '/' + name + '.list',
+            body=tag_file(name),
+        )
+
+    results = list(eups.fetch_tags(names, jobs=3))
+    assert sorted(r[0] for r in results) == sorted(names)
+    for name, manifest, products in results:
+        assert manifest == 'b1234'
+        assert products['afw']['eups_version'] == name
+
+
+def test_fetch_tags_pkgroot(pkgroot):
+    results = {
+        name: products['afw']['eups_version']
+        for name, _, products in eups.fetch_tags(names, pkgroot=pkgroot)
+    }
+    assert results == {n: n for n in names}
+
+
+@responses.activate
+def test_fetch_tags_error():
+    responses.add(responses.GET, tags_url + '/w_2018_01.list', status=404)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        list(eups.fetch_tags(['w_2018_01'], jobs=1))
+
+
+def test_fetch_tags_early_exit(pkgroot, monkeypatch):
+    fetched = []
+    EupsTag = eups.EupsTag
+
+    def record(name, **kwargs):
+        fetched.append(name)
+        return EupsTag(name, **kwargs)
+
+    monkeypatch.setattr(eups, 'EupsTag', record)
+
+    many = names * 25
+    gen = eups.fetch_tags(many, jobs=2, pkgroot=pkgroot)
+    next(gen)
+    gen.close()
+
+    # queued fetches are cancelled
+    assert len(fetched) < len(many)
+
+
+def test_iter_tags_early_exit(pkgroot):
+    loop = asyncio.new_event_loop()
+    try:
+        agen = eups.iter_tags(names * 25, jobs=2, pkgroot=pkgroot)
+        loop.run_until_complete(agen.__anext__())
+        loop.run_until_complete(agen.aclose())
+
+        # nothing is left pending when the loop is closed
+        assert not [
+            t for t in asyncio.Task.all_tasks(loop) if not t.done()
+        ]
+    finally:
+        loop.close()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import concurrent.futures
+import pytest
+import responses
+
+api = 'https://api.github.com'
+
+
+@pytest.fixture
+def factory():
+    yield codekit.pygithub.GithubClientFactory('token', pool_size=4)
+    codekit.pygithub.RequestsConnection.set_pool_size(
+        codekit.pygithub.DEFAULT_POOL_SIZE)
+
+
+def test_per_thread(factory):
+    g = factory.get()
+    assert factory() is g
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        others = list(executor.map(lambda _: factory.get(), range(4)))
+
+    assert g not in others
+    # at most one client per worker thread
+    assert len(set(map(id, others))) <= 2
+
+
+def test_shared_pool(factory):
+    session = codekit.pygithub.RequestsConnection.get_session()
+    adapter = session.get_adapter(api)
+    assert adapter._pool_maxsize == 4
+
+    # an unchanged size keeps the current session
+    codekit.pygithub.RequestsConnection.set_pool_size(4)
+    assert codekit.pygithub.RequestsConnection.get_session() is session
+
+
+@responses.activate
+def test_get_github(factory):
+    responses.add(
+        responses.GET,
+        api + '/users/octocat',
+        json={'login': 'octocat', 'id': 1},
+    )
+
+    codekit.pygithub._client_factory = factory
+    try:
+        def login(_):
+            return codekit.pygithub.get_github().get_user('octocat').login
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            assert list(executor.map(login, range(8))) == ['octocat'] * 8
+    finally:
+        codekit.pygithub._client_factory = None
+
+    with pytest.raises(RuntimeError):
+        codekit.pygithub.get_github()
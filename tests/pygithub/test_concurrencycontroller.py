@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import pytest
+import requests
+import responses
+
+api = 'https://api.github.com'
+
+
+def response(status, headers=None, text=''):
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers or {})
+    r._content = text.encode('utf-8')
+    return r
+
+
+@pytest.fixture
+def controller():
+    controller = codekit.pygithub.ConcurrencyController(
+        initial=4,
+        max_limit=8,
+        cooldown=0,
+    )
+    codekit.pygithub.RequestsConnection.controller = controller
+    yield controller
+    codekit.pygithub.RequestsConnection.controller = None
+
+
+def roundtrip(
+    controller,
+    r,
+    latency=0.1,
+    mutating=False,
+    endpoint=('GET', '/repos/lsst/afw'),
+    **kwargs
+):
+    controller.acquire(mutating)
+    retry_after = controller.release(
+        mutating, r, latency, endpoint=endpoint, **kwargs)
+    # do not actually wait out the pause
+    controller._paused_until = 0
+    return retry_after
+
+
+def test_aimd(controller):
+    # additive increase
+    for _ in range(20):
+        assert roundtrip(controller, response(200)) is None
+    assert 6 < controller.limit <= 8
+
+    # multiplicative decrease
+    limit = controller.limit
+    roundtrip(controller, response(502))
+    assert controller.limit == limit / 2
+
+    # slow responses are a congestion signal
+    limit = controller.limit
+    roundtrip(controller, response(200), latency=10)
+    assert controller.limit == limit / 2
+
+    # as are timeouts and connection errors
+    limit = controller.limit
+    roundtrip(controller, None, congested=True)
+    assert controller.limit == max(limit / 2, 1)
+
+    for _ in range(10):
+        roundtrip(controller, response(500))
+    assert controller.limit == 1
+
+
+def test_endpoint_baseline(controller):
+    fast = ('GET', '/rate_limit')
+    for _ in range(5):
+        roundtrip(controller, response(200), latency=0.001, endpoint=fast)
+        roundtrip(controller, response(304), latency=0.001)
+    limit = controller.limit
+
+    # neither a cheap endpoint nor 304s lower the baseline of others
+    roundtrip(controller, response(200), latency=0.1)
+    roundtrip(controller, response(200), latency=0.3)
+    assert controller.limit > limit
+
+    # the baseline is a moving average, not the fastest response
+    roundtrip(controller, response(200), latency=0.01)
+    limit = controller.limit
+    roundtrip(controller, response(200), latency=0.3)
+    assert controller.limit > limit
+
+    key = controller.endpoint_key('GET', '/repos/lsst/afw')
+    assert key == controller.endpoint_key('GET', '/repos/lsst/base')
+    assert key != controller.endpoint_key('PATCH', '/repos/lsst/afw')
+    assert key != controller.endpoint_key('GET', '/repos/lsst/afw/teams')
+
+
+def test_session_retried_errors(controller):
+    class History(object):
+        def __init__(self, status, error=None):
+            self.status = status
+            self.error = error
+
+    r = response(200)
+    r.raw = type('Raw', (object,), {})()
+    r.raw.retries = type('Retry', (object,), {})()
+    r.raw.retries.history = (History(502),)
+
+    limit = controller.limit
+    roundtrip(controller, r)
+    assert controller.limit == limit / 2
+
+
+def test_retry_after(controller):
+    retry_after = roundtrip(
+        controller,
+        response(403, {'Retry-After': '7'}, 'secondary rate limit'),
+    )
+    assert retry_after == 7
+    assert controller.limit == 2
+
+    # secondary limit without Retry-After -- exponential backoff
+    r = response(403, {}, '{"message": "You have exceeded a secondary rate'
+                          ' limit"}')
+    assert roundtrip(controller, r) == 60
+    assert roundtrip(controller, r) == 120
+
+    # the primary ratelimit is not retried
+    r = response(403, {'X-RateLimit-Remaining': '0'}, 'API rate limit')
+    assert roundtrip(controller, r) is None
+
+
+def test_parse_retry_after():
+    parse = codekit.pygithub.ConcurrencyController.parse_retry_after
+    assert parse('3') == 3
+    assert parse('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse('bogus') is None
+    assert parse(None) is None
+
+
+@responses.activate
+def test_request_retried(controller):
+    responses.add(
+        responses.GET,
+        api + '/users/octocat',
+        status=403,
+        headers={'Retry-After': '0'},
+        json={'message': 'You have exceeded a secondary rate limit.'},
+    )
+    responses.add(
+        responses.GET,
+        api + '/users/octocat',
+        json={'login': 'octocat', 'id': 1},
+    )
+
+    g = github.Github('token')
+    assert g.get_user('octocat').login == 'octocat'
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_request_error_releases(controller):
+    responses.add(
+        responses.PATCH,
+        api + '/repos/lsst/afw',
+        body=ValueError('not a requests exception'),
+    )
+    responses.add(
+        responses.PATCH,
+        api + '/repos/lsst/afw',
+        body=requests.exceptions.ConnectTimeout(),
+    )
+
+    conn = codekit.pygithub.RequestsConnection('api.github.com')
+    for error in (ValueError, requests.exceptions.ConnectTimeout):
+        with pytest.raises(error):
+            conn.request('PATCH', '/repos/lsst/afw', '{}', {})
+            conn.getresponse()
+
+        # neither the slot nor the mutation lock leaked
+        assert controller._in_flight == 0
+        assert controller._mutation_lock.acquire(blocking=False)
+        controller._mutation_lock.release()
+
+    # the timeout was counted as congestion
+    assert controller.limit == 2
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import datetime
+import github
+import json
+import pytest
+import responses
+import time
+
+api = 'https://api.github.com'
+# stand-in for the token endpoints of a github (enterprise) server
+app_api = 'https://github.example.com/api/v3'
+
+
+def expires_at(seconds):
+    t = datetime.datetime.utcfromtimestamp(time.time() + seconds)
+    return t.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def add_token_endpoint(tokens, installation_id=42):
+    """Respond with the next of `tokens`, a list of (token, lifetime)"""
+    tokens = iter(tokens)
+
+    def callback(request):
+        assert request.headers['Authorization'] == 'Bearer app-jwt'
+        token, lifetime = next(tokens)
+        body = {'token': token, 'expires_at': expires_at(lifetime)}
+        return (201, {}, json.dumps(body))
+
+    responses.add_callback(
+        responses.POST,
+        "{api}/app/installations/{id}/access_tokens".format(
+            api=app_api, id=installation_id),
+        callback=callback,
+    )
+
+
+@pytest.fixture
+def app_auth(monkeypatch):
+    auth = codekit.pygithub.GithubAppAuth(
+        1234,
+        'not a real key',
+        installation_id=42,
+        base_url=app_api,
+    )
+    monkeypatch.setattr(auth, 'make_jwt', lambda: 'app-jwt')
+    codekit.pygithub.RequestsConnection.app_auth = auth
+    yield auth
+    codekit.pygithub.RequestsConnection.app_auth = None
+
+
+@responses.activate
+def test_token_refresh(app_auth):
+    add_token_endpoint([('v1.first', 3600), ('v1.second', 3600)])
+
+    assert app_auth.token() == 'v1.first'
+    assert app_auth.token() == 'v1.first'
+    assert len(responses.calls) == 1
+
+    # refreshed within the margin before expiry
+    later = time.time() + 3600 - app_auth.refresh_margin + 1
+    assert app_auth.token(now=later) == 'v1.second'
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_requests_use_installation_token(app_auth):
+    add_token_endpoint([('v1.first', 3600)])
+    seen = []
+
+    def callback(request):
+        seen.append(request.headers['Authorization'])
+        return (200, {}, '{"login": "octocat"}')
+
+    responses.add_callback(responses.GET, api + '/users/octocat', callback)
+
+    g = github.Github(app_auth.placeholder)
+    g.get_user('octocat')
+    g.get_user('octocat')
+    # other clients are not affected
+    github.Github('token').get_user('octocat')
+
+    assert seen == ['token v1.first', 'token v1.first', 'token token']
+
+
+@responses.activate
+def test_find_installation_id(app_auth):
+    app_auth.installation_id = None
+    responses.add(
+        responses.GET,
+        app_api + '/app/installations',
+        json=[{'id': 42, 'account': {'login': 'lsst'}}],
+    )
+    add_token_endpoint([('v1.first', 3600)])
+
+    assert app_auth.token() == 'v1.first'
+    assert app_auth.installation_id == 42
+
+
+@responses.activate
+def test_token_error(app_auth):
+    responses.add(
+        responses.POST,
+        app_api + '/app/installations/42/access_tokens',
+        status=401,
+        json={'message': 'Bad credentials'},
+    )
+
+    with pytest.raises(codekit.pygithub.GithubAppAuthError) as e:
+        app_auth.token()
+    assert '401' in str(e.value)
+
+
+def test_make_jwt(tmpdir):
+    pytest.importorskip('cryptography')
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    import jwt
+
+    key = rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=2048,
+        backend=default_backend(),
+    )
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    path = tmpdir.join('app.pem')
+    path.write(pem.decode('ascii'))
+
+    auth = codekit.pygithub.GithubAppAuth.from_key_file(1234, str(path))
+    claims = jwt.decode(
+        auth.make_jwt(),
+        key.public_key(),
+        algorithms=['RS256'],
+    )
+    assert claims['iss'] == '1234'
+    assert claims['exp'] - claims['iat'] <= 10 * 60
+
+
+def test_login_requires_key():
+    with pytest.raises(ValueError):
+        codekit.pygithub.login_github(auth='app', app_id='1234')
+    with pytest.raises(ValueError):
+        codekit.pygithub.login_github(auth='oauth')
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import responses
+
+
+@responses.activate
+def test_get_repo_lazy():
+    """full_name is available without completing the object"""
+    g = github.Github('token')
+    repo = codekit.pygithub.get_repo_lazy(g, 'example/a')
+
+    assert repo.full_name == 'example/a'
+    assert repo.url.endswith('/repos/example/a')
+    assert len(responses.calls) == 0
+
+
+@responses.activate
+def test_git_ref_round_trip():
+    g = github.Github('token')
+    repo = codekit.pygithub.get_repo_lazy(g, 'example/a')
+    api = 'https://api.github.com/repos/example/a'
+    data = {
+        'ref': 'refs/tags/w.2018.18',
+        'url': api + '/git/refs/tags/w.2018.18',
+        'object': {
+            'sha': 'a' * 40,
+            'type': 'tag',
+            'url': api + '/git/tags/' + 'a' * 40,
+        },
+    }
+
+    ref = codekit.pygithub.git_ref_from_dict(repo, data)
+    assert codekit.pygithub.tag_name_from_ref(ref) == 'w.2018.18'
+    assert codekit.pygithub.git_ref_to_dict(ref) == data
+    assert len(responses.calls) == 0
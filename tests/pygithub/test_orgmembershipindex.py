@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import pytest
+import responses
+
+api = 'https://api.github.com'
+
+
+def add_org_responses():
+    responses.add(
+        responses.GET,
+        api + '/orgs/example',
+        json={'login': 'example', 'url': api + '/orgs/example'},
+    )
+    responses.add(
+        responses.GET,
+        api + '/orgs/example/teams',
+        json=[
+            {'id': 1, 'name': 'foo', 'url': api + '/teams/1'},
+            {'id': 2, 'name': 'bar', 'url': api + '/teams/2'},
+        ],
+    )
+    responses.add(
+        responses.GET,
+        api + '/teams/1/repos',
+        json=[
+            {'full_name': 'example/a', 'url': api + '/repos/example/a'},
+            {'full_name': 'example/b', 'url': api + '/repos/example/b'},
+        ],
+    )
+    responses.add(
+        responses.GET,
+        api + '/teams/2/repos',
+        json=[
+            {'full_name': 'example/b', 'url': api + '/repos/example/b'},
+        ],
+    )
+
+
+def get_org():
+    add_org_responses()
+    return github.Github('token').get_organization('example')
+
+
+def repo(full_name):
+    return github.Repository.Repository(
+        None,
+        {},
+        {'full_name': full_name, 'url': api + '/repos/' + full_name},
+        completed=True,
+    )
+
+
+@responses.activate
+def test_repo_teams():
+    """team membership is resolved from the repos of each team"""
+    org = get_org()
+    idx = codekit.pygithub.OrgMembershipIndex(org)
+
+    assert idx.get_repo_team_names(repo('example/a')) == ['foo']
+    assert idx.get_repo_team_names(repo('example/b')) == ['foo', 'bar']
+    # github names are case insensitive
+    assert idx.get_repo_team_names(repo('Example/B')) == ['foo', 'bar']
+    # repo without any teams
+    assert idx.get_repo_team_names(repo('example/c')) == []
+
+    # one call each for the org, the team list and the repos of each team
+    assert len(responses.calls) == 4
+
+
+@responses.activate
+def test_repos_by_team():
+    org = get_org()
+    idx = codekit.pygithub.OrgMembershipIndex(org)
+
+    teams = idx.get_teams_by_name(['bar'])
+    assert [t.name for t in teams] == ['bar']
+
+    repos = idx.get_repos_by_team(teams)
+    assert [r.full_name for r in repos] == ['example/b']
+
+
+@responses.activate
+def test_check_repo_teams():
+    org = get_org()
+    idx = codekit.pygithub.OrgMembershipIndex(org)
+
+    codekit.pygithub.check_repo_teams(
+        repo('example/a'),
+        allow_teams=['foo'],
+        deny_teams=[],
+        membership=idx,
+    )
+
+    with pytest.raises(codekit.pygithub.RepositoryTeamMembershipError):
+        codekit.pygithub.check_repo_teams(
+            repo('example/b'),
+            allow_teams=['foo'],
+            deny_teams=['bar'],
+            membership=idx,
+        )
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import json
+import responses
+import urllib.parse
+
+api = 'https://api.github.com'
+
+
+def add_repo_pages(path, names, per_page):
+    pages = [
+        names[i:i + per_page] for i in range(0, len(names), per_page)
+    ]
+
+    def callback(request):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query)
+        assert query['per_page'] == [str(per_page)]
+        page = int(query.get('page', ['1'])[0])
+
+        headers = {}
+        if len(pages) > 1:
+            headers['Link'] = (
+                '<{api}{path}?per_page={pp}&page=2>; rel="next", '
+                '<{api}{path}?per_page={pp}&page={last}>; rel="last"'
+            ).format(api=api, path=path, pp=per_page, last=len(pages))
+
+        body = [
+            {'name': n, 'full_name': 'example/' + n}
+            for n in pages[page - 1]
+        ]
+        return (200, headers, json.dumps(body))
+
+    responses.add_callback(
+        responses.GET,
+        api + path,
+        callback=callback,
+    )
+
+
+def example_user():
+    g = github.Github('token')
+    return github.NamedUser.NamedUser(
+        g._Github__requester,
+        {},
+        {'url': api + '/users/example', 'login': 'example'},
+        completed=True,
+    )
+
+
+@responses.activate
+def test_iter_paginated():
+    names = ["repo{n:03d}".format(n=n) for n in range(250)]
+    add_repo_pages('/users/example/repos', names, per_page=100)
+
+    user = example_user()
+
+    repos = list(codekit.pygithub.iter_paginated(user.get_repos(), jobs=4))
+
+    assert [r.name for r in repos] == names
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_single_page():
+    add_repo_pages('/users/example/repos', ['a', 'b'], per_page=100)
+
+    user = example_user()
+
+    repos = list(codekit.pygithub.iter_paginated(user.get_repos()))
+    assert [r.name for r in repos] == ['a', 'b']
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_unknown_paginated_list(monkeypatch):
+    # a pygithub release without the expected PaginatedList internals
+    monkeypatch.setattr(
+        codekit.pygithub,
+        'PAGINATED_LIST_ATTRS',
+        codekit.pygithub.PAGINATED_LIST_ATTRS + ('no_such_attr',),
+    )
+    responses.add(
+        responses.GET,
+        api + '/users/example/repos',
+        json=[{'name': 'a'}, {'name': 'b'}],
+    )
+
+    user = example_user()
+
+    repos = list(codekit.pygithub.iter_paginated(user.get_repos()))
+    assert [r.name for r in repos] == ['a', 'b']
+    assert len(responses.calls) == 1
+
+
+def test_unique_repos():
+    class Repo(object):
+        def __init__(self, full_name):
+            self.full_name = full_name
+
+    repos = [Repo('lsst/afw'), Repo('lsst/base'), Repo('LSST/afw')]
+    unique = [r.full_name for r in codekit.pygithub.unique_repos(repos)]
+    assert unique == ['lsst/afw', 'lsst/base']
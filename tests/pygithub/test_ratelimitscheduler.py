@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import pytest
+import responses
+import time
+
+api = 'https://api.github.com'
+
+
+def headers(remaining, limit=5000, reset=None):
+    if reset is None:
+        reset = int(time.time()) + 3600
+    return {
+        'X-RateLimit-Remaining': str(remaining),
+        'X-RateLimit-Limit': str(limit),
+        'X-RateLimit-Reset': str(reset),
+    }
+
+
+def test_no_pacing_above_threshold():
+    s = codekit.pygithub.RateLimitScheduler()
+    # budget is unknown
+    assert s.delay() == 0
+
+    s.update(headers(4000))
+    for _ in range(100):
+        assert s.delay() == 0
+    assert s.remaining == 3900
+
+
+def test_pacing_below_threshold():
+    s = codekit.pygithub.RateLimitScheduler(burst=2)
+    s.update(headers(100))
+
+    # burst is not delayed
+    assert s.delay() == 0
+    assert s.delay() == 0
+    # ~100 calls over 3600s
+    assert 30 < s.delay() < 40
+
+
+def test_exhausted():
+    s = codekit.pygithub.RateLimitScheduler()
+    s.update(headers(0, reset=int(time.time()) + 60))
+
+    assert 55 < s.delay() <= 61
+
+
+def rate_limit_json(remaining, limit=5000):
+    rate = {
+        'limit': limit,
+        'remaining': remaining,
+        'reset': int(time.time()) + 3600,
+    }
+    return {'resources': {'core': rate}, 'rate': rate}
+
+
+@responses.activate
+def test_check_ratelimit():
+    responses.add(
+        responses.GET,
+        api + '/rate_limit',
+        json=rate_limit_json(100),
+    )
+    g = github.Github('token')
+
+    codekit.pygithub.check_ratelimit(g, 100)
+
+    with pytest.raises(codekit.pygithub.RateLimitBudgetError):
+        codekit.pygithub.check_ratelimit(g, 101)
+
+    # impossible to satisfy -- even after a reset
+    with pytest.raises(codekit.pygithub.RateLimitBudgetError):
+        codekit.pygithub.check_ratelimit(g, 5001, wait=True)
+
+
+def test_no_drift():
+    # responses which are not charged, e.g. 304s, report the same budget
+    s = codekit.pygithub.RateLimitScheduler()
+    s.update(headers(1000))
+
+    for _ in range(2000):
+        assert s.delay() == 0
+        s.update(headers(1000))
+    assert s.remaining == 1000
+
+
+def test_in_flight():
+    s = codekit.pygithub.RateLimitScheduler()
+    s.update(headers(1000))
+
+    for _ in range(10):
+        s.delay()
+    assert s.remaining == 990
+
+    # the server count is authoritative, less what is still in flight
+    s.update(headers(995))
+    assert s.remaining == 986
+
+    # a request without a response releases its reservation
+    s.update(None)
+    assert s.remaining == 987
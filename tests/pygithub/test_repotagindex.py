@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import pytest
+import responses
+
+api = 'https://api.github.com'
+
+
+def repo(full_name):
+    # get_repo() is lazy and does not make an api call
+    return github.Github('token').get_repo(full_name)
+
+
+def tag_ref(full_name, name):
+    return {
+        'ref': 'refs/tags/' + name,
+        'url': "{api}/repos/{r}/git/refs/tags/{t}".format(
+            api=api,
+            r=full_name,
+            t=name,
+        ),
+        'object': {'sha': 'a' * 40, 'type': 'tag'},
+    }
+
+
+@responses.activate
+def test_prefix_lookups():
+    """hits and misses under the prefix are answered from one api call"""
+    responses.add(
+        responses.GET,
+        api + '/repos/example/a/git/matching-refs/tags/w.2018',
+        json=[
+            tag_ref('example/a', 'w.2018.18'),
+            tag_ref('example/a', 'w.2018.19'),
+        ],
+    )
+
+    idx = codekit.pygithub.RepoTagIndex(repo('example/a'), prefix='w.2018')
+
+    ref = idx.find_tag_by_name('w.2018.18')
+    assert ref.ref == 'refs/tags/w.2018.18'
+    assert idx.find_tag_by_name('w.2018.19').ref == 'refs/tags/w.2018.19'
+    assert idx.find_tag_by_name('w.2018.20') is None
+    with pytest.raises(github.UnknownObjectException):
+        idx.find_tag_by_name('w.2018.20', safe=False)
+
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_outside_prefix():
+    """names outside of the prefix are looked up once and cached"""
+    responses.add(
+        responses.GET,
+        api + '/repos/example/a/git/matching-refs/tags/w.2018',
+        json=[],
+    )
+    responses.add(
+        responses.GET,
+        api + '/repos/example/a/git/refs/tags/v1.0',
+        status=404,
+        json={'message': 'Not Found'},
+    )
+
+    idx = codekit.pygithub.RepoTagIndex(repo('example/a'), prefix='w.2018')
+
+    assert idx.find_tag_by_name('v1.0') is None
+    assert idx.find_tag_by_name('v1.0') is None
+
+    assert len(responses.calls) == 2
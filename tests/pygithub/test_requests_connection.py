@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import concurrent.futures
+import github
+import requests
+import responses
+
+
+@responses.activate
+def test_concurrent_requests():
+    """A single Github object may be used from several threads"""
+    names = ['foo{n}'.format(n=n) for n in range(20)]
+    for name in names:
+        responses.add(
+            responses.GET,
+            "https://api.github.com/users/{name}".format(name=name),
+            json={'login': name},
+        )
+
+    g = github.Github('token')
+
+    def login(name):
+        return g.get_user(name).login
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as ex:
+        logins = list(ex.map(login, names))
+
+    assert logins == names
+    assert isinstance(
+        codekit.pygithub.RequestsConnection.session,
+        requests.Session,
+    )
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import os
+import pytest
+import responses
+
+api = 'https://api.github.com'
+
+
+@pytest.fixture
+def cache(tmpdir):
+    cache = codekit.pygithub.ResponseCache(str(tmpdir))
+    codekit.pygithub.RequestsConnection.cache = cache
+    yield cache
+    codekit.pygithub.RequestsConnection.cache = None
+
+
+@responses.activate
+def test_revalidation(cache):
+    """a cached response is served when github replies 304"""
+    etag = '"abc123"'
+
+    def user_callback(request):
+        if request.headers.get('If-None-Match') == etag:
+            return (304, {
+                'X-RateLimit-Remaining': '4998',
+                'X-RateLimit-Limit': '5000',
+            }, '')
+        return (
+            200,
+            {
+                'ETag': etag,
+                'Content-Type': 'application/json',
+                'X-RateLimit-Remaining': '4999',
+                'X-RateLimit-Limit': '5000',
+            },
+            '{"login": "octocat", "id": 1}',
+        )
+
+    responses.add_callback(
+        responses.GET,
+        api + '/users/octocat',
+        callback=user_callback,
+    )
+
+    g = github.Github('token')
+    assert g.get_user('octocat').login == 'octocat'
+
+    g = github.Github('token')
+    assert g.get_user('octocat').login == 'octocat'
+    # ratelimit headers are from the 304 response
+    assert g.rate_limiting[0] == 4998
+
+    assert len(responses.calls) == 2
+    assert 'If-None-Match' not in responses.calls[0].request.headers
+    assert responses.calls[1].request.headers['If-None-Match'] == etag
+
+
+@responses.activate
+def test_uncacheable(cache):
+    """responses without validators are not stored"""
+    responses.add(
+        responses.GET,
+        api + '/users/octocat',
+        json={'login': 'octocat', 'id': 1},
+    )
+
+    g = github.Github('token')
+    g.get_user('octocat').login
+    g.get_user('octocat').login
+
+    assert len(responses.calls) == 2
+    assert 'If-None-Match' not in responses.calls[1].request.headers
+    assert os.listdir(cache.path) == []
+
+
+@responses.activate
+def test_eviction(tmpdir):
+    """least recently used entries are evicted when over max_size"""
+    for name in ('a', 'b', 'c'):
+        responses.add(
+            responses.GET,
+            api + '/users/' + name,
+            json={'login': name, 'pad': 'x' * 1000},
+            headers={'ETag': '"' + name + '"'},
+        )
+
+    cache = codekit.pygithub.ResponseCache(str(tmpdir), max_size=3000)
+    codekit.pygithub.RequestsConnection.cache = cache
+    try:
+        g = github.Github('token')
+        g.get_user('a').login
+        g.get_user('b').login
+        # touch 'a' so that 'b' is the least recently used entry
+        key_a = cache.key(api + '/users/a', {'Authorization': 'token token'})
+        entry_path = os.path.join(cache.path, key_a + '.json')
+        os.utime(entry_path, (0, 2 ** 31))
+        g.get_user('c').login
+    finally:
+        codekit.pygithub.RequestsConnection.cache = None
+
+    assert len(os.listdir(cache.path)) == 2
+    assert os.path.exists(entry_path)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import codekit.codetools
+import codekit.pygithub
+import github
+import json
+import pytest
+import responses
+import time
+
+api = 'https://api.github.com'
+
+
+def headers(remaining, limit=5000):
+    return {
+        'X-RateLimit-Remaining': str(remaining),
+        'X-RateLimit-Limit': str(limit),
+        'X-RateLimit-Reset': str(int(time.time()) + 3600),
+    }
+
+
+@pytest.fixture
+def pool():
+    pool = codekit.pygithub.TokenPool(['main', 'extra1', 'extra2'])
+    codekit.pygithub.RequestsConnection.token_pool = pool
+    yield pool
+    codekit.pygithub.RequestsConnection.token_pool = None
+
+
+def test_select(pool):
+    # unknown quotas are tried first
+    assert pool.select()[0] == 'main'
+    pool.schedulers['main'].update(headers(4000))
+    assert pool.select()[0] == 'extra1'
+    pool.schedulers['extra1'].update(headers(100))
+    assert pool.select()[0] == 'extra2'
+
+    # the most headroom
+    pool.schedulers['extra2'].update(headers(3000))
+    assert pool.select()[0] == 'main'
+    pool.schedulers['main'].update(headers(50))
+    assert pool.select()[0] == 'extra2'
+
+    # mutating requests are pinned to the first token
+    assert pool.select(mutating=True)[0] == 'main'
+
+
+@responses.activate
+def test_requests_spread(pool):
+    remaining = {'main': 4000, 'extra1': 4500, 'extra2': 4200, 'other': 10}
+    seen = []
+
+    def callback(request):
+        token = request.headers['Authorization'].split()[1]
+        seen.append((request.method, token))
+        remaining[token] -= 1
+        return (200, headers(remaining[token]), '{"login": "octocat"}')
+
+    responses.add_callback(responses.GET, api + '/users/octocat', callback)
+    responses.add_callback(responses.PATCH, api + '/user', callback)
+
+    g = github.Github('main')
+    for _ in range(6):
+        g.get_user('octocat')
+
+    # each token is probed, then the one with the most headroom is used
+    assert [t for _, t in seen] == \
+        ['main', 'extra1', 'extra2', 'extra1', 'extra1', 'extra1']
+
+    g.get_user().edit(name='octocat')
+    assert seen[-1] == ('PATCH', 'main')
+
+    # clients with another token are not pooled
+    github.Github('other').get_user('octocat')
+    assert seen[-1] == ('GET', 'other')
+
+
+@responses.activate
+def test_check_ratelimit(pool):
+    remaining = {'main': 100, 'extra1': 200, 'extra2': 300}
+
+    def callback(request):
+        token = request.headers['Authorization'].split()[1]
+        rate = {
+            'limit': 5000,
+            'remaining': remaining[token],
+            'reset': int(time.time()) + 3600,
+        }
+        body = {'resources': {'core': rate}, 'rate': rate}
+        return (200, {}, json.dumps(body))
+
+    responses.add_callback(responses.GET, api + '/rate_limit', callback)
+
+    g = github.Github('main')
+    # the budget of the pool
+    codekit.pygithub.check_ratelimit(g, 600)
+    with pytest.raises(codekit.pygithub.RateLimitBudgetError):
+        codekit.pygithub.check_ratelimit(g, 601)
+
+
+def test_github_tokens(tmpdir):
+    path = tmpdir.join('tokens')
+    path.write("# pool\nabc\n\ndef\nabc\n")
+    assert codekit.codetools.github_tokens(str(path)) == ['abc', 'def']
+
+    d = tmpdir.mkdir('tokens.d')
+    d.join('b').write("bbb\n")
+    d.join('a').write("aaa\n")
+    d.join('.hidden').write("hhh\n")
+    assert codekit.codetools.github_tokens(str(d)) == ['aaa', 'bbb']
+
+    tmpdir.join('empty').write("\n")
+    with pytest.raises(EnvironmentError):
+        codekit.codetools.github_tokens(str(tmpdir.join('empty')))
+    with pytest.raises(EnvironmentError):
+        codekit.codetools.github_tokens(str(tmpdir.join('nope')))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, reposyaml
+import os
+import pytest
+
+codetools.setup_logging()
+
+repos_yaml = b"""\
+afw: https://github.com/lsst/afw.git
+base: https://github.com/lsst/base
+sconsUtils:
+  url: https://github.com/lsst/sconsUtils.git
+  ref: master
+broken:
+  ref: master
+"""
+
+
+@pytest.fixture
+def checkout(tmpdir):
+    etc = tmpdir.mkdir('etc')
+    etc.join('repos.yaml').write_binary(repos_yaml)
+    return str(tmpdir)
+
+
+def test_git_blob_sha():
+    # `echo -n 'hello' | git hash-object --stdin`
+    sha = reposyaml.git_blob_sha(b'hello')
+    assert sha == 'b6fc4c620b67d95f953a5c1c1230aaab5db5a1b0'
+
+
+def test_normalize(checkout):
+    idx = reposyaml.RepoIndex(path=checkout)
+
+    assert idx['afw'] == 'lsst/afw'
+    assert idx['base'] == 'lsst/base'
+    assert idx['sconsUtils'] == 'lsst/sconsUtils'
+    assert 'broken' not in idx
+    assert len(idx) == 3
+
+    with pytest.raises(KeyError):
+        idx['nope']
+
+
+def test_persisted(checkout, tmpdir):
+    cache_dir = str(tmpdir.mkdir('cache'))
+
+    idx = reposyaml.RepoIndex(path=checkout, cache_dir=cache_dir)
+    assert idx['afw'] == 'lsst/afw'
+
+    sha = reposyaml.git_blob_sha(repos_yaml)
+    cache_file = os.path.join(cache_dir, 'repos', sha + '.json')
+    assert os.path.exists(cache_file)
+
+    # an unchanged file is not parsed again
+    with open(cache_file, 'w') as f:
+        f.write('{"afw": "example/afw"}')
+
+    idx = reposyaml.RepoIndex(path=checkout, cache_dir=cache_dir)
+    assert idx['afw'] == 'example/afw'
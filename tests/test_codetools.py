@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import os
+import time
 import codekit.codetools as codetools
 import pytest
 
@@ -25,3 +26,34 @@ def test_debug_lvl_from_env():
 
     os.environ['DM_SQUARE_DEBUG'] = '42'
     codetools.debug_lvl_from_env() == 42
+
+
+def test_ordered_thread_pool_order():
+    """results are yielded in submission order"""
+    def slow_square(x):
+        # later items finish first
+        time.sleep((5 - x) * 0.01)
+        return x * x
+
+    with codetools.OrderedThreadPool(jobs=5) as pool:
+        results = [(i, f.result()) for i, f in pool.map(slow_square, range(5))]
+
+    assert results == [(0, 0), (1, 1), (2, 4), (3, 9), (4, 16)]
+
+
+def test_ordered_thread_pool_fail_fast():
+    """queued work is not started after the first failure"""
+    started = []
+
+    def boom(x):
+        started.append(x)
+        if x == 0:
+            raise RuntimeError('boom')
+        return x
+
+    with pytest.raises(RuntimeError):
+        with codetools.OrderedThreadPool(jobs=1, fail_fast=True) as pool:
+            for _, f in pool.map(boom, range(10)):
+                f.result()
+
+    assert started == [0]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+from codekit import httpsession
+import pytest
+import requests
+import responses
+import sys
+
+
+def test_make_session():
+    s = httpsession.make_session(retries=5)
+
+    adapter = s.get_adapter('https://example.org')
+    assert adapter.max_retries.total == 5
+    assert 503 in adapter.max_retries.status_forcelist
+    assert 'gzip' in s.headers['Accept-Encoding']
+
+
+def test_shared_session():
+    httpsession.set_session(None)
+    s = httpsession.get_session()
+    assert s is httpsession.get_session()
+
+    injected = requests.Session()
+    httpsession.set_session(injected)
+    assert httpsession.get_session() is injected
+
+    httpsession.set_session(None)
+    assert httpsession.get_session() is not injected
+
+
+@responses.activate
+def test_get():
+    url = 'https://example.org/foo.txt'
+    responses.add(responses.GET, url, body='foo')
+    responses.add(responses.GET, url + '.missing', status=404)
+
+    assert httpsession.get(url).text == 'foo'
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        httpsession.get(url + '.missing')
+
+
+@responses.activate
+def test_document_cache_revalidation(tmpdir):
+    url = 'https://example.org/w_2018_18.list'
+    etag = '"abc"'
+
+    def callback(request):
+        if request.headers.get('If-None-Match') == etag:
+            return (304, {}, '')
+        return (200, {'ETag': etag}, 'foo')
+
+    responses.add_callback(responses.GET, url, callback=callback)
+
+    cache = httpsession.DocumentCache(str(tmpdir))
+    assert cache.fetch(url) == 'foo'
+    assert cache.fetch(url) == 'foo'
+    assert len(responses.calls) == 2
+    assert responses.calls[1].request.headers['If-None-Match'] == etag
+
+
+@responses.activate
+def test_document_cache_immutable(tmpdir):
+    url = 'https://example.org/b1234.txt'
+    responses.add(responses.GET, url, body='foo')
+
+    cache = httpsession.DocumentCache(str(tmpdir))
+    assert cache.fetch(url, immutable=True) == 'foo'
+    assert cache.fetch(url, immutable=True) == 'foo'
+    assert len(responses.calls) == 1
+
+    offline = httpsession.DocumentCache(str(tmpdir), offline=True)
+    assert offline.fetch(url) == 'foo'
+    with pytest.raises(httpsession.OfflineCacheMiss):
+        offline.fetch(url + '.missing')
+    assert len(responses.calls) == 1
+
+
+def test_document_cache_parsed(tmpdir):
+    cache = httpsession.DocumentCache(str(tmpdir))
+    assert cache.load_parsed('kind', 'text') is None
+
+    cache.save_parsed('kind', 'text', {'a': [1, 2]})
+    assert cache.load_parsed('kind', 'text') == {'a': [1, 2]}
+    assert cache.load_parsed('kind', 'other text') is None
+
+
+class Parsed(object):
+    pass
+
+
+def test_document_cache_parsed_stale(tmpdir, monkeypatch):
+    cache = httpsession.DocumentCache(str(tmpdir))
+    cache.save_parsed('kind', 'text', Parsed())
+    assert isinstance(cache.load_parsed('kind', 'text'), Parsed)
+
+    # the class has since been renamed
+    monkeypatch.delattr(sys.modules[__name__], 'Parsed')
+    assert cache.load_parsed('kind', 'text') is None
+
+    # the bad entry is dropped
+    monkeypatch.undo()
+    assert cache.load_parsed('kind', 'text') is None
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+from codekit.records import ProductRecord
+import pickle
+import pytest
+
+
+def test_mapping():
+    r = ProductRecord(
+        'afw',
+        sha='a' * 40,
+        eups_version='1.0',
+        dependencies=['base', 'utils'],
+    )
+
+    assert r['name'] == 'afw'
+    assert r.dependencies == ('base', 'utils')
+    assert r['dependencies'] == ['base', 'utils']
+    # absent fields are not keys
+    assert 'flavor' not in r
+    assert set(r) == {'name', 'sha', 'eups_version', 'dependencies'}
+    assert r.get('flavor') is None
+    assert r.copy() == dict(r)
+
+    with pytest.raises(KeyError):
+        r['flavor']
+
+
+def test_immutable():
+    r = ProductRecord('afw', eups_version='1.0')
+
+    with pytest.raises(AttributeError):
+        r.name = 'base'
+    with pytest.raises(TypeError):
+        r['name'] = 'base'
+
+
+def test_merge_replace():
+    e = ProductRecord('afw', flavor='generic', eups_version='1.0')
+    m = ProductRecord('afw', sha='a' * 40, eups_version='1.1', dependencies=[])
+
+    merged = e.merge(m)
+    assert merged == {
+        'name': 'afw',
+        'sha': 'a' * 40,
+        'flavor': 'generic',
+        'eups_version': '1.1',
+        'dependencies': [],
+    }
+    assert m.replace(eups_version='1.0')['eups_version'] == '1.0'
+    assert m['eups_version'] == '1.1'
+
+
+def test_pickle():
+    r = ProductRecord('afw', sha='a' * 40, dependencies=['base'])
+    assert pickle.loads(pickle.dumps(r)) == r
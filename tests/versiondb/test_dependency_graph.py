@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, versiondb
+from codekit.records import ProductRecord
+import codecs
+import os
+import pytest
+
+codetools.setup_logging()
+
+
+def graph_of(deps):
+    return versiondb.DependencyGraph({
+        name: ProductRecord(name, dependencies=d) for name, d in deps.items()
+    })
+
+
+@pytest.fixture
+def b3504():
+    d = os.path.dirname(os.path.abspath(__file__))
+    filename = os.path.join(d, 'data', 'b3504.txt')
+    with codecs.open(filename, 'r', encoding='utf8') as file:
+        products = versiondb.parse_manifest_lines(file, 'b3504')
+        return {p.name: p for p in products}
+
+
+def test_small():
+    g = graph_of({
+        'a': [],
+        'b': ['a'],
+        'c': ['a', 'b', 'not_in_manifest'],
+        'd': ['c'],
+        'e': [],
+    })
+
+    assert len(g) == 5
+    assert g.dependencies('c') == {'a', 'b'}
+    assert g.reverse_dependencies('a') == {'b', 'c'}
+    assert g.transitive_dependencies('d') == {'a', 'b', 'c'}
+    assert g.transitive_dependencies('a') == frozenset()
+    assert g.transitive_reverse_dependencies('a') == {'b', 'c', 'd'}
+    assert g.topological_order() == ['a', 'b', 'c', 'd', 'e']
+
+    with pytest.raises(KeyError):
+        g.transitive_dependencies('nope')
+
+
+def test_cycle():
+    g = graph_of({'a': ['c'], 'b': ['a'], 'c': ['b']})
+
+    with pytest.raises(RuntimeError):
+        g.topological_order()
+    with pytest.raises(RuntimeError):
+        g.transitive_dependencies('a')
+
+
+def test_b3504(b3504):
+    g = versiondb.DependencyGraph(b3504)
+
+    order = g.topological_order()
+    assert sorted(order) == sorted(b3504)
+    position = {name: i for i, name in enumerate(order)}
+    for name in b3504:
+        for dep in g.dependencies(name):
+            assert position[dep] < position[name]
+
+    afw_deps = g.transitive_dependencies('afw')
+    assert {'daf_base', 'cfitsio', 'eigen'} <= afw_deps
+    assert 'skymap' not in afw_deps
+    assert 'skymap' in g.transitive_reverse_dependencies('afw')
+
+    # closure of a dependency is a subset
+    assert g.transitive_dependencies('daf_base') < afw_deps
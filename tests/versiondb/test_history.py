@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, versiondb
+import os
+import pytest
+import responses
+
+codetools.setup_logging()
+
+url = 'https://raw.githubusercontent.com/lsst/versiondb/master/manifests/'
+
+# build number -> (afw sha, afw eups version)
+builds = {
+    1: ('1111111111111111111111111111111111111111', '1.0'),
+    2: ('1111111111111111111111111111111111111111', '1.0'),
+    3: ('2222222222222222222222222222222222222222', '1.1'),
+    5: ('3333333333333333333333333333333333333333', '1.2'),
+}
+
+
+def manifest(number, sha, version):
+    return "\n".join([
+        "# product SHA1 Version",
+        "BUILD={b}".format(b=versiondb.manifest_name(number)),
+        "apr 39b3212aa46217e4f485b02496381907da8b8d7a 1.5.2",
+        "afw {sha} {v} apr".format(sha=sha, v=version),
+    ]) + "\n"
+
+
+def add_builds(builds, last=20):
+    for n in range(1, last + 1):
+        name = versiondb.manifest_name(n)
+        if n in builds:
+            responses.add(responses.GET, url + name + '.txt',
+                          body=manifest(n, *builds[n]))
+        else:
+            responses.add(responses.GET, url + name + '.txt', status=404)
+
+
+@pytest.fixture
+def history(tmpdir):
+    path = os.path.join(str(tmpdir), 'history.sqlite3')
+    with versiondb.ManifestHistory(path) as h:
+        yield h
+
+
+def test_manifest_name():
+    assert versiondb.manifest_name(12) == 'b0012'
+    assert versiondb.manifest_number('b1234') == 1234
+
+    with pytest.raises(ValueError):
+        versiondb.manifest_number('d_2018_01_01')
+
+
+@responses.activate
+def test_ingest(history):
+    add_builds(builds)
+
+    assert history.ingest(range(1, 6), jobs=3) == 4
+    assert history.known_builds() == {1, 2, 3, 5}
+    assert history.last_build() == 5
+
+    assert history.builds_with_sha('afw', '1111111') == ['b0001', 'b0002']
+    assert history.builds_with_sha('afw', '2' * 40) == ['b0003']
+    assert history.builds_with_sha('apr', '39b3212') == \
+        ['b0001', 'b0002', 'b0003', 'b0005']
+    assert history.builds_with_eups_version('afw', '1.2') == ['b0005']
+    assert history.builds_with_eups_version('afw', '9.9') == []
+
+    assert history.changes('afw') == [
+        ('b0001', '1.0', '1' * 40),
+        ('b0003', '1.1', '2' * 40),
+        ('b0005', '1.2', '3' * 40),
+    ]
+
+    # already indexed builds are not fetched again
+    n_calls = len(responses.calls)
+    assert history.ingest(range(1, 6)) == 0
+    # only the missing b0004 is retried
+    assert len(responses.calls) == n_calls + 1
+
+
+@responses.activate
+def test_update(history):
+    add_builds({k: v for k, v in builds.items() if k <= 3})
+
+    assert history.update(jobs=2, max_missing=4) == 3
+    assert history.last_build() == 3
+
+    # a new build is appended incrementally
+    responses.reset()
+    add_builds(builds)
+
+    assert history.update(jobs=2, max_missing=4) == 1
+    assert history.last_build() == 5
+    fetched = {c.request.url.rsplit('/', 1)[1] for c in responses.calls}
+    assert 'b0001.txt' not in fetched
+
+
+@responses.activate
+def test_sha_is_not_a_pattern(history):
+    add_builds(builds, last=5)
+    history.ingest(range(1, 6))
+
+    assert history.builds_with_sha('afw', '1111111') == ['b0001', 'b0002']
+    for pattern in ('*', '1*', '?', '[12]'):
+        assert history.builds_with_sha('afw', pattern) == []
+
+
+@responses.activate
+def test_ingest_unparsable(history):
+    add_builds({1: builds[1], 2: builds[2]}, last=3)
+    # garbage on the BUILD line of b0003
+    responses.replace(
+        responses.GET,
+        url + 'b0003.txt',
+        body="BUILD=nope\n",
+    )
+
+    with pytest.raises(codetools.DogpileError) as e:
+        history.ingest(range(1, 4), fail_fast=False)
+    assert len(e.value.errors) == 1
+    assert isinstance(e.value.errors[0], RuntimeError)
+    # the other builds are ingested
+    assert history.known_builds() == {1, 2}
+
+    with pytest.raises(RuntimeError):
+        history.ingest(range(1, 4), fail_fast=True)
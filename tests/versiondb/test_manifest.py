@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from codekit import codetools, versiondb
+from codekit import codetools, httpsession, versiondb
 import codecs
 import os
 import pytest
@@ -54,3 +54,48 @@ def test_b3504(b3504):
         '3609236c8b3caebe32fc9b619541bb650e33f4f1'
     assert products['skymap']['eups_version'] == '14.0-4-g3609236+6'
     assert products['skymap']['dependencies'] == ['numpy', 'afw', 'healpy']
+
+
+@responses.activate
+def test_cached(b3504, tmpdir):
+    responses.add(
+        responses.Response(
+            method='GET',
+            url='https://raw.githubusercontent.com/lsst/versiondb'
+                '/master/manifests/b3504.txt',
+            body=b3504,
+        ),
+    )
+    cache = httpsession.DocumentCache(str(tmpdir))
+
+    m = versiondb.Manifest(name='b3504', cache=cache)
+    assert m.products['apr']['eups_version'] == '1.5.2'
+
+    # published manifests are immutable -- no revalidation
+    m = versiondb.Manifest(name='b3504', cache=cache)
+    assert m.products['apr']['eups_version'] == '1.5.2'
+    assert len(responses.calls) == 1
+
+
+@pytest.fixture
+def versiondb_clone(b3504, make_versiondb):
+    return make_versiondb({'b3504': b3504})
+
+
+@responses.activate
+def test_local(versiondb_clone, b3504):
+    # should not make any http requests
+    with versiondb.LocalVersionDB(versiondb_clone) as db:
+        assert db.read('b3504') == b3504
+        with pytest.raises(versiondb.ManifestNotFoundError):
+            db.read('b9999')
+        # the process is still usable after a missing object
+        assert db.read('b3504') == b3504
+
+    # the manifests dir and file:// urls are also accepted
+    for base_url in (
+        os.path.join(versiondb_clone, 'manifests'),
+        'file://' + versiondb_clone,
+    ):
+        m = versiondb.Manifest(name='b3504', base_url=base_url)
+        assert m.products['apr']['eups_version'] == '1.5.2'
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, versiondb
+from codekit.records import ProductRecord
+import pytest
+import responses
+
+codetools.setup_logging()
+
+url = 'https://raw.githubusercontent.com/lsst/versiondb/master/manifests/'
+
+
+def products(**versions):
+    return {
+        name: ProductRecord(name, sha=v * 8, eups_version=v)
+        for name, v in versions.items()
+    }
+
+
+builds = [
+    ('b0001', products(afw='a1', base='b1')),
+    ('b0002', products(afw='a1', base='b1')),
+    ('b0003', products(afw='a2', base='b1', skymap='s1')),
+    ('b0004', products(afw='a2', skymap='s1')),
+    ('b0005', products(afw='a3', base='b2', skymap='s1')),
+]
+
+
+@pytest.fixture
+def manifest_set():
+    ms = versiondb.ManifestSet()
+    for name, p in builds:
+        ms.add(name, p)
+    return ms
+
+
+def test_views(manifest_set):
+    assert list(manifest_set) == [name for name, _ in builds]
+    assert len(manifest_set) == 5
+
+    for name, p in builds:
+        view = manifest_set[name]
+        assert dict(view) == p
+        assert len(view) == len(p)
+
+    assert 'base' not in manifest_set['b0004']
+    with pytest.raises(KeyError):
+        manifest_set['b0004']['base']
+    with pytest.raises(KeyError):
+        manifest_set['b9999']
+
+    # unchanged records are shared between builds
+    assert manifest_set['b0001']['afw'] is manifest_set['b0002']['afw']
+
+    with pytest.raises(ValueError):
+        manifest_set.add('b0001', {})
+
+
+def test_changes(manifest_set):
+    changes = [
+        (name, r.eups_version if r else None)
+        for name, r in manifest_set.changes('base')
+    ]
+    assert changes == [
+        ('b0001', 'b1'),
+        ('b0004', None),
+        ('b0005', 'b2'),
+    ]
+    assert [name for name, _ in manifest_set.changes('skymap')] == ['b0003']
+    assert list(manifest_set.changes('nope')) == []
+
+
+@responses.activate
+def test_fetch():
+    for name, p in builds:
+        lines = ["BUILD=" + name] + [
+            "{n} {sha} {v}".format(n=r.name, sha=r.sha, v=r.eups_version)
+            for r in p.values()
+        ]
+        responses.add(
+            responses.GET,
+            url + name + '.txt',
+            body="\n".join(lines) + "\n",
+        )
+
+    ms = versiondb.ManifestSet.fetch([name for name, _ in builds], jobs=3)
+    assert list(ms) == [name for name, _ in builds]
+    assert ms['b0005']['afw'].eups_version == 'a3'